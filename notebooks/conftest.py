@@ -0,0 +1,4 @@
+'''
+pytest configuration - the tests import postevent from this directory,
+as the notebooks do (run pytest from the notebooks directory)
+'''
@@ -0,0 +1,332 @@
+'''
+Headless batch evaluation of multiple post-event studies - computes
+the flow and precipitation metric tables for a list of events (defined
+in EVENT_DEFINITIONS_FILE) in parallel and writes them to a cross-event
+parquet store
+
+example (from the notebooks directory):
+    python -m postevent.batch post_event_config_teehrhub.json \
+        <event_name> <event_name> ... --workers 4
+'''
+import argparse
+import multiprocessing
+import time
+import traceback
+import pandas as pd
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import List, Union
+
+from . import config
+from .viz import data
+
+
+def get_event_objects(
+    config_file: Union[str, Path],
+    event_name: str,
+    forecast_config: str = 'short_range',
+    units: str = 'english',
+    restrict_to_event_period: bool = True,
+    reach_set: str = 'gages',
+) -> tuple:
+    '''
+    Build the Paths, Event, Geo and Dates objects for an event without
+    the notebook widgets - selector values are set directly, then the
+    same sequence as the evaluation notebook is followed
+    '''
+    paths = config.Paths(config_file)
+    paths.event_name_selector_without_new.value = event_name
+    paths.forecast_config_selector.value = forecast_config
+    paths.unit_selector.value = units
+    paths.update_eval_options()
+
+    event = config.Event(paths)
+    geo = config.Geo(paths, event)
+    dates = config.Dates(paths, event)
+    dates.get_analysis_value_times(restrict_to_event_period)
+
+    geo.get_usgs_attributes(paths)
+    geo.update_geometry(paths, event, dates)
+    event.get_location_lists(paths, geo)
+
+    paths.set_streamflow_paths(
+        nwm_version = event.nwm_version,
+        domain=event.domain,
+        reach_set=reach_set
+    )
+
+    return paths, event, geo, dates
+
+def get_flow_metrics_table(
+    paths: config.Paths,
+    event: config.Event,
+    geo: config.Geo,
+    dates: config.Dates,
+) -> pd.DataFrame:
+    '''
+    Streamflow metrics with attributes and derived metrics for
+    all event gages (same content as the dashboards, no geometry)
+    '''
+    attributes_df = geo.usgs_points_subset[['id','name'] + geo.attribute_list]
+
+    df = data.teehr_get_flow_metrics_batch_derived(
+        event.usgs_id_list_with_prefix,
+        paths.streamflow_filepaths,
+        dates,
+        paths.units,
+        pd.DataFrame(attributes_df),
+    )
+    # as the explorer - the derived metrics may be NaN by design
+    # (e.g., vol_percent_diff of a zero volume reach)
+    df = df.dropna(subset=[
+        c for c in df.columns if c not in data.DERIVED_FLOW_METRICS
+    ])
+    df = data.add_normalized_peakflow(df, paths)
+    df = data.add_normalized_volume(df, paths)
+
+    return df
+
+def get_precip_metrics_table(
+    paths: config.Paths,
+    event: config.Event,
+    dates: config.Dates,
+    polygons: str = 'huc10',
+) -> pd.DataFrame:
+    '''
+    Precipitation metrics for all event MAP polygons (no geometry)
+    '''
+    forcing_filepaths, location_id_list = data.get_forcing_locations(
+        paths,
+        event,
+        polygons
+    )
+    df = data.teehr_get_precip_metrics_batch(
+        location_id_list,
+        forcing_filepaths,
+        dates,
+        paths.units,
+    )
+
+    return df
+
+def get_store_filepath(
+    store_dir: Union[str, Path],
+    table: str,
+    event_name: str,
+    forecast_config: str,
+    units: str,
+) -> Path:
+    '''
+    One file per event, configuration and units in each table
+    of the cross-event store
+    '''
+    return Path(
+        store_dir,
+        table,
+        f"{event_name}_{forecast_config}_{units}.parquet"
+    )
+
+def evaluate_event(
+    config_file: Union[str, Path],
+    event_name: str,
+    store_dir: Union[str, Path],
+    forecast_config: str = 'short_range',
+    units: str = 'english',
+    restrict_to_event_period: bool = True,
+    overwrite: bool = False,
+) -> dict:
+    '''
+    Compute and store the metric tables for a single event, returns
+    a summary record (exceptions are captured, not raised, so one
+    failed event does not stop the batch)
+    '''
+    start_time = time.time()
+    summary = dict(
+        event_name=event_name,
+        forecast_config=forecast_config,
+        status='complete',
+        message='',
+    )
+    tables = dict(
+        flow_metrics=get_store_filepath(
+            store_dir, 'flow_metrics', event_name, forecast_config, units
+        ),
+        precip_metrics=get_store_filepath(
+            store_dir, 'precip_metrics', event_name, forecast_config, units
+        ),
+    )
+    if not overwrite and all(p.exists() for p in tables.values()):
+        summary['status'] = 'skipped'
+        return summary
+
+    try:
+        paths, event, geo, dates = get_event_objects(
+            config_file,
+            event_name,
+            forecast_config,
+            units,
+            restrict_to_event_period,
+        )
+        table_dfs = dict(
+            flow_metrics=get_flow_metrics_table(paths, event, geo, dates),
+            precip_metrics=get_precip_metrics_table(paths, event, dates),
+        )
+        for table, df in table_dfs.items():
+            df.insert(0, 'event_name', event_name)
+            df.insert(1, 'forecast_config', forecast_config)
+            df.insert(2, 'nwm_version', event.nwm_version)
+
+            filepath = tables[table]
+            filepath.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = filepath.with_suffix('.tmp')
+            df.to_parquet(temp_path)
+            temp_path.replace(filepath)
+            summary[table + '_rows'] = len(df)
+
+    except Exception as e:
+        summary['status'] = 'failed'
+        summary['message'] = f"{type(e).__name__}: {e}"
+        summary['traceback'] = traceback.format_exc()
+
+    summary['minutes'] = round((time.time() - start_time) / 60, 2)
+
+    return summary
+
+def preload_parquet_cache(
+    config_file: Union[str, Path]
+):
+    '''
+    Enable the shared cache and read all geometry, crosswalk and
+    attribute files listed in the config file once
+    '''
+    paths = config.Paths(config_file)
+    user_config = paths.config_file_contents
+
+    config.PARQUET_CACHE = {}
+    for parent, key in [
+        (paths.geo_dir, "GEO_FILES_CONUS"),
+        (paths.cross_dir, "CROSSWALK_FILES_CONUS"),
+        (paths.attribute_dir, "USGS_ATTRIBUTES_CONUS"),
+    ]:
+        for filename in user_config.get(key, {}).values():
+            filepath = Path(parent, filename)
+            if filepath.exists():
+                config.read_parquet_file(filepath)
+
+def initialize_worker(
+    use_cache: bool
+):
+    '''
+    Worker initializer - forked workers inherit the preloaded cache,
+    spawned workers start an empty cache that fills on first use
+    '''
+    if use_cache and config.PARQUET_CACHE is None:
+        config.PARQUET_CACHE = {}
+
+def run_batch(
+    config_file: Union[str, Path],
+    event_names: List[str],
+    store_dir: Union[str, Path, None] = None,
+    forecast_configs: List[str] = ['short_range'],
+    units: str = 'english',
+    restrict_to_event_period: bool = True,
+    max_workers: Union[int, None] = None,
+    use_cache: bool = True,
+    overwrite: bool = False,
+) -> pd.DataFrame:
+    '''
+    Evaluate a list of events (x forecast configurations) in parallel
+    on a process pool and write the metric tables to the cross-event
+    store (default EVENTS_DIR/batch_metrics), returns a summary table
+    '''
+    if store_dir is None:
+        store_dir = Path(config.Paths(config_file).events_dir, 'batch_metrics')
+
+    # read shared files once in the parent so forked workers share them
+    if use_cache:
+        preload_parquet_cache(config_file)
+    if 'fork' in multiprocessing.get_all_start_methods():
+        mp_context = multiprocessing.get_context('fork')
+    else:
+        mp_context = None
+
+    summaries = []
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=mp_context,
+        initializer=initialize_worker,
+        initargs=(use_cache,),
+    ) as executor:
+        futures = [
+            executor.submit(
+                evaluate_event,
+                config_file,
+                event_name,
+                store_dir,
+                forecast_config,
+                units,
+                restrict_to_event_period,
+                overwrite,
+            )
+            for event_name in event_names
+            for forecast_config in forecast_configs
+        ]
+        for future in as_completed(futures):
+            summary = future.result()
+            print(f"{summary['event_name']} ({summary['forecast_config']}): "\
+                  f"{summary['status']} {summary['message']}")
+            summaries.append(summary)
+
+    summary_df = pd.DataFrame(summaries)
+
+    return summary_df
+
+def read_batch_store(
+    store_dir: Union[str, Path],
+    table: str = 'flow_metrics',
+) -> pd.DataFrame:
+    '''
+    Read one table (flow_metrics or precip_metrics) across all events
+    '''
+    filepaths = sorted(Path(store_dir, table).glob("*.parquet"))
+    if not filepaths:
+        raise ValueError(f"No {table} files found in {store_dir}")
+
+    return pd.concat([pd.read_parquet(f) for f in filepaths])
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description="Batch evaluation of post-event studies"
+    )
+    parser.add_argument("config_file")
+    parser.add_argument("event_names", nargs="*",
+                        help="event names (default all defined events)")
+    parser.add_argument("--store-dir", default=None)
+    parser.add_argument("--forecast-configs", nargs="+",
+                        default=['short_range'])
+    parser.add_argument("--units", default='english')
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--full-forecast-period", action="store_true")
+    parser.add_argument("--overwrite", action="store_true")
+    args = parser.parse_args()
+
+    event_names = args.event_names
+    if not event_names:
+        event_names = list(config.Paths(args.config_file).existing_events.keys())
+
+    summary_df = run_batch(
+        args.config_file,
+        event_names,
+        store_dir=args.store_dir,
+        forecast_configs=args.forecast_configs,
+        units=args.units,
+        restrict_to_event_period=not args.full_forecast_period,
+        max_workers=args.workers,
+        use_cache=not args.no_cache,
+        overwrite=args.overwrite,
+    )
+    print(summary_df.drop(columns=['traceback'], errors='ignore'))
@@ -0,0 +1,5 @@
+# __init__.py
+from . import synthetic
+from . import suite
+from . import replay
+from . import standin
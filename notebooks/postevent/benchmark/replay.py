@@ -0,0 +1,412 @@
+'''
+click-latency replay - applies a recorded or scripted sequence of map
+selections (point_stream.index, coord_stream x/y) and reference time
+changes (ref_time_str) to a ForecastExplorer without a browser, calls
+the param.depends callbacks that depend on each change (as the served
+dashboard would) and reports callback latency percentiles and query counts
+
+example (from the notebooks directory):
+    python -m postevent.benchmark.replay post_event_config_teehrhub.json \
+        <event_name> --dashboard ts_summary --trace trace.json
+'''
+import argparse
+import importlib
+import json
+import time
+import numpy as np
+import pandas as pd
+import geoviews as gv
+import holoviews as hv
+
+from datetime import datetime
+from pathlib import Path
+from typing import List, Union
+
+from .. import batch
+from ..utils import timing
+from ..viz import class_explorer
+
+# trace event actions and the explorer values they change
+ACTION_DEPENDENCIES = dict(
+    point=['point_stream.index'],
+    coord=['coord_stream.x', 'coord_stream.y'],
+    ref_time=['ref_time_str'],
+)
+PERCENTILES = [50, 95, 99]
+
+
+class TraceRecorder:
+    '''
+    Records the selections made in a live dashboard (notebook or served)
+    as a replayable trace - points are stored by location id, so a trace
+    does not depend on the row order of the plotted points
+    '''
+    def __init__(self, dash_class):
+        self.dash_class = dash_class
+        self.events = []
+        self.t_start = time.perf_counter()
+
+        dash_class.point_stream.add_subscriber(self.record_point)
+        dash_class.coord_stream.add_subscriber(self.record_coord)
+        dash_class.param.watch(self.record_ref_time, 'ref_time_str')
+
+    def add_event(self, event):
+        event['time'] = round(time.perf_counter() - self.t_start, 3)
+        self.events.append(event)
+
+    def record_point(self, index):
+        if index == [np.nan]:
+            return
+        event = dict(action='point', index=list(index), point_id=None)
+        if index:
+            gdf = get_stream_data(self.dash_class.point_stream)
+            if gdf is not None:
+                event['point_id'] = get_point_id(gdf.iloc[index[0]])
+        self.add_event(event)
+
+    def record_coord(self, x, y):
+        if x is np.nan:
+            return
+        self.add_event(dict(action='coord', x=float(x), y=float(y)))
+
+    def record_ref_time(self, change):
+        self.add_event(dict(action='ref_time', ref_time_str=change.new))
+
+    def save(
+        self,
+        filepath: Union[str, Path]
+    ) -> Path:
+
+        return write_trace(self.events, filepath)
+
+
+def write_trace(
+    trace: List[dict],
+    filepath: Union[str, Path],
+) -> Path:
+
+    filepath = Path(filepath)
+    with open(filepath, 'w') as f:
+        json.dump(trace, f, indent=1)
+    print(f"{len(trace)} trace events written to {filepath}")
+
+    return filepath
+
+def read_trace(
+    filepath: Union[str, Path]
+) -> List[dict]:
+
+    with open(filepath) as f:
+        trace = json.load(f)
+    for event in trace:
+        if event.get('action') not in ACTION_DEPENDENCIES:
+            raise ValueError(f"Trace action {event.get('action')} not "\
+                             f"recognized, options are "\
+                             f"{list(ACTION_DEPENDENCIES.keys())}")
+    return trace
+
+def get_stream_data(
+    stream
+) -> Union[pd.DataFrame, None]:
+    '''
+    Data plotted by the stream source (same lookup as the explorer)
+    '''
+    if stream.source is None:
+        return None
+    if type(stream.source) == hv.DynamicMap:
+        return stream.source.data[()].data
+    return stream.source.data
+
+def get_point_id(
+    selected_point: pd.Series
+) -> str:
+
+    if 'primary_location_id' in selected_point.index:
+        return selected_point['primary_location_id']
+    return selected_point['location_id']
+
+def attach_point_source(
+    dash_class: class_explorer.ForecastExplorer
+):
+    '''
+    Without a built dashboard the point stream has no source,
+    use the flow points (as plotted by the gage maps)
+    '''
+    if dash_class.point_stream.source is None:
+        dash_class.point_stream.source = gv.Points(
+            dash_class.flow_points_gdf[
+                ['geometry','primary_location_id','name']
+            ]
+        )
+
+def get_scripted_trace(
+    dash_class: class_explorer.ForecastExplorer,
+    n_events: int = 50,
+    action_weights: dict = dict(point=0.5, coord=0.25, ref_time=0.25),
+    seed: int = 0,
+) -> List[dict]:
+    '''
+    Random interaction sequence - gage clicks, clicks within the map
+    polygons and reference time changes, in the given proportions
+    '''
+    actions = [a for a in action_weights if a in ACTION_DEPENDENCIES]
+    if dash_class.explore_streamflow is False and 'point' in actions:
+        actions.remove('point')
+    if dash_class.explore_precip is False and 'coord' in actions:
+        actions.remove('coord')
+    if not actions:
+        raise ValueError("No trace actions apply to this explorer")
+
+    rng = np.random.default_rng(seed)
+    weights = np.array([action_weights[a] for a in actions], dtype=float)
+    point_ids = []
+    if 'point' in actions:
+        point_ids = dash_class.flow_points_gdf['primary_location_id'].to_list()
+    coords = []
+    if 'coord' in actions:
+        coords = dash_class.map_polys_gdf['geometry'].representative_point()
+        coords = [(p.x, p.y) for p in coords]
+
+    trace = []
+    for action in rng.choice(actions, size=n_events, p=weights/weights.sum()):
+        if action == 'point':
+            point_id = point_ids[rng.integers(len(point_ids))]
+            trace.append(dict(action='point', point_id=point_id))
+        elif action == 'coord':
+            x, y = coords[rng.integers(len(coords))]
+            trace.append(dict(action='coord', x=float(x), y=float(y)))
+        else:
+            ref_time_str = dash_class.ref_time_list_str[
+                rng.integers(len(dash_class.ref_time_list_str))
+            ]
+            trace.append(dict(action='ref_time', ref_time_str=ref_time_str))
+
+    return trace
+
+def get_callbacks(
+    dash_class: class_explorer.ForecastExplorer,
+    methods: Union[List[str], None] = None,
+) -> dict:
+    '''
+    param.depends methods of the explorer (in definition order)
+    and their dependencies
+    '''
+    callbacks = {}
+    for name, method in vars(type(dash_class)).items():
+        if not callable(method) or not hasattr(method, '_dinfo'):
+            continue
+        if methods is not None and name not in methods:
+            continue
+        callbacks[name] = list(method._dinfo.get('dependencies', []))
+
+    return callbacks
+
+def apply_event(
+    dash_class: class_explorer.ForecastExplorer,
+    event: dict,
+):
+    '''
+    Set the stream values (or reference time) of one trace event,
+    without triggering the stream subscribers - the callbacks are
+    called by replay_trace
+
+    As in the dashboards, a gage click resets the xy selection and
+    an xy click resets the gage selection
+    '''
+    action = event['action']
+    if action == 'point':
+        index = event.get('index')
+        if event.get('point_id') is not None:
+            gdf = get_stream_data(dash_class.point_stream)
+            point_ids = gdf.apply(get_point_id, axis=1).to_numpy()
+            matches = np.flatnonzero(point_ids == event['point_id'])
+            index = [int(matches[0])] if len(matches) else []
+        dash_class.coord_stream.update(x=np.nan, y=np.nan)
+        dash_class.point_stream.update(index=index)
+    elif action == 'coord':
+        dash_class.point_stream.update(index=[np.nan])
+        dash_class.coord_stream.update(x=event['x'], y=event['y'])
+    elif action == 'ref_time':
+        dash_class.ref_time_str = event['ref_time_str']
+    else:
+        raise ValueError(f"Trace action {action} not recognized, "\
+                         f"options are {list(ACTION_DEPENDENCIES.keys())}")
+
+def count_query_records(
+    start: datetime
+) -> int:
+
+    return sum(
+        1 for record in list(timing.TIMING_RECORDS)
+        if record['stage'] == 'query' and record['start'] >= start
+    )
+
+def replay_trace(
+    dash_class: class_explorer.ForecastExplorer,
+    trace: List[dict],
+    methods: Union[List[str], None] = None,
+) -> pd.DataFrame:
+    '''
+    Replay a trace, one row per callback call with its latency,
+    TEEHR queries (timing records) and explorer query counts
+    '''
+    attach_point_source(dash_class)
+    callbacks = get_callbacks(dash_class, methods)
+
+    records = []
+    for i, event in enumerate(trace):
+        apply_event(dash_class, event)
+        changed = ACTION_DEPENDENCIES[event['action']]
+        for name, dependencies in callbacks.items():
+            if not any(d in changed for d in dependencies):
+                continue
+
+            flow_count = getattr(dash_class, 'count_flow_queries', 0)
+            precip_count = getattr(dash_class, 'count_precip_queries', 0)
+            start = datetime.now()
+            error = ''
+            t_start = time.perf_counter()
+            try:
+                getattr(dash_class, name)()
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            seconds = time.perf_counter() - t_start
+
+            records.append(dict(
+                event=i,
+                action=event['action'],
+                method=name,
+                seconds=seconds,
+                teehr_queries=count_query_records(start),
+                flow_queries=getattr(dash_class, 'count_flow_queries', 0) \
+                    - flow_count,
+                precip_queries=getattr(dash_class, 'count_precip_queries', 0) \
+                    - precip_count,
+                error=error,
+            ))
+
+    return pd.DataFrame(records)
+
+def get_percentile_columns(
+    seconds: pd.Series
+) -> dict:
+
+    values = dict(calls=len(seconds))
+    for p in PERCENTILES:
+        values[f"p{p}_ms"] = np.percentile(seconds, p) * 1000
+    values['max_ms'] = seconds.max() * 1000
+
+    return values
+
+def summarize_replay(
+    replay_df: pd.DataFrame
+) -> pd.DataFrame:
+    '''
+    Latency percentiles (ms) and queries per call - 'interaction' rows
+    are the total over all callbacks of each trace event (what a user
+    waits for), the other rows are per callback
+    '''
+    query_columns = ['teehr_queries','flow_queries','precip_queries']
+    event_df = replay_df.groupby(['event','action']).agg(
+        seconds=('seconds','sum'),
+        **{c: (c,'sum') for c in query_columns}
+    ).reset_index()
+
+    rows = []
+    for action, df in [('all', event_df)] + list(event_df.groupby('action')):
+        row = dict(level='interaction', name=action)
+        row.update(get_percentile_columns(df['seconds']))
+        row.update({c: df[c].mean() for c in query_columns})
+        rows.append(row)
+    for name, df in replay_df.groupby('method'):
+        row = dict(level='callback', name=name)
+        row.update(get_percentile_columns(df['seconds']))
+        row.update({c: df[c].mean() for c in query_columns})
+        row['errors'] = (df['error'] != '').sum()
+        rows.append(row)
+
+    return pd.DataFrame(rows).round(3)
+
+def get_replay_explorer(
+    config_file: Union[str, Path],
+    event_name: str,
+    forecast_config: str = 'short_range',
+    dashboard: Union[str, None] = None,
+    explorer_params: Union[dict, None] = None,
+    restrict_to_event_period: bool = True,
+) -> class_explorer.ForecastExplorer:
+    '''
+    Initialized explorer for an event, optionally with a dashboard
+    built on it (e.g., 'ts_summary' for viz/build_ts_summary.py) so the
+    streams use the same sources as in the browser
+    '''
+    paths, event, geo, dates = batch.get_event_objects(
+        config_file,
+        event_name,
+        forecast_config=forecast_config,
+        restrict_to_event_period=restrict_to_event_period,
+    )
+    params = dict(
+        explore_precip=True,
+        explore_streamflow=True,
+        map_polygons='huc10',
+        ts_polygons='huc10',
+    )
+    params.update(explorer_params or {})
+    dash_class = class_explorer.ForecastExplorer(
+        paths=paths,
+        event=event,
+        geo=geo,
+        dates=dates,
+        **params
+    )
+    dash_class.initialize(restrict_to_event_period)
+
+    if dashboard is not None:
+        build_module = importlib.import_module(
+            f"..viz.build_{dashboard}",
+            package=__package__
+        )
+        build_module.build(dash_class, restrict_to_event_period)
+
+    return dash_class
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description="Replay dashboard interactions and report callback latency"
+    )
+    parser.add_argument("config_file")
+    parser.add_argument("event_name")
+    parser.add_argument("--forecast-config", default='short_range')
+    parser.add_argument("--dashboard", default=None,
+                        help="build module suffix, e.g., ts_summary")
+    parser.add_argument("--trace", default=None,
+                        help="recorded trace file (default scripted trace)")
+    parser.add_argument("--events", type=int, default=50,
+                        help="scripted trace length")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save-trace", default=None)
+    parser.add_argument("--output", default=None,
+                        help="write per-callback records (.csv)")
+    args = parser.parse_args()
+
+    dash_class = get_replay_explorer(
+        args.config_file,
+        args.event_name,
+        args.forecast_config,
+        args.dashboard,
+    )
+    attach_point_source(dash_class)
+    if args.trace:
+        trace = read_trace(args.trace)
+    else:
+        trace = get_scripted_trace(dash_class, args.events, seed=args.seed)
+    if args.save_trace:
+        write_trace(trace, args.save_trace)
+
+    replay_df = replay_trace(dash_class, trace)
+    if args.output:
+        replay_df.to_csv(args.output, index=False)
+    print(summarize_replay(replay_df).to_string(index=False))
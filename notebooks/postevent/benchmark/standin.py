@@ -0,0 +1,953 @@
+'''
+local stand-in for the NWM bucket and the USGS NWIS instantaneous values
+service - serves synthetic NWM channel_rt and forcing NetCDF files (same
+paths as the public bucket, generated on first request) and NWIS IV JSON
+over http with configurable latency, failure rate and bandwidth, plus a
+loader throughput benchmark of the package loaders (load.py, points,
+zonal and usgs) against simple reference loaders, so data loading can
+be exercised offline
+
+example (from the notebooks directory):
+    python -m postevent.benchmark.standin --latency 0.05 --failure-rate 0.02 \
+        --workers 1 4 16
+'''
+import argparse
+import json
+import re
+import threading
+import time
+import zlib
+import dask
+import numpy as np
+import pandas as pd
+import netCDF4
+import requests
+
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Callable, List, Union
+from urllib.parse import urlparse, parse_qs
+
+from ..utils import nwm
+from ..setup import load
+from ..setup import usgs
+from ..setup import zonal
+from . import synthetic
+
+NWM_PREFIX = '/national-water-model/'
+NWIS_IV_PATH = '/nwis/iv/'
+NWM_PATH_PATTERN = re.compile(
+    r"nwm\.(?P<date>\d{8})/(?P<configuration>[a-z_0-9]+)/"
+    r"nwm\.t(?P<hour>\d{2})z\.(?P<file_config>[a-z_]+)\."
+    r"(?P<output_type>channel_rt(?:_\d)?|forcing)\."
+    r"(?P<step_label>f|tm)(?P<step>\d+)\.conus\.nc$"
+)
+# NWM forcing grid origin and cell size (Lambert conformal, meters)
+GRID_X_ORIGIN = -2303999.25
+GRID_Y_ORIGIN = -1919999.625
+GRID_CELL_SIZE = 1000.0
+CFS_PER_CMS = 35.3147
+# the HDF5 library is not thread safe - all NetCDF reads and writes
+# in this process (server and loaders) take this lock
+NETCDF_LOCK = threading.Lock()
+
+
+def get_default_settings() -> dict:
+    '''
+    Stand-in service settings - latency (seconds, uniform between
+    latency and latency + latency_jitter) is added to every request,
+    failure_rate of requests return 503, bandwidth_mbps (None for
+    unlimited) limits each response, n_features reaches per channel_rt
+    file (or feature_ids) stored in chunks of feature_chunk_size reaches
+    (None for the library default), grid_shape (y, x) cells per 
+    forcing file
+    '''
+    return dict(
+        latency=0.0,
+        latency_jitter=0.0,
+        failure_rate=0.0,
+        bandwidth_mbps=None,
+        n_features=10_000,
+        feature_ids=None,
+        feature_chunk_size=None,
+        grid_shape=(384, 460),
+        compress=True,
+        seed=0,
+    )
+
+def get_path_seed(
+    path: str,
+    seed: int = 0,
+) -> int:
+    '''
+    Same synthetic content for the same path on every request
+    '''
+    return zlib.crc32(path.encode()) + seed
+
+def get_nwm_times(
+    match: re.Match
+) -> tuple:
+    '''
+    Reference and value time of an NWM file from its path
+    '''
+    reference_time = pd.Timestamp(match['date']) \
+        + pd.Timedelta(hours=int(match['hour']))
+    step = pd.Timedelta(hours=int(match['step']))
+    if match['step_label'] == 'f':
+        return reference_time, reference_time + step
+
+    return reference_time, reference_time - step
+
+def write_channel_rt_file(
+    filepath: Path,
+    match: re.Match,
+    settings: dict,
+):
+    '''
+    Synthetic channel_rt file - streamflow per feature_id, stored as
+    scaled integers as in the operational files
+    '''
+    reference_time, value_time = get_nwm_times(match)
+    feature_ids = settings['feature_ids']
+    if feature_ids is None:
+        feature_ids = np.arange(1, settings['n_features'] + 1)
+    feature_ids = np.asarray(feature_ids, dtype='int64')
+
+    # smooth hydrograph in value time, per-file noise
+    rng = np.random.default_rng(get_path_seed(match.string, settings['seed']))
+    hours = (value_time - pd.Timestamp('2000-01-01')) / pd.Timedelta(hours=1)
+    base = 1 + (feature_ids % 997) / 10
+    flow = base * (1.5 + np.sin(2 * np.pi * (hours / 240 + feature_ids / 7919)))
+    flow = flow * rng.lognormal(0, 0.05, len(feature_ids))
+
+    with netCDF4.Dataset(filepath, 'w', format='NETCDF4') as ds:
+        ds.createDimension('feature_id', len(feature_ids))
+        ds.createDimension('time', 1)
+        ds.createDimension('reference_time', 1)
+        ds.model_initialization_time = reference_time.strftime('%Y-%m-%d_%H:%M:%S')
+        ds.model_output_valid_time = value_time.strftime('%Y-%m-%d_%H:%M:%S')
+
+        var = ds.createVariable('time', 'i4', ('time',))
+        var.units = 'minutes since 1970-01-01 00:00:00 UTC'
+        var[:] = [int(value_time.timestamp() // 60)]
+        var = ds.createVariable('reference_time', 'i4', ('reference_time',))
+        var.units = 'minutes since 1970-01-01 00:00:00 UTC'
+        var[:] = [int(reference_time.timestamp() // 60)]
+        var = ds.createVariable('feature_id', 'i8', ('feature_id',))
+        var[:] = feature_ids
+
+        var = ds.createVariable(
+            'streamflow',
+            'i4',
+            ('feature_id',),
+            zlib=settings['compress'],
+            chunksizes=(min(settings['feature_chunk_size'], len(feature_ids)),)
+                if settings['feature_chunk_size'] else None,
+            fill_value=-999900,
+        )
+        var.units = 'm3 s-1'
+        var.scale_factor = 0.01
+        var.add_offset = 0.0
+        var[:] = flow
+
+def write_forcing_file(
+    filepath: Path,
+    match: re.Match,
+    settings: dict,
+):
+    '''
+    Synthetic forcing file - RAINRATE (mm/s) on the forcing grid,
+    a storm that moves across the grid over a few days
+    '''
+    reference_time, value_time = get_nwm_times(match)
+    ny, nx = settings['grid_shape']
+    cell_size = GRID_CELL_SIZE * 4608 / nx
+    x = GRID_X_ORIGIN + cell_size * np.arange(nx)
+    y = GRID_Y_ORIGIN + cell_size * np.arange(ny)
+
+    hours = (value_time - pd.Timestamp('2000-01-01')) / pd.Timedelta(hours=1)
+    phase = (hours % 96) / 96
+    center_x, center_y = nx * phase, ny * (0.3 + 0.4 * phase)
+    xx, yy = np.meshgrid(np.arange(nx), np.arange(ny))
+    distance = np.hypot(xx - center_x, yy - center_y) / (0.1 * nx)
+    rate_mm_hr = 25 * np.exp(-distance**2)
+    rng = np.random.default_rng(get_path_seed(match.string, settings['seed']))
+    rate_mm_hr *= rng.uniform(0.8, 1.2, rate_mm_hr.shape)
+
+    with netCDF4.Dataset(filepath, 'w', format='NETCDF4') as ds:
+        ds.createDimension('time', 1)
+        ds.createDimension('reference_time', 1)
+        ds.createDimension('y', ny)
+        ds.createDimension('x', nx)
+
+        var = ds.createVariable('time', 'i4', ('time',))
+        var.units = 'minutes since 1970-01-01 00:00:00 UTC'
+        var[:] = [int(value_time.timestamp() // 60)]
+        var = ds.createVariable('reference_time', 'i4', ('reference_time',))
+        var.units = 'minutes since 1970-01-01 00:00:00 UTC'
+        var[:] = [int(reference_time.timestamp() // 60)]
+        ds.createVariable('x', 'f8', ('x',))[:] = x
+        ds.createVariable('y', 'f8', ('y',))[:] = y
+
+        var = ds.createVariable(
+            'RAINRATE',
+            'f4',
+            ('time','y','x'),
+            zlib=settings['compress'],
+            chunksizes=(1, min(ny, 768), min(nx, 922)),
+        )
+        var.units = 'mm s^-1'
+        var[0,:,:] = rate_mm_hr / 3600
+
+def get_nwm_file(
+    cache_dir: Path,
+    path: str,
+    settings: dict,
+    lock: threading.Lock,
+) -> Union[Path, None]:
+    '''
+    Local file for a bucket path (written on first request),
+    None if the path is not an NWM file name
+    '''
+    match = NWM_PATH_PATTERN.search(path)
+    if match is None:
+        return None
+    filepath = Path(cache_dir, match.group(0))
+    if filepath.exists():
+        return filepath
+
+    with lock:
+        if not filepath.exists():
+            filepath.parent.mkdir(parents=True, exist_ok=True)
+            temp_filepath = filepath.with_suffix('.tmp')
+            with NETCDF_LOCK:
+                if match['output_type'] == 'forcing':
+                    write_forcing_file(temp_filepath, match, settings)
+                else:
+                    write_channel_rt_file(temp_filepath, match, settings)
+            temp_filepath.rename(filepath)
+
+    return filepath
+
+def get_nwis_iv_json(
+    query: dict,
+    settings: dict,
+) -> dict:
+    '''
+    WaterML JSON response of the NWIS IV service (discharge,
+    15-minute values in ft3/s) for the requested sites and period
+    '''
+    sites = query.get('sites', [''])[0].split(',')
+    start = pd.Timestamp(query['startDT'][0]).tz_localize(None)
+    end = pd.Timestamp(query['endDT'][0]).tz_localize(None)
+    value_times = pd.date_range(start, end, freq='15min')
+    hours = np.asarray((value_times - pd.Timestamp('2000-01-01')) \
+        / pd.Timedelta(hours=1))
+    date_times = value_times.strftime('%Y-%m-%dT%H:%M:%S.000+00:00')
+
+    time_series = []
+    for site in [s for s in sites if s]:
+        site_seed = get_path_seed(site, settings['seed'])
+        rng = np.random.default_rng(site_seed)
+        base = rng.uniform(10, 5000)
+        flow_cfs = base * (1.5 + np.sin(2 * np.pi * (hours / 240 + site_seed % 97 / 97)))
+        values = [
+            dict(value=f"{v:.2f}", qualifiers=['P'], dateTime=t)
+            for v, t in zip(flow_cfs, date_times)
+        ]
+        time_series.append(dict(
+            name=f"USGS:{site}:00060:00000",
+            sourceInfo=dict(
+                siteName=f"SYNTHETIC GAGE {site}",
+                siteCode=[dict(value=site, network='NWIS', agencyCode='USGS')],
+            ),
+            variable=dict(
+                variableCode=[dict(value='00060', network='NWIS')],
+                unit=dict(unitCode='ft3/s'),
+                noDataValue=-999999.0,
+            ),
+            values=[dict(value=values, qualifier=[dict(qualifierCode='P')])],
+        ))
+
+    return dict(value=dict(
+        queryInfo=dict(queryURL=query.get('_url', '')),
+        timeSeries=time_series,
+    ))
+
+
+class StandinServer:
+    '''
+    Threaded http stand-in for the NWM bucket (base_url + '/national-water-model')
+    and NWIS IV service (base_url + '/nwis/iv/'), supports Range and HEAD
+    requests as used by fsspec/kerchunk, counts requests, bytes and failures
+
+    use as a context manager, e.g.,
+        with StandinServer(cache_dir, latency=0.05) as server:
+            urls = nwm.get_nwm_file_list(..., base_url=server.nwm_base_url)
+    '''
+    def __init__(
+        self,
+        cache_dir: Union[str, Path],
+        host: str = '127.0.0.1',
+        port: int = 0,
+        **settings
+    ):
+        unknown = [k for k in settings if k not in get_default_settings()]
+        if unknown:
+            raise ValueError(f"Stand-in settings {unknown} not recognized, "\
+                             f"options are {list(get_default_settings().keys())}")
+        self.settings = dict(get_default_settings(), **settings)
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.rng = np.random.default_rng(self.settings['seed'])
+        self.lock = threading.Lock()
+        self.file_lock = threading.Lock()
+        self.stats = dict(requests=0, failures=0, bytes_sent=0)
+
+        self.httpd = ThreadingHTTPServer((host, port), self.get_handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def nwm_base_url(self) -> str:
+        return self.base_url + NWM_PREFIX.rstrip('/')
+
+    @property
+    def nwis_base_url(self) -> str:
+        return self.base_url + NWIS_IV_PATH
+
+    def start(self):
+        self.thread = threading.Thread(
+            target=self.httpd.serve_forever,
+            daemon=True
+        )
+        self.thread.start()
+        print(f"stand-in service running at {self.base_url}")
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def update_settings(self, **settings):
+        '''
+        Change latency, failure rate or bandwidth while running
+        '''
+        with self.lock:
+            self.settings.update(settings)
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats = dict(requests=0, failures=0, bytes_sent=0)
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.stats[name] += n
+
+    def draw_delay_and_failure(self) -> tuple:
+        with self.lock:
+            settings = self.settings
+            delay = settings['latency'] \
+                + settings['latency_jitter'] * self.rng.random()
+            failed = self.rng.random() < settings['failure_rate']
+        return delay, failed
+
+    def get_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def log_message(self, *args):
+                pass
+
+            def send_body(self, body: bytes):
+                bandwidth = server.settings['bandwidth_mbps']
+                if not bandwidth:
+                    self.wfile.write(body)
+                else:
+                    chunk_size = 256 * 1024
+                    for i in range(0, len(body), chunk_size):
+                        chunk = body[i:i + chunk_size]
+                        self.wfile.write(chunk)
+                        time.sleep(len(chunk) * 8 / (bandwidth * 1e6))
+                server.count('bytes_sent', len(body))
+
+            def respond(self, send_body: bool):
+                server.count('requests')
+                delay, failed = server.draw_delay_and_failure()
+                time.sleep(delay)
+                if failed:
+                    server.count('failures')
+                    self.send_error(503, "stand-in failure")
+                    return
+
+                url = urlparse(self.path)
+                if url.path.startswith(NWM_PREFIX):
+                    filepath = get_nwm_file(
+                        server.cache_dir,
+                        url.path[len(NWM_PREFIX):],
+                        server.settings,
+                        server.file_lock,
+                    )
+                    if filepath is None:
+                        self.send_error(404)
+                        return
+                    self.send_file(filepath, send_body)
+                elif url.path.rstrip('/') == NWIS_IV_PATH.rstrip('/'):
+                    query = parse_qs(url.query)
+                    if 'startDT' not in query or 'endDT' not in query:
+                        self.send_error(400, "startDT and endDT are required")
+                        return
+                    query['_url'] = self.path
+                    body = json.dumps(get_nwis_iv_json(query, server.settings))
+                    body = body.encode()
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    if send_body:
+                        self.send_body(body)
+                else:
+                    self.send_error(404)
+
+            def send_file(self, filepath: Path, send_body: bool):
+                size = filepath.stat().st_size
+                start, end = 0, size - 1
+                byte_range = self.headers.get('Range')
+                if byte_range:
+                    match = re.match(r"bytes=(\d*)-(\d*)", byte_range)
+                    if match is None:
+                        self.send_error(416)
+                        return
+                    if match[1]:
+                        start = int(match[1])
+                        end = int(match[2]) if match[2] else size - 1
+                    else:
+                        # suffix range - last n bytes
+                        start = max(size - int(match[2]), 0)
+                    end = min(end, size - 1)
+                    self.send_response(206)
+                    self.send_header('Content-Range', f"bytes {start}-{end}/{size}")
+                else:
+                    self.send_response(200)
+                self.send_header('Content-Type', 'application/x-netcdf')
+                self.send_header('Content-Length', str(end - start + 1))
+                self.send_header('Accept-Ranges', 'bytes')
+                self.end_headers()
+                if send_body:
+                    with open(filepath, 'rb') as f:
+                        f.seek(start)
+                        self.send_body(f.read(end - start + 1))
+
+            def do_GET(self):
+                self.respond(send_body=True)
+
+            def do_HEAD(self):
+                self.respond(send_body=False)
+
+        return Handler
+
+
+def get_with_retries(
+    session: requests.Session,
+    url: str,
+    params: Union[dict, None] = None,
+    retries: int = 3,
+    backoff: float = 0.5,
+    timeout: float = 60,
+) -> requests.Response:
+    '''
+    GET with exponential backoff on connection errors and 5xx responses
+    '''
+    for attempt in range(retries + 1):
+        try:
+            response = session.get(url, params=params, timeout=timeout)
+            if response.status_code < 500:
+                response.raise_for_status()
+                return response
+            error = requests.HTTPError(f"{response.status_code} for {url}")
+        except requests.ConnectionError as e:
+            error = e
+        if attempt < retries:
+            time.sleep(backoff * 2**attempt)
+
+    raise error
+
+def read_channel_rt(
+    content: bytes,
+    feature_ids: np.ndarray,
+) -> pd.DataFrame:
+    '''
+    Streamflow for feature_ids from an in-memory channel_rt file
+    '''
+    # only the HDF5 reads hold the lock, subsetting runs concurrently
+    with NETCDF_LOCK, netCDF4.Dataset('inmemory.nc', memory=content) as ds:
+        all_ids = ds['feature_id'][:].data
+        all_values = ds['streamflow'][:]
+        time_minutes = int(ds['time'][0])
+        reference_time_minutes = int(ds['reference_time'][0])
+
+    mask = np.isin(all_ids, feature_ids)
+    values = all_values[mask]
+    value_time = pd.Timestamp(time_minutes * 60, unit='s')
+    reference_time = pd.Timestamp(reference_time_minutes * 60, unit='s')
+
+    return pd.DataFrame(dict(
+        location_id=all_ids[mask],
+        value=np.ma.filled(values.astype('float32'), np.nan),
+        value_time=value_time,
+        reference_time=reference_time,
+    ))
+
+def load_channel_rt_urls(
+    urls: List[str],
+    feature_ids: np.ndarray,
+    n_workers: int = 8,
+    retries: int = 3,
+) -> pd.DataFrame:
+    '''
+    Reference loader - downloads and subsets channel_rt files with a
+    thread pool, returns TEEHR-schema time series
+    '''
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=n_workers)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    def load(url):
+        response = get_with_retries(session, url, retries=retries)
+        return read_channel_rt(response.content, feature_ids)
+
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        df = pd.concat(list(executor.map(load, urls)), ignore_index=True)
+    df['location_id'] = 'nwm22-' + df['location_id'].astype(str)
+    df['measurement_unit'] = 'm3/s'
+    df['variable_name'] = 'streamflow'
+
+    return df
+
+def load_nwis_iv(
+    base_url: str,
+    site_ids: List[str],
+    start: pd.Timestamp,
+    end: pd.Timestamp,
+    n_workers: int = 8,
+    sites_per_request: int = 100,
+    retries: int = 3,
+) -> pd.DataFrame:
+    '''
+    Reference loader - NWIS IV discharge in batches of sites with
+    a thread pool, returns TEEHR-schema time series (m3/s)
+    '''
+    session = requests.Session()
+    batches = [
+        site_ids[i:i + sites_per_request]
+        for i in range(0, len(site_ids), sites_per_request)
+    ]
+    def load(batch):
+        response = get_with_retries(
+            session,
+            base_url,
+            params=dict(
+                format='json',
+                sites=','.join(batch),
+                startDT=start.strftime('%Y-%m-%dT%H:%MZ'),
+                endDT=end.strftime('%Y-%m-%dT%H:%MZ'),
+                parameterCd='00060',
+            ),
+            retries=retries,
+        )
+        dfs = []
+        for ts in response.json()['value']['timeSeries']:
+            values = pd.DataFrame(ts['values'][0]['value'])
+            dfs.append(pd.DataFrame(dict(
+                location_id='usgs-' + ts['sourceInfo']['siteCode'][0]['value'],
+                value_time=pd.to_datetime(values['dateTime'], utc=True) \
+                    .dt.tz_localize(None),
+                value=values['value'].astype(float) / CFS_PER_CMS,
+            )))
+        return pd.concat(dfs, ignore_index=True) if dfs else pd.DataFrame()
+
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        df = pd.concat(list(executor.map(load, batches)), ignore_index=True)
+    df['measurement_unit'] = 'm3/s'
+    df['variable_name'] = 'streamflow'
+    df['configuration'] = 'usgs'
+
+    return df
+
+def get_loader_paths(
+    server: StandinServer,
+    work_dir: Union[str, Path],
+) -> SimpleNamespace:
+    '''
+    The config.Paths attributes used by the package loaders, pointed
+    at the stand-in (as NWM_BASE_URL and USGS_IV_URL in a config file)
+    '''
+    return SimpleNamespace(
+        zarr_dir=Path(work_dir, 'zarr'),
+        zonal_dir=None,
+        warehouse_dir=None,
+        nwm_base_url=server.nwm_base_url,
+        usgs_iv_url=server.nwis_base_url,
+    )
+
+def get_standin_weights(
+    n_polygons: int,
+    grid_shape: tuple,
+    cells_per_polygon: int = 50,
+    seed: int = 0,
+) -> pd.DataFrame:
+    '''
+    Grid weights of n_polygons square polygons at random locations
+    of the stand-in forcing grid (columns as the grid weights files)
+    '''
+    rng = np.random.default_rng(seed)
+    side = int(np.ceil(np.sqrt(cells_per_polygon)))
+    dfs = []
+    for i in range(n_polygons):
+        row = rng.integers(0, grid_shape[0] - side)
+        col = rng.integers(0, grid_shape[1] - side)
+        rows, cols = np.meshgrid(
+            np.arange(row, row + side),
+            np.arange(col, col + side),
+            indexing='ij'
+        )
+        dfs.append(pd.DataFrame(dict(
+            location_id=f"standin-{i:05d}",
+            row=rows.ravel(),
+            col=cols.ravel(),
+            weight=1.0 / rows.size,
+        )))
+
+    return pd.concat(dfs, ignore_index=True)
+
+def load_points_package(
+    paths: SimpleNamespace,
+    event: SimpleNamespace,
+    configuration: str,
+    output_type: str,
+    days: List[pd.Timestamp],
+    output_dir: Union[str, Path],
+    n_workers: int = 8,
+) -> pd.DataFrame:
+    '''
+    Package loader - load.load_nwm_streamflow (gaged reaches, chunk
+    reads with points.py) for each day on n_workers dask threads,
+    returns the parquet output
+    '''
+    with dask.config.set(scheduler='threads', num_workers=n_workers):
+        for day in days:
+            load.load_nwm_streamflow(
+                paths,
+                event,
+                configuration,
+                output_type,
+                day,
+                Path(output_dir),
+                overwrite_output=True,
+            )
+
+    return pd.read_parquet(output_dir)
+
+def load_zonal_package(
+    paths: SimpleNamespace,
+    configuration: str,
+    days: List[pd.Timestamp],
+    weights: pd.DataFrame,
+    output_dir: Union[str, Path],
+    n_workers: int = 8,
+) -> pd.DataFrame:
+    '''
+    Package loader - zonal.nwm_grids_to_parquet_multi (windowed grid
+    reads, as load.py runs it) for each day on n_workers dask threads,
+    returns the parquet output
+    '''
+    with dask.config.set(scheduler='threads', num_workers=n_workers):
+        for day in days:
+            zonal.nwm_grids_to_parquet_multi(
+                configuration,
+                day,
+                1,
+                dict(standin=weights),
+                dict(standin=output_dir),
+                base_url=paths.nwm_base_url,
+                cache_dir=paths.zonal_dir,
+                overwrite_output=True,
+            )
+
+    return pd.read_parquet(output_dir)
+
+def load_usgs_package(
+    paths: SimpleNamespace,
+    site_ids: List[str],
+    start: pd.Timestamp,
+    end: pd.Timestamp,
+    output_dir: Union[str, Path],
+    n_workers: int = 8,
+) -> pd.DataFrame:
+    '''
+    Package loader - usgs.usgs_to_parquet (planned concurrent
+    requests, as load.py runs it), returns the parquet output
+    '''
+    usgs.usgs_to_parquet(
+        site_ids,
+        start,
+        end,
+        output_dir,
+        base_url=paths.usgs_iv_url,
+        n_workers=n_workers,
+        overwrite_output=True,
+    )
+
+    return pd.read_parquet(output_dir)
+
+def compare_timeseries(
+    df: pd.DataFrame,
+    reference_df: pd.DataFrame,
+    keys: List[str],
+) -> dict:
+    '''
+    Rows of a loader output matching the reference loader output on
+    keys, and the largest value difference of the matched rows
+    '''
+    merged = df[keys + ['value']].merge(
+        reference_df[keys + ['value']],
+        on=keys,
+        how='outer',
+        suffixes=('', '_reference'),
+        indicator=True,
+    )
+    matched = merged[merged['_merge'] == 'both']
+    max_abs_diff = (matched['value'] - matched['value_reference']).abs().max()
+
+    return dict(
+        rows=len(df),
+        reference_rows=len(reference_df),
+        matched_rows=len(matched),
+        max_abs_diff=float(max_abs_diff) if len(matched) > 0 else None,
+    )
+
+def benchmark_loader(
+    server: StandinServer,
+    loader: Callable,
+    workers: List[int] = [1, 4, 16],
+    repeat: int = 1,
+    **loader_kwargs
+) -> pd.DataFrame:
+    '''
+    Throughput of a loader (called as loader(n_workers=n, **loader_kwargs))
+    per worker count - files/requests, MB and rows per second, failures
+    '''
+    results = []
+    for n_workers in workers:
+        for i in range(repeat):
+            server.reset_stats()
+            t_start = time.perf_counter()
+            error = ''
+            rows = 0
+            try:
+                df = loader(n_workers=n_workers, **loader_kwargs)
+                rows = len(df)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            seconds = time.perf_counter() - t_start
+            stats = dict(server.stats)
+            results.append(dict(
+                loader=getattr(loader, '__name__', str(loader)),
+                n_workers=n_workers,
+                seconds=round(seconds, 3),
+                requests=stats['requests'],
+                failures=stats['failures'],
+                mb=round(stats['bytes_sent'] / 1e6, 3),
+                mb_per_second=round(stats['bytes_sent'] / 1e6 / seconds, 3),
+                requests_per_second=round(stats['requests'] / seconds, 2),
+                rows=rows,
+                error=error,
+            ))
+
+    return pd.DataFrame(results)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description="Loader throughput against the local NWM/NWIS stand-in"
+    )
+    parser.add_argument("--cache-dir", default="postevent_standin")
+    parser.add_argument("--work-dir", default="postevent_standin_loads")
+    parser.add_argument("--configuration", default='short_range',
+                        choices=list(nwm.NWM_FILE_SPECS.keys()))
+    parser.add_argument("--days", type=int, default=1)
+    parser.add_argument("--features", type=int, default=10_000,
+                        help="reaches per channel_rt file")
+    parser.add_argument("--subset", type=int, default=1_000,
+                        help="reaches loaded per file")
+    parser.add_argument("--gages", type=int, default=500)
+    parser.add_argument("--polygons", type=int, default=200,
+                        help="polygons of the mean areal precipitation")
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--latency-jitter", type=float, default=0.05)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--bandwidth-mbps", type=float, default=None)
+    parser.add_argument("--workers", nargs="+", type=int, default=[1, 4, 16])
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    start_date = pd.Timestamp(synthetic.EVENT_START_DATE)
+    days = [start_date + pd.Timedelta(days=d) for d in range(args.days)]
+    end_date = start_date + pd.Timedelta(days=args.days, minutes=-1)
+    rng = np.random.default_rng(0)
+    feature_ids = rng.choice(
+        np.arange(1, args.features + 1),
+        size=min(args.subset, args.features),
+        replace=False,
+    )
+    site_ids = [f"{i:08d}" for i in rng.choice(10**8, args.gages, replace=False)]
+    work_dir = Path(args.work_dir)
+
+    with StandinServer(
+        args.cache_dir,
+        latency=args.latency,
+        latency_jitter=args.latency_jitter,
+        failure_rate=args.failure_rate,
+        bandwidth_mbps=args.bandwidth_mbps,
+        n_features=args.features,
+    ) as server:
+        paths = get_loader_paths(server, work_dir)
+        event = SimpleNamespace(
+            nwm_version='nwm22',
+            nwm_id_list=feature_ids.tolist(),
+        )
+        output_type = 'channel_rt_1' \
+            if args.configuration == 'medium_range_mem1' else 'channel_rt'
+        forcing_configuration = 'forcing_' + args.configuration \
+            .replace('medium_range_mem1', 'medium_range')
+        urls = nwm.get_nwm_file_list(
+            args.configuration,
+            output_type,
+            start_date,
+            args.days,
+            base_url=server.nwm_base_url,
+        )
+        forcing_urls = nwm.get_nwm_file_list(
+            forcing_configuration,
+            'forcing',
+            start_date,
+            args.days,
+            base_url=server.nwm_base_url,
+        )
+        # generate the files once so the benchmark measures transfer
+        # (and package reads do not overlap the server writes)
+        server.update_settings(latency=0, latency_jitter=0, failure_rate=0)
+        reference_nwm_df = load_channel_rt_urls(urls, feature_ids, n_workers=16)
+        reference_usgs_df = load_nwis_iv(
+            server.nwis_base_url, 
+            site_ids, 
+            start_date, 
+            end_date,
+            n_workers=16,
+        )
+        session = requests.Session()
+        for url in forcing_urls:
+            get_with_retries(session, url)
+        server.update_settings(
+            latency=args.latency,
+            latency_jitter=args.latency_jitter,
+            failure_rate=args.failure_rate,
+        )
+
+        results = [
+            benchmark_loader(
+                server,
+                load_channel_rt_urls,
+                workers=args.workers,
+                repeat=args.repeat,
+                urls=urls,
+                feature_ids=feature_ids,
+            ),
+            benchmark_loader(
+                server,
+                load_points_package,
+                workers=args.workers,
+                repeat=args.repeat,
+                paths=paths,
+                event=event,
+                configuration=args.configuration,
+                output_type=output_type,
+                days=days,
+                output_dir=Path(work_dir, 'points'),
+            ),
+            benchmark_loader(
+                server,
+                load_zonal_package,
+                workers=args.workers,
+                repeat=args.repeat,
+                paths=paths,
+                configuration=forcing_configuration,
+                days=days,
+                weights=get_standin_weights(
+                    args.polygons, 
+                    server.settings['grid_shape']
+                ),
+                output_dir=Path(work_dir, 'zonal'),
+            ),
+            benchmark_loader(
+                server,
+                load_nwis_iv,
+                workers=args.workers,
+                repeat=args.repeat,
+                base_url=server.nwis_base_url,
+                site_ids=site_ids,
+                start=start_date,
+                end=end_date,
+            ),
+            benchmark_loader(
+                server,
+                load_usgs_package,
+                workers=args.workers,
+                repeat=args.repeat,
+                paths=paths,
+                site_ids=site_ids,
+                start=start_date,
+                end=end_date,
+                output_dir=Path(work_dir, 'usgs'),
+            ),
+        ]
+
+    print(pd.concat(results).to_string(index=False))
+
+    # the package loaders write the same values and units as the 
+    # reference loaders (usgs keeps the hourly values only)
+    comparisons = [
+        dict(
+            loader='load_points_package',
+            **compare_timeseries(
+                pd.read_parquet(Path(work_dir, 'points')),
+                reference_nwm_df,
+                ['location_id','value_time','reference_time','measurement_unit'],
+            )
+        ),
+        dict(
+            loader='load_usgs_package',
+            **compare_timeseries(
+                pd.read_parquet(Path(work_dir, 'usgs')),
+                reference_usgs_df,
+                ['location_id','value_time','measurement_unit'],
+            )
+        ),
+    ]
+    print(pd.DataFrame(comparisons).to_string(index=False))
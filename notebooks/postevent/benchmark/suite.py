@@ -0,0 +1,318 @@
+'''
+benchmark suite - times the main evaluation steps on synthetic studies
+(see synthetic.py) and compares the results to a stored baseline
+
+example (from the notebooks directory):
+    python -m postevent.benchmark.suite --scales 100 1k --days 3 7 \
+        --work-dir /tmp/postevent_benchmark --baseline baseline.json
+'''
+import argparse
+import json
+import platform
+import sys
+import time
+import tempfile
+import numpy as np
+import pandas as pd
+
+from pathlib import Path
+from typing import Callable, List, Union
+
+from .. import config
+from ..utils import timing
+from ..viz import data
+from ..viz import class_explorer
+from ..viz import report
+from . import synthetic
+
+BENCHMARK_CASES = [
+    'geo',
+    'locations',
+    'flow_metrics',
+    'initialize',
+    'timeseries_click',
+    'export',
+]
+# slower than baseline by more than this factor is a regression
+REGRESSION_TOLERANCE = 1.25
+# gages selected per timeseries_click repeat
+CLICKS_PER_REPEAT = 5
+
+
+def time_function(
+    function: Callable,
+    repeat: int = 3,
+) -> dict:
+    '''
+    Run a function repeat times, wall time statistics in seconds
+    '''
+    seconds = []
+    for i in range(repeat):
+        t_start = time.perf_counter()
+        function()
+        seconds.append(time.perf_counter() - t_start)
+
+    return dict(
+        repeat=repeat,
+        min_seconds=float(np.min(seconds)),
+        median_seconds=float(np.median(seconds)),
+        max_seconds=float(np.max(seconds)),
+    )
+
+def get_paths_event(
+    config_file: Path,
+    forecast_config: str,
+) -> tuple:
+    '''
+    Paths and Event for the (single) synthetic event
+    '''
+    paths = config.Paths(config_file)
+    paths.event_name_selector_without_new.value \
+        = list(paths.existing_events.keys())[0]
+    paths.forecast_config_selector.value = forecast_config
+    paths.update_eval_options()
+    event = config.Event(paths)
+
+    return paths, event
+
+def get_explorer(
+    paths: config.Paths,
+    event: config.Event,
+    geo: config.Geo,
+    dates: config.Dates,
+) -> class_explorer.ForecastExplorer:
+
+    return class_explorer.ForecastExplorer(
+        paths=paths,
+        event=event,
+        geo=geo,
+        dates=dates,
+        explore_precip=True,
+        explore_streamflow=True,
+        map_polygons='huc10',
+        ts_polygons='huc10',
+    )
+
+def run_cases(
+    config_file: Path,
+    forecast_config: str = 'short_range',
+    cases: Union[List[str], None] = None,
+    repeat: int = 3,
+) -> List[dict]:
+    '''
+    Time each case for one synthetic study, each case starts from the
+    state left by the previous ones (as in the notebooks)
+    '''
+    if cases is None:
+        cases = BENCHMARK_CASES
+    # the shared file cache would hide the read times
+    config.PARQUET_CACHE = None
+
+    results = []
+    def record(case, function, n_repeat=repeat):
+        if case not in cases:
+            return
+        print(f"  {case}")
+        try:
+            result = time_function(function, n_repeat)
+            result['message'] = ''
+        except Exception as e:
+            result = dict(repeat=0, message=f"{type(e).__name__}: {e}")
+        result['case'] = case
+        results.append(result)
+
+    paths, event = get_paths_event(config_file, forecast_config)
+    state = {}
+
+    def geo_case():
+        state['geo'] = config.Geo(paths, event)
+    geo_case()
+    record('geo', geo_case)
+    geo = state['geo']
+    dates = config.Dates(paths, event)
+    dates.get_analysis_value_times(True)
+
+    def locations_case():
+        geo.get_usgs_attributes(paths)
+        geo.update_geometry(paths, event, dates)
+        event.get_location_lists(paths, geo)
+        paths.set_streamflow_paths(
+            nwm_version=event.nwm_version,
+            domain=event.domain,
+        )
+    locations_case()
+    record('locations', locations_case)
+
+    record(
+        'flow_metrics',
+        lambda: data.teehr_get_flow_metrics(paths, event, dates)
+    )
+
+    def initialize_case():
+        state['explorer'] = get_explorer(paths, event, geo, dates)
+        state['explorer'].initialize(restrict_to_event_period=True)
+    initialize_case()
+    record('initialize', initialize_case)
+    explorer = state['explorer']
+
+    point_ids = explorer.flow_points_gdf['primary_location_id'].to_list()
+    def click_case():
+        for point_id in point_ids[:CLICKS_PER_REPEAT]:
+            explorer.select_point(point_id)
+            explorer.get_flow_obs_timeseries()
+            explorer.get_flow_fcst_timeseries_all()
+            explorer.get_precip_obs_timeseries_cumulative()
+            explorer.get_precip_fcst_timeseries_cumulative_all()
+    record('timeseries_click', click_case)
+
+    def export_case():
+        with tempfile.TemporaryDirectory() as report_dir:
+            written = report.export_report(
+                explorer,
+                products=['observed_summary'],
+                point_ids=point_ids[:1],
+                report_dir=report_dir,
+                n_workers=1,
+                overwrite=True,
+            )
+            if not written:
+                raise RuntimeError("figure export failed "\
+                                   "(is a headless webdriver installed?)")
+    record('export', export_case, n_repeat=1)
+
+    return results
+
+def run_suite(
+    work_dir: Union[str, Path],
+    scales: List[str] = ['100', '1k'],
+    days: List[int] = [3],
+    forecast_config: str = 'short_range',
+    cases: Union[List[str], None] = None,
+    repeat: int = 3,
+    seed: int = 0,
+) -> pd.DataFrame:
+    '''
+    Run all cases for each scale (number of gages) and event length,
+    synthetic studies are written to (and reused from) work_dir
+    '''
+    results = []
+    for scale in scales:
+        for n_days in days:
+            n_locations = synthetic.SCALES[scale]
+            print(f"benchmark: {n_locations} locations, {n_days} days")
+            config_file = synthetic.write_synthetic_study(
+                Path(work_dir, f"{scale}_{n_days}d"),
+                n_locations=n_locations,
+                n_days=n_days,
+                forecast_configs=[forecast_config],
+                seed=seed,
+            )
+            timing.clear_timings()
+            for result in run_cases(config_file, forecast_config, cases, repeat):
+                result.update(scale=scale, days=n_days)
+                results.append(result)
+
+            # stage timings of the last runs, to see what changed
+            timing.summarize_timings().to_csv(
+                Path(work_dir, f"timings_{scale}_{n_days}d.csv"),
+                index=False
+            )
+
+    results_df = pd.DataFrame(results)
+    columns = ['scale','days','case','median_seconds','min_seconds',
+               'max_seconds','repeat','message']
+
+    return results_df[[c for c in columns if c in results_df.columns]]
+
+def write_results(
+    results_df: pd.DataFrame,
+    filepath: Union[str, Path],
+) -> Path:
+    '''
+    Save results (e.g., as a new baseline) with the machine details
+    '''
+    contents = dict(
+        created=pd.Timestamp.now().isoformat(),
+        machine=platform.platform(),
+        processor=platform.processor(),
+        python=platform.python_version(),
+        results=results_df.to_dict(orient='records'),
+    )
+    filepath = Path(filepath)
+    with open(filepath, 'w') as f:
+        json.dump(contents, f, indent=1, default=str)
+
+    return filepath
+
+def compare_to_baseline(
+    results_df: pd.DataFrame,
+    baseline_file: Union[str, Path],
+    tolerance: float = REGRESSION_TOLERANCE,
+) -> pd.DataFrame:
+    '''
+    Ratio of current to baseline median time per scale, days and case,
+    flagged as a regression if the ratio exceeds the tolerance
+    '''
+    with open(baseline_file) as f:
+        baseline_df = pd.DataFrame(json.load(f)['results'])
+
+    keys = ['scale','days','case']
+    baseline_df['scale'] = baseline_df['scale'].astype(str)
+    comparison_df = results_df.merge(
+        baseline_df[keys + ['median_seconds']],
+        how='left',
+        on=keys,
+        suffixes=('','_baseline')
+    )
+    comparison_df['ratio'] = comparison_df['median_seconds'] \
+        / comparison_df['median_seconds_baseline']
+    comparison_df['regression'] = comparison_df['ratio'] > tolerance
+
+    return comparison_df
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description="Post-event evaluation benchmark suite"
+    )
+    parser.add_argument("--work-dir", default="postevent_benchmark")
+    parser.add_argument("--scales", nargs="+", default=['100','1k'],
+                        choices=list(synthetic.SCALES.keys()))
+    parser.add_argument("--days", nargs="+", type=int, default=[3])
+    parser.add_argument("--forecast-config", default='short_range',
+                        choices=list(synthetic.FORECAST_SPECS.keys()))
+    parser.add_argument("--cases", nargs="+", default=None,
+                        choices=BENCHMARK_CASES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--baseline", default=None,
+                        help="baseline results file to compare against")
+    parser.add_argument("--save", default=None,
+                        help="write results to this file (e.g., new baseline)")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE)
+    args = parser.parse_args()
+
+    Path(args.work_dir).mkdir(parents=True, exist_ok=True)
+    results_df = run_suite(
+        args.work_dir,
+        scales=args.scales,
+        days=args.days,
+        forecast_config=args.forecast_config,
+        cases=args.cases,
+        repeat=args.repeat,
+    )
+    if args.save:
+        write_results(results_df, args.save)
+
+    if args.baseline:
+        comparison_df = compare_to_baseline(
+            results_df,
+            args.baseline,
+            args.tolerance
+        )
+        print(comparison_df.to_string(index=False))
+        if comparison_df['regression'].any():
+            print("performance regression(s) found")
+            sys.exit(1)
+    else:
+        print(results_df.to_string(index=False))
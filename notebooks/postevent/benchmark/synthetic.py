@@ -0,0 +1,685 @@
+'''
+synthetic post-event study fixtures - writes a complete, self-contained
+set of inputs (config file, event definition, geometry, crosswalks,
+attributes and TEEHR-schema time series parquet) at a configurable number
+of locations and event days, so the evaluation code can be timed offline
+'''
+import json
+import math
+import datetime as dt
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from pathlib import Path
+from shapely.geometry import box, Point
+from typing import Callable, List, Union
+
+# number of gages (streamflow locations) per named scale
+SCALES = {
+    '100': 100,
+    '1k': 1_000,
+    '10k': 10_000,
+    '100k': 100_000,
+}
+# synthetic region (lon/lat) - a single HUC2
+REGION_BOUNDS = (-100.0, 29.0, -94.0, 35.0)
+HUC2 = '12'
+# gages per HUC10 polygon
+GAGES_PER_HUC10 = 10
+# events start within the NWM v2.2 period (single crosswalk version)
+EVENT_START_DATE = dt.date(2023, 1, 1)
+NWM_VERSION = 'nwm22'
+
+# forecast configuration: (streamflow dir, forcing dir,
+# reference time interval hours, lead times in hours)
+FORECAST_SPECS = {
+    'short_range': (
+        'short_range',
+        'forcing_short_range',
+        1,
+        list(range(1, 19))
+    ),
+    'medium_range_mem1': (
+        'medium_range_mem1',
+        'forcing_medium_range',
+        6,
+        list(range(3, 243, 3))
+    ),
+}
+FLOW_UNIT = 'm3/s'
+PRECIP_UNIT = 'mm/hr'
+
+
+def get_synthetic_config(
+    root_dir: Union[str, Path]
+) -> dict:
+    '''
+    Config file contents with all directories under root_dir
+    '''
+    root_dir = Path(root_dir)
+
+    return {
+        "ZARR_DIR": str(Path(root_dir, "zarr")),
+        "EVENTS_DIR": str(Path(root_dir, "events")),
+        "EVENT_DEFINITIONS_FILE": str(Path(root_dir, "event_definitions.json")),
+        "GEO_DIR": str(Path(root_dir, "geometry")),
+        "CROSSWALK_DIR": str(Path(root_dir, "crosswalks")),
+        "ATTRIBUTE_DIR": str(Path(root_dir, "attributes")),
+        "WEIGHTS_DIR": str(Path(root_dir, "grid_weights")),
+        "GEO_FILES_CONUS": {
+            "STATES": "states_geometry.synthetic.parquet",
+            "USGS_POINTS": "usgs_point_geometry.synthetic.parquet",
+            "USGS_BASINS": "usgs_basin_geometry.synthetic.parquet",
+            "HUC2": "huc2_geometry.synthetic.parquet",
+            "HUC10": "huc10_geometry.synthetic.parquet"
+        },
+        "CROSSWALK_FILES_CONUS": {
+            "USGS_HUC12": "usgs_huc12_crosswalk.synthetic.parquet",
+            "USGS_NWM22": "usgs_nwm22_crosswalk.synthetic.parquet",
+            "NWM22_HUC12": "nwm22_huc12_crosswalk.synthetic.parquet"
+        },
+        "GRID_WEIGHTS_FILES_CONUS": {},
+        "USGS_ATTRIBUTES_CONUS": {
+            "DRAINAGE_AREA": "usgs_attr_drainage_area.synthetic.parquet",
+            "ECOREGIONS": "usgs_attr_ecoregions.synthetic.parquet",
+            "STREAM_ORDER": "usgs_attr_stream_order.synthetic.parquet",
+            "HW_THRESHOLD": "usgs_attr_2yr_flow.synthetic.parquet"
+        }
+    }
+
+def get_event_name(
+    n_locations: int,
+    n_days: int,
+) -> str:
+
+    return f"{EVENT_START_DATE.strftime('%Y%m')}_synthetic_{n_locations}_{n_days}d"
+
+def get_event_definition(
+    n_days: int
+) -> dict:
+
+    xmin, ymin, xmax, ymax = REGION_BOUNDS
+    event_end_date = EVENT_START_DATE + dt.timedelta(days=n_days - 1)
+
+    return dict(
+        event_start_date=EVENT_START_DATE.strftime('%Y%m%d'),
+        event_end_date=event_end_date.strftime('%Y%m%d'),
+        region_boundary_coords=[
+            [xmin, xmax, xmax, xmin, xmin],
+            [ymin, ymin, ymax, ymax, ymin],
+        ],
+        huc2_list=[HUC2],
+    )
+
+def write_parquet(
+    df: pd.DataFrame,
+    filepath: Path,
+):
+    filepath.parent.mkdir(parents=True, exist_ok=True)
+    if isinstance(df, gpd.GeoDataFrame):
+        df.to_parquet(filepath)
+    else:
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), filepath)
+
+def get_locations(
+    n_locations: int,
+    seed: int = 0,
+) -> dict:
+    '''
+    Synthetic location layout - a grid of HUC10 squares over the region
+    (one HUC12 each) with gages at random points within them, and
+    per-location hydrograph and storm parameters
+    '''
+    rng = np.random.default_rng(seed)
+    xmin, ymin, xmax, ymax = REGION_BOUNDS
+
+    n_huc10 = max(1, math.ceil(n_locations / GAGES_PER_HUC10))
+    n_side = math.ceil(math.sqrt(n_huc10))
+    cell_x = (xmax - xmin) / n_side
+    cell_y = (ymax - ymin) / n_side
+
+    huc_index = np.arange(n_huc10)
+    huc_x0 = xmin + (huc_index % n_side) * cell_x
+    huc_y0 = ymin + (huc_index // n_side) * cell_y
+    huc_digits = [f"{HUC2}{i:08d}" for i in huc_index]
+
+    gage_huc = rng.integers(0, n_huc10, n_locations)
+    gage_x = huc_x0[gage_huc] + rng.uniform(0.1, 0.9, n_locations) * cell_x
+    gage_y = huc_y0[gage_huc] + rng.uniform(0.1, 0.9, n_locations) * cell_y
+
+    return dict(
+        huc10_ids=[f"huc10-{d}" for d in huc_digits],
+        huc12_ids=[f"huc12-{d}01" for d in huc_digits],
+        huc_x0=huc_x0,
+        huc_y0=huc_y0,
+        cell_x=cell_x,
+        cell_y=cell_y,
+        gage_huc=gage_huc,
+        gage_x=gage_x,
+        gage_y=gage_y,
+        usgs_ids=[f"usgs-{10_000_000 + i:08d}" for i in range(n_locations)],
+        nwm_ids=[f"{NWM_VERSION}-{1_000_000 + i}" for i in range(n_locations)],
+        drainage_area=rng.lognormal(6, 1.2, n_locations),
+        # storm timing (fraction of the event) and magnitude per HUC10
+        storm_center=rng.uniform(0.2, 0.8, n_huc10),
+        storm_width_hours=rng.uniform(6, 36, n_huc10),
+        storm_max_rate=rng.gamma(2.0, 4.0, n_huc10),
+    )
+
+def write_geometry(
+    user_config: dict,
+    locations: dict,
+):
+    '''
+    States, HUC2, HUC10, gage point and gage basin geometry
+    '''
+    geo_dir = Path(user_config["GEO_DIR"])
+    files = user_config["GEO_FILES_CONUS"]
+    crs = 'EPSG:4326'
+
+    region = box(*REGION_BOUNDS)
+    write_parquet(
+        gpd.GeoDataFrame(
+            dict(id=['TX'], name=['Synthetic State'], geometry=[region]),
+            crs=crs
+        ),
+        Path(geo_dir, files["STATES"])
+    )
+    write_parquet(
+        gpd.GeoDataFrame(
+            dict(id=[HUC2], name=['Synthetic Region'], geometry=[region]),
+            crs=crs
+        ),
+        Path(geo_dir, files["HUC2"])
+    )
+
+    cell_x = locations['cell_x']
+    cell_y = locations['cell_y']
+    huc10_polygons = [
+        box(x0, y0, x0 + cell_x, y0 + cell_y)
+        for x0, y0 in zip(locations['huc_x0'], locations['huc_y0'])
+    ]
+    write_parquet(
+        gpd.GeoDataFrame(
+            dict(
+                id=locations['huc10_ids'],
+                name=[f"Synthetic HUC10 {i}"
+                      for i in range(len(huc10_polygons))],
+                geometry=huc10_polygons,
+            ),
+            crs=crs
+        ),
+        Path(geo_dir, files["HUC10"])
+    )
+
+    usgs_ids = locations['usgs_ids']
+    names = [f"SYNTHETIC GAGE {i}" for i in range(len(usgs_ids))]
+    write_parquet(
+        gpd.GeoDataFrame(
+            dict(
+                id=usgs_ids,
+                name=names,
+                geometry=[
+                    Point(x, y)
+                    for x, y in zip(locations['gage_x'], locations['gage_y'])
+                ],
+            ),
+            crs=crs
+        ),
+        Path(geo_dir, files["USGS_POINTS"])
+    )
+    # basins are squares around the gages (within the HUC10)
+    half_x = cell_x * 0.1
+    half_y = cell_y * 0.1
+    write_parquet(
+        gpd.GeoDataFrame(
+            dict(
+                id=usgs_ids,
+                name=names,
+                geometry=[
+                    box(x - half_x, y - half_y, x + half_x, y + half_y)
+                    for x, y in zip(locations['gage_x'], locations['gage_y'])
+                ],
+            ),
+            crs=crs
+        ),
+        Path(geo_dir, files["USGS_BASINS"])
+    )
+
+def write_crosswalks(
+    user_config: dict,
+    locations: dict,
+):
+    '''
+    Gage-HUC12, gage-NWM, NWM-HUC12 and the identity crosswalks
+    for the MAP polygons
+    '''
+    cross_dir = Path(user_config["CROSSWALK_DIR"])
+    files = user_config["CROSSWALK_FILES_CONUS"]
+    gage_huc12 = [locations['huc12_ids'][i] for i in locations['gage_huc']]
+
+    write_parquet(
+        pd.DataFrame(dict(
+            primary_location_id=locations['usgs_ids'],
+            secondary_location_id=gage_huc12,
+        )),
+        Path(cross_dir, files["USGS_HUC12"])
+    )
+    write_parquet(
+        pd.DataFrame(dict(
+            primary_location_id=locations['usgs_ids'],
+            secondary_location_id=locations['nwm_ids'],
+        )),
+        Path(cross_dir, files["USGS_NWM22"])
+    )
+    write_parquet(
+        pd.DataFrame(dict(
+            primary_location_id=locations['nwm_ids'],
+            secondary_location_id=gage_huc12,
+        )),
+        Path(cross_dir, files["NWM22_HUC12"])
+    )
+    for polygons, ids in [
+        ('huc10', locations['huc10_ids']),
+        ('usgs_basins', locations['usgs_ids'])
+    ]:
+        write_parquet(
+            pd.DataFrame(dict(
+                primary_location_id=ids,
+                secondary_location_id=ids,
+            )),
+            Path(cross_dir, f"{polygons}_{polygons}_crosswalk.conus.parquet")
+        )
+
+def write_attributes(
+    user_config: dict,
+    locations: dict,
+    seed: int = 0,
+):
+    '''
+    Attribute tables in the TEEHR attribute schema
+    '''
+    rng = np.random.default_rng(seed + 1)
+    attribute_dir = Path(user_config["ATTRIBUTE_DIR"])
+    files = user_config["USGS_ATTRIBUTES_CONUS"]
+    usgs_ids = locations['usgs_ids']
+    n_locations = len(usgs_ids)
+    drainage_area = locations['drainage_area']
+
+    attributes = dict(
+        DRAINAGE_AREA=('drainage_area', 'km2', drainage_area),
+        # 2-year flow scales with drainage area
+        HW_THRESHOLD=(
+            'retro22_2yr_flow',
+            FLOW_UNIT,
+            0.4 * drainage_area**0.8 * rng.lognormal(0, 0.3, n_locations)
+        ),
+        ECOREGIONS=(
+            'ecoregion_L2',
+            'none',
+            rng.choice(['9.4','9.5','9.6','10.1'], n_locations)
+        ),
+        STREAM_ORDER=(
+            'stream_order',
+            'none',
+            np.clip(np.log(drainage_area).astype(int) - 1, 1, 9)
+        ),
+    )
+    for key, (name, unit, values) in attributes.items():
+        write_parquet(
+            pd.DataFrame(dict(
+                location_id=usgs_ids,
+                attribute_name=name,
+                attribute_value=values,
+                attribute_unit=unit,
+            )),
+            Path(attribute_dir, files[key])
+        )
+
+def get_flow_function(
+    locations: dict,
+    event_start: pd.Timestamp,
+    n_days: int,
+    seed: int = 0,
+) -> Callable:
+    '''
+    Hydrograph per gage - baseflow plus a single peak after the storm
+    over its HUC10, function of value times returns (locations x times)
+    '''
+    rng = np.random.default_rng(seed + 2)
+    n_locations = len(locations['usgs_ids'])
+    threshold = 0.4 * locations['drainage_area']**0.8
+    gage_huc = locations['gage_huc']
+
+    event_hours = n_days * 24
+    storm_hour = locations['storm_center'][gage_huc] * event_hours
+    peak_hour = storm_hour + rng.uniform(6, 48, n_locations)
+    width = locations['storm_width_hours'][gage_huc] \
+        + rng.uniform(12, 72, n_locations)
+    base = threshold * 0.05
+    amplitude = threshold * rng.uniform(0.2, 2.5, n_locations)
+
+    def flow(value_times: pd.DatetimeIndex) -> np.ndarray:
+        hours = np.asarray((value_times - event_start) / pd.Timedelta(hours=1))
+        shape = np.exp(-((hours[None,:] - peak_hour[:,None]) / width[:,None])**2)
+        return base[:,None] + amplitude[:,None] * shape
+
+    return flow
+
+def get_precip_function(
+    locations: dict,
+    polygons: str,
+    event_start: pd.Timestamp,
+    n_days: int,
+) -> Callable:
+    '''
+    Storm hyetograph (mm/hr) per polygon, basins take the storm of their
+    HUC10, function of value times returns (polygons x times)
+    '''
+    if polygons == 'huc10':
+        index = np.arange(len(locations['huc10_ids']))
+    else:
+        index = locations['gage_huc']
+    event_hours = n_days * 24
+    center = locations['storm_center'][index] * event_hours
+    width = locations['storm_width_hours'][index]
+    max_rate = locations['storm_max_rate'][index]
+
+    def precip(value_times: pd.DatetimeIndex) -> np.ndarray:
+        hours = np.asarray((value_times - event_start) / pd.Timedelta(hours=1))
+        shape = np.exp(-((hours[None,:] - center[:,None]) / width[:,None])**2)
+        return max_rate[:,None] * shape
+
+    return precip
+
+def get_timeseries_df(
+    location_ids: List[str],
+    value_times: pd.DatetimeIndex,
+    values: np.ndarray,
+    configuration: str,
+    variable_name: str,
+    measurement_unit: str,
+    reference_time: Union[pd.Timestamp, None] = None,
+) -> pd.DataFrame:
+    '''
+    TEEHR timeseries schema, one row per location and value time
+    '''
+    n_times = len(value_times)
+
+    return pd.DataFrame(dict(
+        reference_time=pd.Series(
+            reference_time,
+            index=range(len(location_ids) * n_times),
+            dtype='datetime64[ns]'
+        ),
+        location_id=np.repeat(location_ids, n_times),
+        value_time=np.tile(value_times.values, len(location_ids)),
+        value=values.astype('float32').ravel(),
+        variable_name=variable_name,
+        measurement_unit=measurement_unit,
+        configuration=configuration,
+    ))
+
+def write_observed(
+    dirpath: Path,
+    location_ids: List[str],
+    truth: Callable,
+    value_time_start: pd.Timestamp,
+    value_time_end: pd.Timestamp,
+    configuration: str,
+    variable_name: str,
+    measurement_unit: str,
+    noise: float = 0.0,
+    seed: int = 0,
+):
+    '''
+    Hourly 'observed' values, one file per day
+    '''
+    rng = np.random.default_rng(seed)
+    for day in pd.date_range(value_time_start.floor('D'), value_time_end, freq='D'):
+        value_times = pd.date_range(day, day + pd.Timedelta(hours=23), freq='H')
+        value_times = value_times[
+            (value_times >= value_time_start) & (value_times <= value_time_end)
+        ]
+        values = truth(value_times)
+        if noise:
+            values = values * rng.lognormal(0, noise, values.shape)
+        write_parquet(
+            get_timeseries_df(
+                location_ids,
+                value_times,
+                values,
+                configuration,
+                variable_name,
+                measurement_unit,
+            ),
+            Path(dirpath, f"{day.strftime('%Y%m%d')}.parquet")
+        )
+
+def write_forecasts(
+    dirpath: Path,
+    location_ids: List[str],
+    truth: Callable,
+    reference_times: pd.DatetimeIndex,
+    lead_hours: List[int],
+    configuration: str,
+    variable_name: str,
+    measurement_unit: str,
+    seed: int = 0,
+):
+    '''
+    One file per reference time - forecasts are the truth with timing
+    and magnitude errors that grow with lead time
+    '''
+    rng = np.random.default_rng(seed)
+    lead_fraction = np.array(lead_hours) / max(lead_hours)
+    n_locations = len(location_ids)
+
+    for reference_time in reference_times:
+        value_times = reference_time + pd.to_timedelta(lead_hours, unit='h')
+        # timing error (per forecast) and magnitude error (per location)
+        shift_hours = rng.normal(0, 6)
+        log_error = rng.normal(0, 0.4, n_locations)
+
+        values = truth(value_times + pd.Timedelta(hours=shift_hours))
+        values = values * np.exp(log_error[:,None] * lead_fraction[None,:])
+        write_parquet(
+            get_timeseries_df(
+                location_ids,
+                value_times,
+                values,
+                configuration,
+                variable_name,
+                measurement_unit,
+                reference_time,
+            ),
+            Path(dirpath, f"{reference_time.strftime('%Y%m%dT%HZ')}.parquet")
+        )
+
+def get_reference_times(
+    forecast_config: str,
+    event_start: pd.Timestamp,
+    n_days: int,
+) -> pd.DatetimeIndex:
+    '''
+    Same reference time range as config.Dates for the event
+    '''
+    interval = FORECAST_SPECS[forecast_config][2]
+    event_end = event_start + pd.Timedelta(days=n_days - 1)
+    if forecast_config == 'short_range':
+        start = event_start - pd.Timedelta(hours=18)
+        end = event_end + pd.Timedelta(hours=23)
+    else:
+        start = event_start - pd.Timedelta(days=10)
+        end = event_end + pd.Timedelta(hours=18)
+
+    return pd.date_range(start, end, freq=f"{interval}H")
+
+def write_timeseries(
+    user_config: dict,
+    event_name: str,
+    locations: dict,
+    n_days: int,
+    forecast_configs: List[str] = ['short_range'],
+    seed: int = 0,
+):
+    '''
+    USGS observed flow, no-DA analysis, forcing analysis MAPs and the
+    streamflow and forcing forecasts for each forecast configuration
+    '''
+    parquet_dir = Path(user_config["EVENTS_DIR"], event_name, 'parquet')
+    event_start = pd.Timestamp(EVENT_START_DATE)
+    flow = get_flow_function(locations, event_start, n_days, seed)
+    precip = {
+        polygons: get_precip_function(locations, polygons, event_start, n_days)
+        for polygons in ['huc10', 'usgs_basins']
+    }
+    precip_ids = dict(
+        huc10=locations['huc10_ids'],
+        usgs_basins=locations['usgs_ids'],
+    )
+
+    # value time range covering all forecasts
+    value_time_start = None
+    value_time_end = None
+    for forecast_config in forecast_configs:
+        reference_times = get_reference_times(forecast_config, event_start, n_days)
+        lead_hours = FORECAST_SPECS[forecast_config][3]
+        start = reference_times[0]
+        end = reference_times[-1] + pd.Timedelta(hours=max(lead_hours))
+        value_time_start = start if value_time_start is None \
+            else min(start, value_time_start)
+        value_time_end = end if value_time_end is None \
+            else max(end, value_time_end)
+
+    print(f"writing observed and analysis time series for {event_name}")
+    write_observed(
+        Path(parquet_dir, 'usgs'),
+        locations['usgs_ids'],
+        flow,
+        value_time_start,
+        value_time_end,
+        'usgs_obs',
+        'streamflow',
+        FLOW_UNIT,
+        noise=0.05,
+        seed=seed + 3,
+    )
+    write_observed(
+        Path(parquet_dir, 'analysis_assim_extend_no_da', 'gages'),
+        locations['nwm_ids'],
+        flow,
+        value_time_start,
+        value_time_end,
+        'analysis_assim_extend_no_da',
+        'streamflow',
+        FLOW_UNIT,
+        noise=0.2,
+        seed=seed + 4,
+    )
+    for polygons, precip_function in precip.items():
+        write_observed(
+            Path(parquet_dir, 'forcing_analysis_assim_extend', polygons),
+            precip_ids[polygons],
+            precip_function,
+            value_time_start,
+            value_time_end,
+            'forcing_analysis_assim_extend',
+            'precipitation_rate',
+            PRECIP_UNIT,
+        )
+
+    for forecast_config in forecast_configs:
+        flow_dir, forcing_dir, interval, lead_hours \
+            = FORECAST_SPECS[forecast_config]
+        reference_times = get_reference_times(forecast_config, event_start, n_days)
+        print(f"writing {len(reference_times)} {forecast_config} forecasts")
+        write_forecasts(
+            Path(parquet_dir, flow_dir, 'gages'),
+            locations['nwm_ids'],
+            flow,
+            reference_times,
+            lead_hours,
+            forecast_config,
+            'streamflow',
+            FLOW_UNIT,
+            seed=seed + 5,
+        )
+        for polygons, precip_function in precip.items():
+            write_forecasts(
+                Path(parquet_dir, forcing_dir, polygons),
+                precip_ids[polygons],
+                precip_function,
+                reference_times,
+                lead_hours,
+                forcing_dir,
+                'precipitation_rate',
+                PRECIP_UNIT,
+                seed=seed + 6,
+            )
+
+def write_synthetic_study(
+    root_dir: Union[str, Path],
+    n_locations: int = 100,
+    n_days: int = 3,
+    forecast_configs: List[str] = ['short_range'],
+    seed: int = 0,
+    overwrite: bool = False,
+) -> Path:
+    '''
+    Write a complete synthetic study under root_dir and return the
+    config file path - existing fixtures with the same specs are reused
+    '''
+    if n_days < 1 or n_days > 60:
+        raise ValueError("n_days must be between 1 and 60")
+    for forecast_config in forecast_configs:
+        if forecast_config not in FORECAST_SPECS:
+            raise ValueError(f"Forecast configuration {forecast_config} not "\
+                             f"recognized, options are {list(FORECAST_SPECS)}")
+
+    root_dir = Path(root_dir)
+    config_file = Path(root_dir, 'post_event_config_synthetic.json')
+    manifest_file = Path(root_dir, 'synthetic_manifest.json')
+    manifest = dict(
+        n_locations=n_locations,
+        n_days=n_days,
+        forecast_configs=sorted(forecast_configs),
+        seed=seed,
+    )
+    if not overwrite and manifest_file.exists() and config_file.exists():
+        with open(manifest_file) as f:
+            if json.load(f) == manifest:
+                print(f"using existing synthetic study in {root_dir}")
+                return config_file
+
+    user_config = get_synthetic_config(root_dir)
+    root_dir.mkdir(parents=True, exist_ok=True)
+    with open(config_file, 'w') as f:
+        json.dump(user_config, f, indent=4)
+
+    event_name = get_event_name(n_locations, n_days)
+    with open(user_config["EVENT_DEFINITIONS_FILE"], 'w') as f:
+        json.dump({event_name: get_event_definition(n_days)}, f, indent=4)
+
+    t_start = dt.datetime.now()
+    locations = get_locations(n_locations, seed)
+    write_geometry(user_config, locations)
+    write_crosswalks(user_config, locations)
+    write_attributes(user_config, locations, seed)
+    write_timeseries(
+        user_config,
+        event_name,
+        locations,
+        n_days,
+        forecast_configs,
+        seed
+    )
+    with open(manifest_file, 'w') as f:
+        json.dump(manifest, f)
+    print(f"synthetic study written in "\
+          f"{round((dt.datetime.now() - t_start).seconds/60, 2)} minutes")
+
+    return config_file
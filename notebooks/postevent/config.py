@@ -7,6 +7,7 @@ import pandas as pd
 import geopandas as gpd
 import datetime as dt
 import panel as pn
+import pyarrow.parquet as pq
 
 from typing import List, Union
 from pathlib import Path
@@ -20,6 +21,11 @@ TODAY = NOW.date()
 YESTERDAY = TODAY - dt.timedelta(days=1)
 DATE_BOUNDS = (dt.date(2018, 9, 17), TODAY)
 
+# optional in-process cache of geometry, crosswalk and attribute files 
+# shared by all events evaluated in one session (e.g., batch.py), 
+# None disables caching
+PARQUET_CACHE = None
+
 class Paths:
     '''
     Main class to collect/organize/store filepaths and 
@@ -67,6 +73,16 @@ class Paths:
         self.zarr_dir = Path(
             user_config["ZARR_DIR"]
         )
+        # optional time series store shared by all events
+        self.warehouse_dir = None
+        if user_config.get("WAREHOUSE_DIR"):
+            self.warehouse_dir = Path(
+                user_config["WAREHOUSE_DIR"]
+            )
+        # optional NWIS IV endpoint and NWM bucket url (e.g., a local 
+        # stand-in for testing)
+        self.usgs_iv_url = user_config.get("USGS_IV_URL")
+        self.nwm_base_url = user_config.get("NWM_BASE_URL")
         self.event_defs_file = Path(
             user_config["EVENT_DEFINITIONS_FILE"]
         )  
@@ -107,6 +123,36 @@ class Paths:
             self.event_name, 
             'viz'
         )    
+        self.metrics_dir = Path(
+            self.events_dir,
+            self.event_name, 
+            'metrics'
+        )
+        self.snapshot_dir = Path(
+            self.events_dir,
+            self.event_name, 
+            'snapshots'
+        )
+        self.raw_dir = Path(
+            self.events_dir,
+            self.event_name, 
+            'raw'
+        )
+        self.load_checkpoint_file = Path(
+            self.events_dir,
+            self.event_name, 
+            'load_checkpoint.json'
+        )
+        self.load_progress_file = Path(
+            self.events_dir,
+            self.event_name, 
+            'load_progress.jsonl'
+        )
+        self.zonal_dir = Path(
+            self.events_dir,
+            self.event_name, 
+            'zonal'
+        )
                       
     def set_eval_paths(
         self, 
@@ -461,6 +507,7 @@ class Geo:
     Geo directory and geometry data needed for 
     event selection and data loading
     '''
+    @utils.timing.timed('geo')
     def __init__(self, paths, event):
         
         # initialize as empty geodataframes - needed for 
@@ -478,37 +525,37 @@ class Geo:
             self.plot_box = Polygon()
         else:
             user_config = paths.config_file_contents
-            self.states = gpd.read_parquet(
+            self.states = read_parquet_file(
                 Path(
                     paths.geo_dir, 
                     user_config["GEO_FILES_CONUS"]["STATES"]
                 )
             )
-            self.huc2 = gpd.read_parquet(
+            self.huc2 = read_parquet_file(
                 Path(
                     paths.geo_dir, 
                     user_config["GEO_FILES_CONUS"]["HUC2"]
                 )
             )
-            self.huc10 = gpd.read_parquet(
+            self.huc10 = read_parquet_file(
                 Path(
                     paths.geo_dir, 
                     user_config["GEO_FILES_CONUS"]["HUC10"]
                 )
             )
-            self.usgs_points = gpd.read_parquet(
+            self.usgs_points = read_parquet_file(
                 Path(
                     paths.geo_dir, 
                     user_config["GEO_FILES_CONUS"]["USGS_POINTS"]
                 )
             )
-            self.usgs_basins = gpd.read_parquet(
+            self.usgs_basins = read_parquet_file(
                 Path(
                     paths.geo_dir, 
                     user_config["GEO_FILES_CONUS"]["USGS_BASINS"]
                 )
             )
-            self.cross_usgs_huc = pd.read_parquet(
+            self.cross_usgs_huc = read_parquet_file(
                 Path(
                     paths.cross_dir, 
                     user_config["CROSSWALK_FILES_CONUS"]["USGS_HUC12"]
@@ -539,7 +586,7 @@ class Geo:
             nwm30 = "USGS_NWM30",
             nwm31 = "USGS_NWM31",
         )
-        self.cross_usgs_nwm = pd.read_parquet(
+        self.cross_usgs_nwm = read_parquet_file(
             Path(
                 paths.cross_dir, 
                 user_config["CROSSWALK_FILES_CONUS"][
@@ -561,7 +608,7 @@ class Geo:
             nwm30 = "NWM30_HUC12",
             nwm31 = "NWM31_HUC12",
         )
-        self.cross_nwm_huc = pd.read_parquet(
+        self.cross_nwm_huc = read_parquet_file(
             Path(
                 paths.cross_dir, 
                 user_config["CROSSWALK_FILES_CONUS"][
@@ -572,7 +619,7 @@ class Geo:
                 
     def get_usgs_basins(self, paths): 
         user_config = self.config_file_contents
-        self.usgs_basins = gpd.read_parquet(
+        self.usgs_basins = read_parquet_file(
             Path(
                 paths.geo_dir, 
                 user_config["GEO_FILES_CONUS"]["USGS_BASINS"]
@@ -588,13 +635,13 @@ class Geo:
             'stream_order'
         ]
 
-        usgs_drainage_area = pd.read_parquet(
+        usgs_drainage_area = read_parquet_file(
             Path(
                 paths.attribute_dir, 
                 user_config["USGS_ATTRIBUTES_CONUS"]["DRAINAGE_AREA"]
             )
         )
-        usgs_hw_threshold = pd.read_parquet(
+        usgs_hw_threshold = read_parquet_file(
             Path(
                 paths.attribute_dir, 
                 user_config["USGS_ATTRIBUTES_CONUS"]["HW_THRESHOLD"]
@@ -608,12 +655,12 @@ class Geo:
             usgs_hw_threshold, 
             paths.unit_selector.value
         )        
-        self.usgs_ecoregions = pd.read_parquet(
+        self.usgs_ecoregions = read_parquet_file(
             Path(paths.attribute_dir, 
                  user_config["USGS_ATTRIBUTES_CONUS"]["ECOREGIONS"]
                 )
         )
-        self.usgs_stream_order = pd.read_parquet(
+        self.usgs_stream_order = read_parquet_file(
             Path(
                 paths.attribute_dir, 
                 user_config["USGS_ATTRIBUTES_CONUS"]["STREAM_ORDER"]
@@ -907,4 +954,26 @@ def read_json_definitions(
     except:
         parsed_json = {}
     
-    return parsed_json
\ No newline at end of file
+    return parsed_json
+
+def read_parquet_file(
+    filepath: Path
+) -> Union[pd.DataFrame, gpd.GeoDataFrame]:
+    '''
+    read a parquet (or geoparquet) file, through the shared 
+    in-process cache if it is enabled
+    '''
+    if PARQUET_CACHE is not None and str(filepath) in PARQUET_CACHE:
+        return PARQUET_CACHE[str(filepath)].copy()
+    
+    # geoparquet files carry 'geo' metadata
+    if b'geo' in (pq.read_schema(filepath).metadata or {}):
+        df = gpd.read_parquet(filepath)
+    else:
+        df = pd.read_parquet(filepath)
+        
+    if PARQUET_CACHE is not None:
+        PARQUET_CACHE[str(filepath)] = df
+        return df.copy()
+    
+    return df
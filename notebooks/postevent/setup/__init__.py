@@ -1,4 +1,12 @@
 # __init__.py
+from . import checkpoint
+from . import planner
+from . import points
+from . import progress
+from . import references
+from . import usgs
+from . import warehouse
+from . import zonal
 from . import load
 from . import build_data
 from . import build_event
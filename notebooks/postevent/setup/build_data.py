@@ -8,6 +8,7 @@ import param
 from .. import utils
 from .. import config
 from . import class_data
+from . import planner
 
 def build(
     dash_class: class_data.DataSelector_NWMOperational, 
@@ -54,14 +55,16 @@ def build(
                 "reach_set": {"name" : "NWM Reach Set (for streamflow):"},
                 "map_polygons": {"name" : "MAP Polygons (for precipitation)"},
                 "overwrite_flag": {"name" : "Overwrite Existing Data"},
+                "analysis_storage": {"name" : "Analysis Streamflow Storage"},
             },
-            parameters=["reach_set", "map_polygons"],
+            parameters=["reach_set", "map_polygons", "analysis_storage"],
             show_name=False,
             default_layout=pn.Column,
         )
     reach_widget = options.widget('reach_set')
     map_widget = options.widget('map_polygons')
     overwrite_widget = options.widget('overwrite_flag')
+    storage_widget = options.widget('analysis_storage')
     
     forecast_selected_footnote1 = ' - Default dates are the first and '\
                                   'last reference/issue dates of forecasts '\
@@ -136,6 +139,28 @@ def build(
         styles={'font-size':'10pt'}, 
         margin=(0,0,20,20),
     )  
+    
+    # estimated size and duration of the selected loads (planner.py)
+    history_file = planner.get_history_file(dash_class.paths.zarr_dir)
+    estimate_summary = pn.pane.Markdown('')
+    estimate_table = pn.pane.DataFrame(
+        None, 
+        index=False, 
+        sizing_mode='stretch_width',
+    )
+    
+    def update_estimate(*events):
+        try:
+            plan = planner.get_load_plan(dash_class, history_file)
+        except Exception as e:
+            estimate_summary.object = f"#### Load estimate unavailable "\
+                                      f"({type(e).__name__}: {e})"
+            estimate_table.object = None
+            return
+        estimate_summary.object = planner.get_plan_summary(plan)
+        estimate_table.object = plan
+    
+    update_estimate()
 
     layout=pn.Column(
         pn.Spacer(height=40),
@@ -159,12 +184,16 @@ def build(
                 reach_widget, 
                 location_footnote, 
                 map_widget, 
-                map_footnote)
+                map_footnote,
+                storage_widget)
         ),
         pn.pane.Markdown(f"### Dates of Data to Load:"),
         pn.Row(date_start, date_end, overwrite_widget),
         pn.Spacer(height=20),
         footnote1,footnote2,footnote3,footnote4,
+        pn.Spacer(height=20),
+        estimate_summary,
+        estimate_table,
         pn.Spacer(height=100),
         pn.pane.Markdown("#### ------ (blank space added so date selectors "\
                         "are visible without scrolling the cell) ------")
@@ -315,5 +344,17 @@ def build(
 
         if dash_class.dates.data_value_time_end > now:
             dash_class.dates.data_value_time_end = now 
+    
+    # registered last so the estimate sees the updated counts and dates
+    for widget in [
+        fcst_widget, 
+        obs_widget, 
+        reach_widget, 
+        map_widget, 
+        date_start, 
+        date_end
+    ]:
+        widget.param.watch(update_estimate, 'value')
+    dash_class.param.watch(update_estimate, ['variable'])
             
     return layout
\ No newline at end of file
@@ -0,0 +1,194 @@
+'''
+checkpointed data loading - a load is split into units (configuration,
+polygon/reach set, day), each unit is run with retries and exponential
+backoff and its completion is recorded in a JSON checkpoint file, so an
+interrupted or partially failed load resumes with the remaining units
+'''
+import json
+import os
+import time
+import traceback
+import datetime as dt
+import pandas as pd
+
+from pathlib import Path
+from typing import Callable, List, Union
+
+# unit states in the checkpoint file
+STARTED = 'started'
+COMPLETE = 'complete'
+FAILED = 'failed'
+
+
+class LoadCheckpoint:
+    '''
+    Completed/failed load units of an event - the file is rewritten
+    (atomically) after every change
+    '''
+    def __init__(
+        self,
+        filepath: Union[str, Path],
+    ):
+        self.filepath = Path(filepath)
+        self.units = {}
+        if self.filepath.exists():
+            with open(self.filepath) as f:
+                self.units = json.load(f).get('units', {})
+
+    def save(self):
+        self.filepath.parent.mkdir(parents=True, exist_ok=True)
+        temp_filepath = self.filepath.with_suffix('.tmp')
+        with open(temp_filepath, 'w') as f:
+            json.dump(dict(units=self.units), f, indent=1)
+        os.replace(temp_filepath, self.filepath)
+
+    def get_state(self, key: str) -> Union[str, None]:
+        return self.units.get(key, {}).get('state')
+
+    def is_complete(self, key: str) -> bool:
+        return self.get_state(key) == COMPLETE
+
+    def update(self, key: str, state: str, **info):
+        unit = self.units.setdefault(key, {})
+        if state == COMPLETE:
+            # errors of earlier attempts
+            unit.pop('error', None)
+            unit.pop('traceback', None)
+        unit.update(
+            state=state,
+            updated=dt.datetime.now().isoformat(timespec='seconds'),
+            **info
+        )
+        self.save()
+
+    def reset(
+        self,
+        keys: Union[List[str], None] = None,
+    ):
+        '''
+        Forget units (all if keys is None) so they are loaded again
+        '''
+        if keys is None:
+            self.units = {}
+        else:
+            for key in keys:
+                self.units.pop(key, None)
+        self.save()
+
+    def summary(self) -> pd.DataFrame:
+
+        df = pd.DataFrame.from_dict(self.units, orient='index')
+        return df.rename_axis('unit').reset_index()
+
+
+def get_unit_key(
+    configuration: str,
+    subdir: str,
+    day: dt.date,
+) -> str:
+
+    return f"{configuration}/{subdir}/{day.strftime('%Y%m%d')}"
+
+def get_unit_days(
+    start: Union[dt.datetime, pd.Timestamp],
+    n_days: int,
+) -> List[pd.Timestamp]:
+
+    start = pd.Timestamp(start).normalize()
+    return [start + pd.Timedelta(days=i) for i in range(n_days)]
+
+def run_with_retries(
+    function: Callable,
+    retries: int = 3,
+    backoff_seconds: float = 30,
+    max_backoff_seconds: float = 600,
+    label: str = '',
+):
+    '''
+    Call function, retrying failures after exponentially increasing
+    waits (backoff_seconds, 2x, 4x... up to max_backoff_seconds),
+    the last error is raised
+    '''
+    for attempt in range(retries + 1):
+        try:
+            return function()
+        except KeyboardInterrupt:
+            raise
+        except Exception as e:
+            if attempt == retries:
+                raise
+            wait = min(backoff_seconds * 2**attempt, max_backoff_seconds)
+            print(f"   {label} failed ({type(e).__name__}: {e}), "\
+                  f"retry {attempt + 1} of {retries} in {wait} seconds")
+            time.sleep(wait)
+
+def run_units(
+    checkpoint: LoadCheckpoint,
+    units: dict,
+    overwrite: bool = False,
+    retries: int = 3,
+    backoff_seconds: float = 30,
+    callback: Union[Callable, None] = None,
+) -> List[str]:
+    '''
+    Run load units in order - units is {key: function(overwrite_output)}.
+    Completed units are skipped (unless overwrite), units interrupted
+    or failed on a previous run are loaded again with overwrite_output
+    so partial output is replaced (as are retries within a run). 
+    Returns the keys that failed after
+    all retries (the remaining units are still run). callback(key, 
+    state, **info) is called after each unit (e.g., load progress).
+    '''
+    if overwrite:
+        checkpoint.reset(list(units.keys()))
+
+    pending = [k for k in units if not checkpoint.is_complete(k)]
+    n_skipped = len(units) - len(pending)
+    if n_skipped > 0:
+        print(f"   resuming - {n_skipped} of {len(units)} units "\
+              f"already complete")
+
+    failed = []
+    for key in pending:
+        overwrite_output = overwrite \
+            or checkpoint.get_state(key) in [STARTED, FAILED]
+        checkpoint.update(key, STARTED)
+        t_start = time.time()
+        n_attempts = 0
+
+        def run_attempt():
+            nonlocal n_attempts
+            n_attempts += 1
+            # retries replace the partial output of the failed attempt
+            return units[key](overwrite_output or n_attempts > 1)
+
+        try:
+            run_with_retries(
+                run_attempt,
+                retries=retries,
+                backoff_seconds=backoff_seconds,
+                label=key,
+            )
+        except KeyboardInterrupt:
+            raise
+        except Exception as e:
+            checkpoint.update(
+                key,
+                FAILED,
+                error=f"{type(e).__name__}: {e}",
+                traceback=traceback.format_exc(limit=5),
+            )
+            print(f"   {key} failed after {retries} retries: {e}")
+            failed.append(key)
+            if callback is not None:
+                callback(key, FAILED, error=f"{type(e).__name__}: {e}")
+            continue
+        seconds = round(time.time() - t_start, 1)
+        checkpoint.update(key, COMPLETE, seconds=seconds)
+        if callback is not None:
+            callback(key, COMPLETE, seconds=seconds)
+
+    if failed:
+        print(f"   {len(failed)} units failed - run the load again "\
+              f"to retry only those units")
+    return failed
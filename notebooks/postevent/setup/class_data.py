@@ -45,6 +45,16 @@ class DataSelector_NWMOperational(param.Parameterized):
         default= ['HUC10','usgs_basins'],
         objects=['HUC10','usgs_basins']
     )
+    # analysis cycles overlap - keep one value per location and value
+    # time ('best available'), optionally archiving all loaded values
+    analysis_storage = param.Selector(
+        objects=[
+            'best available', 
+            'best available + raw archive', 
+            'all t-minus'
+        ],
+        default='best available'
+    )
     overwrite_flag = param.Selector(
         objects=[False, True], 
         default=False
@@ -3,20 +3,29 @@ building and executing TEEHR data loading functions
 '''
 
 import os
+import shutil
 import time
 import datetime as dt
+import duckdb
 import pandas as pd
 
 from dask.distributed import Client
 from pathlib import Path
-from typing import List, Union
+from typing import Callable, List, Union
 
 import teehr.loading.nwm.nwm_points as tlp
-import teehr.loading.nwm.nwm_grids as tlg
-import teehr.loading.usgs.usgs as tlu
 
 from .. import config
+from ..utils import nwm
 from . import class_data
+from . import checkpoint
+from . import planner
+from . import points
+from . import progress
+from . import references
+from . import usgs
+from . import warehouse
+from . import zonal
 
 def get_client():
     '''
@@ -32,15 +41,129 @@ def get_client():
         
     return client     
 
+def get_load_checkpoint(
+    paths: config.Paths
+) -> checkpoint.LoadCheckpoint:
+
+    return checkpoint.LoadCheckpoint(paths.load_checkpoint_file)
+
+def get_load_progress(
+    paths: config.Paths,
+    client: Union[Client, None] = None,
+) -> progress.LoadProgress:
+    '''
+    Load progress of the event, logged to the event directory - 
+    show it with .view() and pass it to the loading functions
+    '''
+    return progress.LoadProgress(paths.load_progress_file, client)
+
+def get_reference_catalog(
+    paths: config.Paths,
+) -> references.ReferenceCatalog:
+    '''
+    File reference catalog shared by all events
+    '''
+    return references.ReferenceCatalog(
+        Path(paths.zarr_dir, 'reference_catalog')
+    )
+
+def print_catalog_stats(catalog: references.ReferenceCatalog):
+    '''
+    References found in and added to the catalog by a load
+    '''
+    stats = catalog.stats
+    if stats['hits'] + stats['misses'] > 0:
+        print(f"   reference catalog: {stats['hits']} files from the "\
+              f"catalog, {stats['misses']} added, {stats['evicted']} evicted")
+
+def run_load_units(
+    paths: config.Paths,
+    load_checkpoint: checkpoint.LoadCheckpoint,
+    units: dict,
+    configuration: str,
+    subdir: str,
+    files_per_unit: int,
+    overwrite: bool = False,
+    retries: int = 3,
+    backoff_seconds: float = 30,
+    load_progress: Union[progress.LoadProgress, None] = None,
+) -> List[str]:
+    '''
+    Run load units (checkpoint.run_units) and record the throughput 
+    of the units loaded in the load history used by the load planner 
+    (not recorded if any unit failed). Files, rows and unit states are
+    reported to load_progress if given. Returns the failed units.
+    '''
+    n_pending = len([
+        k for k in units 
+        if overwrite or not load_checkpoint.is_complete(k)
+    ])
+    source = f"{configuration}/{subdir}"
+    callback = None
+    if load_progress is not None:
+        load_progress.start_source(
+            source, 
+            len(units), 
+            n_pending, 
+            files_per_unit
+        )
+        progress.set_active(load_progress)
+        callback = lambda key, state, **info: \
+            load_progress.update_unit(source, key, state, **info)
+    t_start = time.time()
+    try:
+        failed = checkpoint.run_units(
+            load_checkpoint, 
+            units, 
+            overwrite = overwrite,
+            retries = retries,
+            backoff_seconds = backoff_seconds,
+            callback = callback,
+        )
+    finally:
+        if load_progress is not None:
+            progress.set_active(None)
+            load_progress.end_source(source)
+    if n_pending > 0 and len(failed) == 0:
+        planner.record_load(
+            planner.get_history_file(paths.zarr_dir),
+            configuration,
+            subdir,
+            n_pending,
+            n_pending * files_per_unit,
+            time.time() - t_start,
+        )
+    return failed
+
+def get_grid_weights_subset_file(
+    grid_wts_dir: Union[str, Path]
+) -> Path:
+
+    return Path(grid_wts_dir, 'temp_grid_weights_subset.parquet')
+
 def launch_teehr_streamflow_loading(
     paths: config.Paths,
     event: config.Event,
     data_selector: class_data.DataSelector_NWMOperational,
-):
+    retries: int = 3,
+    backoff_seconds: float = 30,
+    load_progress: Union[progress.LoadProgress, None] = None,
+) -> List[str]:
     '''
     Launch TEEHR loading functions for streamflow data sources 
-    based on data selections
+    based on data selections. Each source is loaded one day at a time 
+    (USGS in planned, concurrent request batches), completed units are 
+    recorded in the event load checkpoint and 
+    skipped when the load is run again (unless overwriting). 
+    Returns the units (source/subdir/day) that failed after retries.
+    Progress is reported to load_progress (get_load_progress), or 
+    only logged if None.
     '''
+    load_checkpoint = get_load_checkpoint(paths)
+    if load_progress is None:
+        load_progress = get_load_progress(paths)
+    catalog = get_reference_catalog(paths)
+    failed = []
 
     if data_selector.overwrite_flag:
         print('Heads Up - you are overwriting existing output.  '\
@@ -72,11 +195,6 @@ def launch_teehr_streamflow_loading(
                 data_selector.forecast_config, 
                 parquet_subdir
             )    
-            zarr_dir = Path(
-                paths.zarr_dir, 
-                data_selector.forecast_config
-            )
-            
             output_label = 'channel_rt'
             if data_selector.forecast_config == 'medium_range_mem1':
                 output_label = 'channel_rt_1'
@@ -86,18 +204,50 @@ def launch_teehr_streamflow_loading(
                   f"NWM reaches from {data_selector.dates.ref_time_start} "\
                   f"to {data_selector.dates.ref_time_end}")
                   
-            tlp.nwm_to_parquet(
+            units = {}
+            for day in checkpoint.get_unit_days(
+                data_selector.dates.ref_time_start, 
+                n_days
+            ):
+                key = checkpoint.get_unit_key(
+                    data_selector.forecast_config, 
+                    parquet_subdir, 
+                    day
+                )
+                units[key] = lambda overwrite, day=day: load_to_event(
+                    paths,
+                    'nwm',
+                    data_selector.forecast_config,
+                    parquet_subdir,
+                    day,
+                    [f"{event.nwm_version}-{i}" for i in event.nwm_id_list],
+                    ts_dir,
+                    lambda location_ids, output_dir, overwrite: \
+                        load_nwm_streamflow(
+                            paths,
+                            event,
+                            data_selector.forecast_config,
+                            output_label,
+                            day,
+                            output_dir,
+                            [int(i.split('-')[1]) for i in location_ids],
+                            gages_only = parquet_subdir == 'gages',
+                            catalog = catalog,
+                            overwrite_output = overwrite
+                        ),
+                    overwrite_output = overwrite
+                )
+            failed += run_load_units(
+                paths,
+                load_checkpoint, 
+                units, 
                 data_selector.forecast_config,
-                output_label,
-                'streamflow',
-                data_selector.dates.ref_time_start,
-                n_days,
-                event.nwm_id_list,
-                zarr_dir,
-                ts_dir,
-                event.nwm_version,
-                ignore_missing_file = True,
-                overwrite_output = data_selector.overwrite_flag
+                parquet_subdir,
+                planner.get_file_count(data_selector.forecast_config, 1),
+                overwrite = overwrite_output,
+                retries = retries,
+                backoff_seconds = backoff_seconds,
+                load_progress = load_progress,
             )
             print(f"...{data_selector.forecast_config} "\
                   f"streamflow loading complete in "\
@@ -112,13 +262,81 @@ def launch_teehr_streamflow_loading(
             print(f"Loading USGS streamflow for {len(event.usgs_id_list)} "\
                   f"gages from {data_selector.dates.data_value_time_start} "\
                   f"to {data_selector.dates.data_value_time_end}") 
-            tlu.usgs_to_parquet(
-                event.usgs_id_list,
-                data_selector.dates.data_value_time_start,
-                data_selector.dates.data_value_time_end,
-                ts_dir,
-                chunk_by = 'day',
-                overwrite_output = overwrite_output
+            value_time_start = pd.Timestamp(
+                data_selector.dates.data_value_time_start
+            )
+            value_time_end = pd.Timestamp(
+                data_selector.dates.data_value_time_end
+            )
+            base_url = paths.usgs_iv_url or usgs.USGS_IV_URL
+            n_days = (value_time_end.normalize() \
+                      - value_time_start.normalize()).days + 1
+            units = {}
+            if paths.warehouse_dir is None:
+                # one unit - the requests (location batches x date spans)
+                # are planned over the whole period and run concurrently,
+                # request files are written atomically so a resumed unit
+                # only makes the missing requests (keyed by the period 
+                # and sites, so an extended period or another site list
+                # is loaded again)
+                key = checkpoint.get_unit_key(
+                    'usgs', 
+                    f"gages/{value_time_start.strftime('%Y%m%dT%H%M')}_"\
+                    f"{value_time_end.strftime('%Y%m%dT%H%M')}_"\
+                    f"{usgs.get_site_key(event.usgs_id_list)}", 
+                    value_time_start
+                )
+                units[key] = lambda overwrite: usgs.usgs_to_parquet(
+                    event.usgs_id_list,
+                    value_time_start,
+                    value_time_end,
+                    ts_dir,
+                    base_url = base_url,
+                    overwrite_output = overwrite
+                )
+                n_requests = usgs.get_request_plan(
+                    len(event.usgs_id_list),
+                    n_days
+                )['n_requests']
+            else:
+                # whole days in the shared warehouse, location batches
+                # of the missing gages run concurrently
+                for day in checkpoint.get_unit_days(value_time_start, n_days):
+                    key = checkpoint.get_unit_key('usgs', 'gages', day)
+                    units[key] = lambda overwrite, day=day: load_to_event(
+                        paths,
+                        'usgs',
+                        'usgs',
+                        'gages',
+                        day,
+                        ['usgs-' + i for i in event.usgs_id_list],
+                        ts_dir,
+                        lambda location_ids, output_dir, overwrite: \
+                            usgs.usgs_to_parquet(
+                                [i.split('-')[1] for i in location_ids],
+                                day,
+                                day + pd.Timedelta(days=1, minutes=-1),
+                                output_dir,
+                                base_url = base_url,
+                                overwrite_output = overwrite
+                            ),
+                        overwrite_output = overwrite
+                    )
+                n_requests = usgs.get_request_plan(
+                    len(event.usgs_id_list),
+                    1
+                )['n_requests']
+            failed += run_load_units(
+                paths,
+                load_checkpoint, 
+                units, 
+                'usgs',
+                'gages',
+                n_requests,
+                overwrite = overwrite_output,
+                retries = retries,
+                backoff_seconds = backoff_seconds,
+                load_progress = load_progress,
             )
             print(f"...USGS loading complete in "\
                   f"{round((time.time() - t_start)/60,5)} minutes\n") 
@@ -134,6 +352,8 @@ def launch_teehr_streamflow_loading(
         ]
         n_days = (data_selector.dates.data_value_time_end \
                   - data_selector.dates.data_value_time_start).days + 1
+        storage_key = data_selector.analysis_storage \
+            .replace(' + ', '+').replace(' ', '_')
         for ana in ana_list:
             if ana in data_selector.verify_config:
                 if ana[-1] == '*':
@@ -141,7 +361,12 @@ def launch_teehr_streamflow_loading(
                 
                 t_start = time.time()
                 ts_dir = Path(paths.parquet_dir, ana, parquet_subdir)
-                zarr_dir = Path(paths.zarr_dir, ana)
+                load_dir = get_analysis_load_dir(
+                    paths, 
+                    ana, 
+                    parquet_subdir, 
+                    data_selector.analysis_storage
+                )
                 if 'extend' in ana:
                     tm_range = [t for t in range(0,28)]
                 else:
@@ -150,171 +375,467 @@ def launch_teehr_streamflow_loading(
                 print(f"Loading {ana} streamflow for {len(event.nwm_id_list)} "\
                       f"NWM reaches from {data_selector.dates.data_value_time_start} "\
                       f"to {data_selector.dates.data_value_time_end}")
-                tlp.nwm_to_parquet(
+                units = {}
+                for day in checkpoint.get_unit_days(
+                    data_selector.dates.data_value_time_start, 
+                    n_days
+                ):
+                    # units loaded for another storage mode are in 
+                    # another directory (or were reduced, or removed)
+                    key = checkpoint.get_unit_key(
+                        ana, 
+                        f"{parquet_subdir}/{storage_key}", 
+                        day
+                    )
+                    units[key] = lambda overwrite, day=day, ana=ana, \
+                        load_dir=load_dir, tm_range=tm_range: \
+                        load_nwm_streamflow(
+                            paths,
+                            event,
+                            ana,
+                            'channel_rt',
+                            day,
+                            load_dir,
+                            gages_only = parquet_subdir == 'gages',
+                            t_minus_hours = tm_range,
+                            catalog = catalog,
+                            overwrite_output = overwrite
+                        )
+                failed += run_load_units(
+                    paths,
+                    load_checkpoint, 
+                    units, 
                     ana,
-                    'channel_rt',
-                    'streamflow',
-                    data_selector.dates.data_value_time_start,
-                    n_days,        
-                    event.nwm_id_list,
-                    zarr_dir,
-                    ts_dir,
-                    event.nwm_version,
-                    t_minus_hours = tm_range,
-                    ignore_missing_file = True,
-                    overwrite_output = data_selector.overwrite_flag
+                    parquet_subdir,
+                    planner.get_file_count(ana, 1, tm_range),
+                    overwrite = overwrite_output,
+                    retries = retries,
+                    backoff_seconds = backoff_seconds,
+                    load_progress = load_progress,
                 )
+                # overlapping cycles (t-minus hours) -> one value per 
+                # location and value time
+                if load_dir != ts_dir:
+                    write_best_available(
+                        load_dir, 
+                        ts_dir, 
+                        keep_raw = data_selector.analysis_storage \
+                            == 'best available + raw archive',
+                        overwrite = overwrite_output,
+                    )
                 print(f"...{ana} streamflow loading complete in "\
                       f"{round((time.time() - t_start)/60,5)} minutes\n")
+
+    print_catalog_stats(catalog)
+
+    return failed
                 
+def get_warehouse(
+    paths: config.Paths,
+) -> Union[warehouse.Warehouse, None]:
+    '''
+    Time series warehouse shared by all events, if WAREHOUSE_DIR
+    is in the config file
+    '''
+    if paths.warehouse_dir is None:
+        return None
+    return warehouse.Warehouse(paths.warehouse_dir)
+
+def load_to_event(
+    paths: config.Paths,
+    source: str,
+    configuration: str,
+    subdir: str,
+    day: pd.Timestamp,
+    location_ids: List[str],
+    ts_dir: Path,
+    load_function: Callable,
+    overwrite_output: bool = False,
+):
+    '''
+    Load one day of a source into the event directory ts_dir with
+    load_function(location_ids, output_dir, overwrite_output). With a 
+    shared warehouse, only the locations missing from the warehouse 
+    (for this reach set, subdir) are loaded and ts_dir becomes a view 
+    (links) of the warehouse files.
+    '''
+    event_warehouse = get_warehouse(paths)
+    if event_warehouse is None:
+        return load_function(location_ids, ts_dir, overwrite_output)
+
+    n_loaded = event_warehouse.load_slice(
+        source,
+        configuration,
+        subdir,
+        day,
+        location_ids,
+        ts_dir,
+        Path(paths.raw_dir, 'staging'),
+        lambda missing_ids, output_dir: \
+            load_function(missing_ids, output_dir, True),
+        overwrite = overwrite_output,
+    )
+    print(f"   {configuration} {day.strftime('%Y-%m-%d')}: "\
+          f"{len(location_ids) - n_loaded} of {len(location_ids)} "\
+          f"locations from the warehouse")
+
+def load_nwm_streamflow(
+    paths: config.Paths,
+    event: config.Event,
+    configuration: str,
+    output_type: str,
+    day: pd.Timestamp,
+    ts_dir: Path,
+    feature_ids: Union[List[int], None] = None,
+    gages_only: bool = True,
+    t_minus_hours: Union[List[int], None] = None,
+    catalog: Union[references.ReferenceCatalog, None] = None,
+    overwrite_output: bool = False,
+):
+    '''
+    Load one day of NWM streamflow for the event reaches (or 
+    feature_ids) - gaged reach sets are read from only the file chunks 
+    holding those reaches (points.py), all reaches with TEEHR 
+    (whole files). The file references are kept in catalog (the 
+    shared reference catalog if None).
+    '''
+    if feature_ids is None:
+        feature_ids = event.nwm_id_list
+    if catalog is None:
+        catalog = get_reference_catalog(paths)
+    if gages_only:
+        points.nwm_points_to_parquet(
+            configuration,
+            output_type,
+            day,
+            1,
+            feature_ids,
+            ts_dir,
+            event.nwm_version,
+            points.get_feature_index_file(
+                paths.zarr_dir, 
+                event.nwm_version, 
+                output_type
+            ),
+            t_minus_hours = t_minus_hours,
+            base_url = paths.nwm_base_url or nwm.NWM_BUCKET_URL,
+            catalog = catalog,
+            overwrite_output = overwrite_output
+        )
+    else:
+        t_start = time.time()
+        tlp.nwm_to_parquet(
+            configuration,
+            output_type,
+            'streamflow',
+            day,
+            1,
+            feature_ids,
+            Path(paths.zarr_dir, configuration),
+            ts_dir,
+            event.nwm_version,
+            t_minus_hours = t_minus_hours,
+            ignore_missing_file = True,
+            overwrite_output = overwrite_output
+        )
+        progress.report(rows=progress.count_new_rows(ts_dir, t_start))
+
 def launch_teehr_precipitation_loading(
     paths: config.Paths,
     event: config.Event,
     geo: config.Geo,
     data_selector: class_data.DataSelector_NWMOperational,
-):
+    retries: int = 3,
+    backoff_seconds: float = 30,
+    load_progress: Union[progress.LoadProgress, None] = None,
+) -> List[str]:
     '''
-    Launch TEEHR loading functions for precipitation data sources 
-    based on data selections
+    Launch mean areal precipitation loading for the selected data 
+    sources. Each forcing grid is read once and the MAPs of all selected 
+    polygon sets are computed from it (see zonal.py). Each source is 
+    loaded one day at a time, with the same checkpointing as streamflow 
+    loading. Returns the units (source/polygons/day) that failed after 
+    retries. Progress is reported to load_progress (get_load_progress), 
+    or only logged if None.
     '''
+    load_checkpoint = get_load_checkpoint(paths)
+    if load_progress is None:
+        load_progress = get_load_progress(paths)
+    catalog = get_reference_catalog(paths)
+    failed = []
+
     # only load precipitation data if it is a selected variable
-    if 'mean areal precipitation' in data_selector.variable:
-        for map_polygons in data_selector.map_polygons:
-            
-            # set a subdirectory name (under forecast/obs timeseries dir) 
-            # to keep the MAPs for different polygon sets separate 
-            # (HUC10s or USGS basins for now)
-            if map_polygons == 'HUC10':
-                parquet_subdir = 'huc10'
-                n_polys = len(event.huc10_list)
-                polygon_set = 'HUC10s'
-            elif map_polygons == 'usgs_basins':
-                parquet_subdir = 'usgs_basins'
-                n_polys = len(event.usgs_id_list)
-                polygon_set = 'USGS basins'
-                
-            # valid observed configurations for precipitation
-            ana_list = ['analysis_assim_extend', 'analysis_assim']
-            
-            # write subset of weights to temporary file (necessary to 
-            # avoid memory issues when passing in memory for distributed 
-            # computing)
-            write_grid_weights_subset(
-                paths.config_file_contents, 
-                paths.grid_wts_dir, 
-                map_polygons,
-                event.huc10_list, 
-                event.usgs_id_list,                
-            )       
-            
-            # load selected forecast data if any
-            if data_selector.forecast_config != 'none':
-                t_start = time.time()
-                
-                # add the prefix for forcing config
-                forcing_forecast_configuration = 'forcing_' \
-                                                  + data_selector.forecast_config
-                if forcing_forecast_configuration == 'forcing_medium_range_mem1':
-                    forcing_forecast_configuration = 'forcing_medium_range'                
-                
-                # get sub-directories and # days of forecasts to load
-                n_days = (data_selector.dates.ref_time_end \
-                          - data_selector.dates.ref_time_start).days + 1
-                ts_dir = Path(
-                    paths.parquet_dir, 
-                    forcing_forecast_configuration, 
-                    parquet_subdir
-                )    
-                zarr_dir = Path(
-                    paths.zarr_dir, 
-                    forcing_forecast_configuration
-                )
+    if 'mean areal precipitation' not in data_selector.variable:
+        return failed
+    
+    # subdirectory names (under forecast/obs timeseries dir) keep the 
+    # MAPs for different polygon sets separate (HUC10s or USGS basins
+    # for now), weight subsets are read once for all loads
+    weight_sets = {}
+    polygon_sets = []
+    for map_polygons in data_selector.map_polygons:
+        if map_polygons == 'HUC10':
+            parquet_subdir = 'huc10'
+            polygon_sets.append(f"{len(event.huc10_list)} HUC10s")
+        elif map_polygons == 'usgs_basins':
+            parquet_subdir = 'usgs_basins'
+            polygon_sets.append(f"{len(event.usgs_id_list)} USGS basins")
+        weight_sets[parquet_subdir] = get_grid_weights_subset(
+            paths.config_file_contents, 
+            paths.grid_wts_dir, 
+            map_polygons,
+            event.huc10_list, 
+            event.usgs_id_list,                
+        )
+    if len(weight_sets) == 0:
+        print('No data loaded - no MAP polygons selected')
+        return failed
+    units_subdir = '+'.join(weight_sets.keys())
+    polygon_sets = ' and '.join(polygon_sets)
+        
+    # valid observed configurations for precipitation
+    ana_list = ['analysis_assim_extend', 'analysis_assim']
     
-                print(f"Loading {forcing_forecast_configuration} "\
-                      f"mean areal precipitation for {n_polys} {polygon_set} "\
-                      f"from {data_selector.dates.ref_time_start} to "\
-                      f"{data_selector.dates.ref_time_end}")
-                tlg.nwm_grids_to_parquet(
+    # load selected forecast data if any
+    if data_selector.forecast_config != 'none':
+        t_start = time.time()
+        
+        # add the prefix for forcing config
+        forcing_forecast_configuration = 'forcing_' \
+                                          + data_selector.forecast_config
+        if forcing_forecast_configuration == 'forcing_medium_range_mem1':
+            forcing_forecast_configuration = 'forcing_medium_range'                
+        
+        # get sub-directories and # days of forecasts to load
+        n_days = (data_selector.dates.ref_time_end \
+                  - data_selector.dates.ref_time_start).days + 1
+        ts_dirs = {
+            subdir: Path(
+                paths.parquet_dir, 
+                forcing_forecast_configuration, 
+                subdir
+            ) for subdir in weight_sets
+        }
+
+        print(f"Loading {forcing_forecast_configuration} "\
+              f"mean areal precipitation for {polygon_sets} "\
+              f"from {data_selector.dates.ref_time_start} to "\
+              f"{data_selector.dates.ref_time_end}")
+        units = {}
+        for day in checkpoint.get_unit_days(
+            data_selector.dates.ref_time_start, 
+            n_days
+        ):
+            key = checkpoint.get_unit_key(
+                forcing_forecast_configuration, 
+                units_subdir, 
+                day
+            )
+            units[key] = lambda overwrite, day=day: \
+                zonal.nwm_grids_to_parquet_multi(
                     forcing_forecast_configuration,
-                    'forcing',
-                    'RAINRATE',
-                    data_selector.dates.ref_time_start,
-                    n_days,
-                    str(paths.geo_dir) + '/temp_grid_weights_subset.parquet',
-                    #Path(paths.geo_dir, 'temp_grid_weights_subset.parquet'),
-                    zarr_dir,
-                    ts_dir,
-                    event.nwm_version,
-                    ignore_missing_file = True,
-                    kerchunk_method = "local",
-                    overwrite_output = data_selector.overwrite_flag
+                    day,
+                    1,
+                    weight_sets,
+                    ts_dirs,
+                    base_url = paths.nwm_base_url or nwm.NWM_BUCKET_URL,
+                    cache_dir = paths.zonal_dir,
+                    catalog = catalog,
+                    overwrite_output = overwrite
                 )
-                print(f"...{forcing_forecast_configuration} "\
-                      f"mean areal precipitation loading complete in "\
-                      f"{round((time.time() - t_start)/60,5)} minutes\n")
+        failed += run_load_units(
+            paths,
+            load_checkpoint, 
+            units, 
+            forcing_forecast_configuration,
+            units_subdir,
+            planner.get_file_count(forcing_forecast_configuration, 1),
+            overwrite = data_selector.overwrite_flag,
+            retries = retries,
+            backoff_seconds = backoff_seconds,
+            load_progress = load_progress,
+        )
+        print(f"...{forcing_forecast_configuration} "\
+              f"mean areal precipitation loading complete in "\
+              f"{round((time.time() - t_start)/60,5)} minutes\n")
+    else:
+        if not any(s in data_selector.verify_config for s in ana_list):
+            print('No data loaded - no valid datasets selected')
+
+    n_days = (data_selector.dates.data_value_time_end \
+               - data_selector.dates.data_value_time_start).days + 1
+    
+    for ana in ana_list:          
+        if ana in data_selector.verify_config:
+            t_start = time.time()
+            
+            forcing_ana_config = 'forcing_' + ana
+            ts_dirs = {
+                subdir: Path(
+                    paths.parquet_dir, 
+                    forcing_ana_config, 
+                    subdir
+                ) for subdir in weight_sets
+            }
+            if 'extend' in ana:
+                tm_range = [t for t in range(4,28)]
             else:
-                if not any(s in data_selector.verify_config for s in ana_list):
-                    print('No data loaded - no valid datasets selected')
+                tm_range = [2]   
 
-            n_days = (data_selector.dates.data_value_time_end \
-                       - data_selector.dates.data_value_time_start).days + 1
+            print(f"Loading {ana} mean areal precipitation for "\
+                  f"{polygon_sets} from "\
+                  f"{data_selector.dates.data_value_time_start} "\
+                  f"to {data_selector.dates.data_value_time_end}")
             
-            for ana in ana_list:          
-                if ana in data_selector.verify_config:
-                    t_start = time.time()
-                    
-                    forcing_ana_config = 'forcing_' + ana
-                    ts_dir = Path(
-                        paths.parquet_dir, 
-                        forcing_ana_config, 
-                        parquet_subdir
-                    )
-                    zarr_dir = Path(paths.zarr_dir, forcing_ana_config)
-                    if 'extend' in ana:
-                        tm_range = [t for t in range(4,28)]
-                    else:
-                        tm_range = [2]   
-    
-                    print(f"Loading {ana} mean areal precipitation for "\
-                          f"{n_polys} {polygon_set} from "\
-                          f"{data_selector.dates.data_value_time_start} "\
-                          f"to {data_selector.dates.data_value_time_end}")
-                    
-                    tlg.nwm_grids_to_parquet(
+            units = {}
+            for day in checkpoint.get_unit_days(
+                data_selector.dates.data_value_time_start, 
+                n_days
+            ):
+                key = checkpoint.get_unit_key(
+                    forcing_ana_config, 
+                    units_subdir, 
+                    day
+                )
+                units[key] = lambda overwrite, day=day, \
+                    forcing_ana_config=forcing_ana_config, \
+                    ts_dirs=ts_dirs, tm_range=tm_range: \
+                    zonal.nwm_grids_to_parquet_multi(
                         forcing_ana_config,
-                        'forcing',
-                        'RAINRATE',
-                        data_selector.dates.data_value_time_start,
-                        n_days,        
-                        str(paths.geo_dir) + '/temp_grid_weights_subset.parquet',
-                        #Path(paths.geo_dir, 'temp_grid_weights_subset.parquet'),
-                        zarr_dir,
-                        ts_dir,
-                        event.nwm_version,
+                        day,
+                        1,        
+                        weight_sets,
+                        ts_dirs,
                         t_minus_hours = tm_range,
-                        ignore_missing_file = True,
-                        overwrite_output = data_selector.overwrite_flag
+                        base_url = paths.nwm_base_url or nwm.NWM_BUCKET_URL,
+                        cache_dir = paths.zonal_dir,
+                        catalog = catalog,
+                        overwrite_output = overwrite
                     )
-                    print(f"...{forcing_ana_config} mean areal precipitation "\
-                          f"loading complete in {round((time.time() - t_start)/60,5)} "\
-                          f"minutes\n")
+            failed += run_load_units(
+                paths,
+                load_checkpoint, 
+                units, 
+                forcing_ana_config,
+                units_subdir,
+                planner.get_file_count(forcing_ana_config, 1, tm_range),
+                overwrite = data_selector.overwrite_flag,
+                retries = retries,
+                backoff_seconds = backoff_seconds,
+                load_progress = load_progress,
+            )
+            print(f"...{forcing_ana_config} mean areal precipitation "\
+                  f"loading complete in {round((time.time() - t_start)/60,5)} "\
+                  f"minutes\n")
 
-            remove_grid_weights_subset()
-            
+    print_catalog_stats(catalog)
 
-def write_grid_weights_subset(
+    return failed
+
+def get_analysis_load_dir(
+    paths: config.Paths,
+    configuration: str,
+    parquet_subdir: str,
+    analysis_storage: str = 'best available',
+) -> Path:
+    '''
+    Directory TEEHR writes analysis time series to - the event 
+    parquet directory for 'all t-minus', otherwise a raw directory
+    that write_best_available reduces into the parquet directory
+    '''
+    if analysis_storage == 'all t-minus':
+        return Path(paths.parquet_dir, configuration, parquet_subdir)
+    
+    return Path(paths.raw_dir, configuration, parquet_subdir)
+
+def write_best_available(
+    raw_dir: Union[str, Path],
+    ts_dir: Union[str, Path],
+    keep_raw: bool = False,
+    overwrite: bool = False,
+) -> List[Path]:
+    '''
+    Reduce analysis time series loaded for overlapping cycles 
+    (t-minus hours) to the value from the most recent reference time
+    per location and value time (as the explorer keeps), written in one
+    pass as daily files best_YYYYMMDD.parquet sorted by location and
+    value time. Existing best files for the same days are merged 
+    (unless overwrite) so days completed by a later load are filled 
+    in. The raw files are removed unless keep_raw.
+    '''
+    raw_files = sorted(Path(raw_dir).glob("*.parquet"))
+    if len(raw_files) == 0:
+        return []
+    ts_dir = Path(ts_dir)
+    ts_dir.mkdir(parents=True, exist_ok=True)
+    # next to the best files (same file system), not matched by the 
+    # *.parquet file patterns of the queries
+    staging_dir = Path(ts_dir, '.best_staging')
+    shutil.rmtree(staging_dir, ignore_errors=True)
+
+    raw_list = ", ".join(f"'{f}'" for f in raw_files)
+    sources = f"SELECT *, 0 AS priority FROM read_parquet([{raw_list}])"
+    best_files = sorted(ts_dir.glob("best_*.parquet"))
+    if best_files and not overwrite:
+        # only the existing days that are loaded again
+        best_list = ", ".join(f"'{f}'" for f in best_files)
+        sources += f" UNION ALL BY NAME "\
+                   f"SELECT *, 1 AS priority FROM read_parquet([{best_list}]) "\
+                   f"WHERE CAST(value_time AS DATE) IN ("\
+                   f"SELECT DISTINCT CAST(value_time AS DATE) "\
+                   f"FROM read_parquet([{raw_list}]))"
+
+    # one pass over the raw files, written as one directory per day
+    con = duckdb.connect()
+    con.sql(f'''
+        COPY (
+            SELECT * EXCLUDE (priority), 
+                strftime(value_time, '%Y%m%d') AS day
+            FROM ({sources})
+            QUALIFY row_number() OVER (
+                PARTITION BY location_id, value_time
+                ORDER BY reference_time DESC, priority
+            ) = 1
+            ORDER BY location_id, value_time
+        ) TO '{staging_dir}' (FORMAT PARQUET, PARTITION_BY (day))
+    ''')
+
+    written = []
+    for day_dir in sorted(staging_dir.glob("day=*")):
+        best_file = Path(ts_dir, f"best_{day_dir.name[4:]}.parquet")
+        day_files = sorted(day_dir.glob("*.parquet"))
+        if len(day_files) == 1:
+            os.replace(day_files[0], best_file)
+        else:
+            # written by several threads
+            temp_file = best_file.with_suffix('.tmp')
+            day_list = ", ".join(f"'{f}'" for f in day_files)
+            con.sql(f"COPY (SELECT * FROM read_parquet([{day_list}]) "\
+                    f"ORDER BY location_id, value_time) "\
+                    f"TO '{temp_file}' (FORMAT PARQUET)")
+            os.replace(temp_file, best_file)
+        written.append(best_file)
+    con.close()
+    shutil.rmtree(staging_dir, ignore_errors=True)
+
+    if not keep_raw:
+        for f in raw_files:
+            f.unlink()
+    print(f"   {len(raw_files)} analysis files reduced to best available "\
+          f"values in {len(written)} daily files")
+
+    return written
+
+def get_grid_weights_subset(
     user_config: dict,
     grid_wts_dir: str,
     polygon_set: str,
     huc10_list: List[str],
     usgs_id_list: List[str],
-    ):
+    ) -> pd.DataFrame:
     '''
-    Create a subset of grid weights to speed up read and processing 
-    during MAP calculations. TEEHR preciptation loading and 
-    MAP calculations read a weights file from disk to prevent
-    memory issues that would occur is passing in memory for 
-    distributed computing). 
+    Subset of grid weights for the event polygons to speed up 
+    MAP calculations
     '''        
     if any(s in polygon_set for s in ['huc10','HUC10']):
         grid_weights = pd.read_parquet(
@@ -334,24 +855,35 @@ def write_grid_weights_subset(
         )  
         id_list_with_prefix = ['-'.join(['usgs', s]) for s in usgs_id_list]
 
-    grid_weights_subset = grid_weights[
+    return grid_weights[
         grid_weights['location_id'].isin(id_list_with_prefix)
-    ]
+    ].reset_index(drop=True)
 
-    grid_weights_subset.to_parquet(
-        Path(
-            grid_wts_dir, 
-            'temp_grid_weights_subset.parquet'
-        )
+def write_grid_weights_subset(
+    user_config: dict,
+    grid_wts_dir: str,
+    polygon_set: str,
+    huc10_list: List[str],
+    usgs_id_list: List[str],
+    ):
+    '''
+    Write a subset of grid weights to a temporary file, for TEEHR 
+    preciptation loading which reads the weights file from disk 
+    (to prevent memory issues that would occur if passing in memory 
+    for distributed computing). 
+    '''        
+    get_grid_weights_subset(
+        user_config, 
+        grid_wts_dir, 
+        polygon_set, 
+        huc10_list, 
+        usgs_id_list
+    ).to_parquet(
+        get_grid_weights_subset_file(grid_wts_dir)
     )
 
 def remove_grid_weights_subset(grid_wts_dir: str):
 
-    file = Path(
-        grid_wts_dir, 
-        'grid_weights', 
-        'temp_grid_weights_subset.parquet'
-    )
-    file.unlink()
+    get_grid_weights_subset_file(grid_wts_dir).unlink(missing_ok=True)
     
 
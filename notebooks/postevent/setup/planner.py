@@ -0,0 +1,335 @@
+'''
+load planner - estimates the size and duration of the loads selected in
+the data selector dashboard before they are run: number of source files
+(or requests), bytes fetched, parquet output size and wall time. Wall
+times come from the throughput of previous loads (a history file shared
+by all events, appended by load.py), or from default rates until a
+configuration has been loaded once.
+'''
+import json
+import datetime as dt
+import pandas as pd
+
+from pathlib import Path
+from typing import List, Union
+
+from ..utils import nwm
+from . import points
+from . import usgs
+
+# approximate size of one CONUS file by output type (MB)
+FILE_MB = {
+    'channel_rt': 12.0,
+    'forcing': 35.0,
+}
+# storage chunks per channel_rt file when no feature index is built yet
+DEFAULT_N_CHUNKS = 100
+# forcing grid window - fraction of the CONUS grid read per polygon (the
+# chunk-aligned window of the polygon cells), HUC10s in CONUS
+WINDOW_FACTOR = 4
+N_HUC10_CONUS = 18000
+# NWIS IV JSON per site-day of 15-minute values (MB)
+USGS_MB_PER_SITE_DAY = 0.008
+# parquet output per value (TEEHR timeseries schema, compressed)
+OUTPUT_BYTES_PER_VALUE = 12
+# wall seconds per file until a configuration has history
+DEFAULT_SECONDS_PER_FILE = {
+    'gages': 0.3,
+    'all': 4.0,
+    'maps': 1.5,
+}
+# previous loads used for the throughput of a configuration
+N_HISTORY_RECORDS = 20
+# loads longer than this are flagged in the dashboard
+LONG_LOAD_MINUTES = 60
+
+# feature indexes read for the estimates, by file and modification time
+FEATURE_INDEX_CACHE = {}
+
+
+def get_history_file(zarr_dir: Union[str, Path]) -> Path:
+    '''
+    Load history location, shared by all events
+    '''
+    return Path(zarr_dir, 'load_history.jsonl')
+
+def record_load(
+    history_file: Union[str, Path],
+    configuration: str,
+    subdir: str,
+    n_units: int,
+    n_files: int,
+    seconds: float,
+):
+    '''
+    Append the throughput of a completed load to the history
+    '''
+    history_file = Path(history_file)
+    history_file.parent.mkdir(parents=True, exist_ok=True)
+    record = dict(
+        time=dt.datetime.now().isoformat(timespec='seconds'),
+        configuration=configuration,
+        subdir=subdir,
+        n_units=n_units,
+        n_files=n_files,
+        seconds=round(seconds, 1),
+    )
+    with open(history_file, 'a') as f:
+        f.write(json.dumps(record) + '\n')
+
+def read_history(history_file: Union[str, Path, None]) -> pd.DataFrame:
+
+    columns = ['time','configuration','subdir','n_units','n_files','seconds']
+    if history_file is None or not Path(history_file).exists():
+        return pd.DataFrame(columns=columns)
+
+    records = []
+    with open(history_file) as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                # partly written line
+                continue
+
+    return pd.DataFrame(records, columns=columns)
+
+def get_seconds_per_file(
+    history: pd.DataFrame,
+    configuration: str,
+    subdir: str,
+    default: float,
+) -> tuple:
+    '''
+    Wall seconds per file of the recent loads of a configuration and
+    subdir, default if there are none - returns (seconds, basis)
+    '''
+    df = history[
+        (history['configuration'] == configuration)
+        & (history['subdir'] == subdir)
+        & (history['n_files'] > 0)
+    ].tail(N_HISTORY_RECORDS)
+    if len(df) == 0:
+        return default, 'default'
+
+    return df['seconds'].sum() / df['n_files'].sum(), 'history'
+
+def get_file_count(
+    configuration: str,
+    n_days: int,
+    t_minus_hours: Union[List[int], None] = None,
+) -> int:
+    '''
+    Number of NWM files of a configuration over n_days
+    '''
+    ref_hours, step_label, steps = nwm.NWM_FILE_SPECS[configuration]
+    if t_minus_hours is not None:
+        steps = [s for s in steps if s in t_minus_hours]
+
+    return n_days * len(ref_hours) * len(steps)
+
+def get_chunk_fraction(
+    paths,
+    event,
+    output_type: str,
+) -> float:
+    '''
+    Fraction of the channel_rt storage chunks holding the event
+    reaches - from the feature index if built, otherwise the expected
+    fraction for reaches spread over DEFAULT_N_CHUNKS chunks
+    '''
+    index_file = points.get_feature_index_file(
+        paths.zarr_dir,
+        event.nwm_version,
+        output_type
+    )
+    if not index_file.exists():
+        n_reaches = len(event.nwm_id_list)
+        return 1 - (1 - 1 / DEFAULT_N_CHUNKS)**n_reaches
+
+    cache_key = (str(index_file), index_file.stat().st_mtime)
+    if cache_key not in FEATURE_INDEX_CACHE:
+        FEATURE_INDEX_CACHE.clear()
+        FEATURE_INDEX_CACHE[cache_key] = pd.read_parquet(
+            index_file,
+            columns=['feature_id','chunk']
+        )
+    feature_index = FEATURE_INDEX_CACHE[cache_key]
+    n_chunks = feature_index['chunk'].max() + 1
+    chunks = feature_index.loc[
+        feature_index['feature_id'].isin(event.nwm_id_list),
+        'chunk'
+    ]
+
+    return chunks.nunique() / n_chunks
+
+def get_load_plan(
+    data_selector,
+    history_file: Union[str, Path, None] = None,
+) -> pd.DataFrame:
+    '''
+    Estimated load of the data selector choices - one row per source
+    (configuration and subdir, as in the load checkpoint units) with
+    the number of files (requests for USGS), locations, MB fetched,
+    MB of parquet output and wall minutes, and whether the minutes
+    are based on the load history or default rates
+    '''
+    paths = data_selector.paths
+    event = data_selector.event
+    dates = data_selector.dates
+    history = read_history(history_file)
+
+    ref_days = (dates.ref_time_end - dates.ref_time_start).days + 1
+    value_days = (dates.data_value_time_end \
+                  - dates.data_value_time_start).days + 1
+    rows = []
+
+    def add_row(variable, configuration, subdir, n_files, n_locations,
+                fetch_mb, n_values, default_seconds):
+        seconds_per_file, basis = get_seconds_per_file(
+            history,
+            configuration,
+            subdir,
+            default_seconds
+        )
+        rows.append(dict(
+            variable=variable,
+            configuration=configuration,
+            subdir=subdir,
+            n_files=n_files,
+            n_locations=n_locations,
+            fetch_mb=round(fetch_mb, 1),
+            output_mb=round(n_values * OUTPUT_BYTES_PER_VALUE / 1e6, 1),
+            minutes=round(n_files * seconds_per_file / 60, 1),
+            basis=basis,
+        ))
+
+    if 'streamflow' in data_selector.variable:
+        subdir = 'all' if data_selector.reach_set == 'all reaches' \
+            else 'gages'
+        n_reaches = len(event.nwm_id_list)
+
+        configurations = []
+        if data_selector.forecast_config != 'none':
+            output_type = 'channel_rt_1' \
+                if data_selector.forecast_config == 'medium_range_mem1' \
+                else 'channel_rt'
+            configurations.append(
+                (data_selector.forecast_config, output_type, ref_days, None)
+            )
+        for ana in [
+            'analysis_assim_extend',
+            'analysis_assim',
+            'analysis_assim_extend_no_da*',
+            'analysis_assim_no_da*'
+        ]:
+            if ana in data_selector.verify_config:
+                tm_range = list(range(0,28)) if 'extend' in ana \
+                    else list(range(0,2))
+                configurations.append(
+                    (ana.rstrip('*'), 'channel_rt', value_days, tm_range)
+                )
+
+        for configuration, output_type, n_days, tm_range in configurations:
+            n_files = get_file_count(configuration, n_days, tm_range)
+            fraction = 1.0
+            if subdir == 'gages':
+                fraction = get_chunk_fraction(paths, event, output_type)
+            add_row(
+                'streamflow',
+                configuration,
+                subdir,
+                n_files,
+                n_reaches,
+                n_files * FILE_MB['channel_rt'] * fraction,
+                n_files * n_reaches,
+                DEFAULT_SECONDS_PER_FILE[subdir],
+            )
+
+        if 'USGS*' in data_selector.verify_config \
+            and len(event.usgs_id_list) > 0:
+            n_sites = len(event.usgs_id_list)
+            plan = usgs.get_request_plan(n_sites, value_days)
+            n_hours = (dates.data_value_time_end \
+                       - dates.data_value_time_start) / dt.timedelta(hours=1)
+            add_row(
+                'streamflow',
+                'usgs',
+                'gages',
+                plan['n_requests'],
+                n_sites,
+                n_sites * value_days * USGS_MB_PER_SITE_DAY,
+                n_sites * (n_hours + 1),
+                plan['seconds'] / plan['n_requests'],
+            )
+
+    if 'mean areal precipitation' in data_selector.variable \
+        and len(data_selector.map_polygons) > 0:
+        polygon_counts = dict(
+            huc10=len(event.huc10_list),
+            usgs_basins=len(event.usgs_id_list),
+        )
+        subdirs = [
+            'huc10' if p == 'HUC10' else 'usgs_basins'
+            for p in data_selector.map_polygons
+        ]
+        n_polygons = sum(polygon_counts[s] for s in subdirs)
+        # all polygon sets are computed from one read of each grid
+        fraction = min(
+            1.0,
+            WINDOW_FACTOR * max(polygon_counts[s] for s in subdirs) \
+                / N_HUC10_CONUS
+        )
+        configurations = []
+        if data_selector.forecast_config != 'none':
+            configuration = 'forcing_' + data_selector.forecast_config
+            if configuration == 'forcing_medium_range_mem1':
+                configuration = 'forcing_medium_range'
+            configurations.append((configuration, ref_days, None))
+        for ana, tm_range in [
+            ('analysis_assim_extend', list(range(4,28))),
+            ('analysis_assim', [2]),
+        ]:
+            if ana in data_selector.verify_config:
+                configurations.append(('forcing_' + ana, value_days, tm_range))
+
+        for configuration, n_days, tm_range in configurations:
+            n_files = get_file_count(configuration, n_days, tm_range)
+            add_row(
+                'mean areal precipitation',
+                configuration,
+                '+'.join(subdirs),
+                n_files,
+                n_polygons,
+                n_files * FILE_MB['forcing'] * fraction,
+                n_files * n_polygons,
+                DEFAULT_SECONDS_PER_FILE['maps'],
+            )
+
+    return pd.DataFrame(rows, columns=[
+        'variable','configuration','subdir','n_files','n_locations',
+        'fetch_mb','output_mb','minutes','basis'
+    ])
+
+def get_plan_summary(plan: pd.DataFrame) -> str:
+    '''
+    Markdown summary of a load plan (totals and a warning
+    for long loads)
+    '''
+    if len(plan) == 0:
+        return '#### Load estimate: nothing selected to load'
+
+    minutes = plan['minutes'].sum()
+    duration = f"{minutes:.0f} minutes" if minutes < 120 \
+        else f"{minutes / 60:.1f} hours"
+    text = f"#### Load estimate: {plan['n_files'].sum():,} files/requests, "\
+           f"{plan['fetch_mb'].sum() / 1000:.2f} GB fetched, "\
+           f"{plan['output_mb'].sum() / 1000:.2f} GB of parquet, "\
+           f"~{duration}"
+    if (plan['basis'] == 'default').any():
+        text += ' (default rates for configurations not loaded before)'
+    if minutes > LONG_LOAD_MINUTES:
+        text += f"\n\n**!! Long load - over {LONG_LOAD_MINUTES} minutes. "\
+                f"Check the reach set, configurations and dates.**"
+
+    return text
@@ -0,0 +1,341 @@
+'''
+point (reach) extraction from NWM channel_rt files - a feature index per
+NWM version maps each feature_id to its position, storage chunk and
+offset in the chunk (the route link ordering of the files), so only the
+chunks holding the requested reaches are fetched, with adjacent chunks
+coalesced into bulk range requests
+'''
+import zlib
+import dask
+import fsspec
+import h5py
+import numpy as np
+import pandas as pd
+
+from pathlib import Path
+from typing import List, Union
+
+from ..utils import nwm
+from . import progress
+from . import references
+from . import zonal
+
+# NWM unit names as TEEHR writes them (tlp.nwm_to_parquet), other
+# units are kept
+UNIT_LOOKUP = {
+    'm3 s-1': 'm3/s',
+}
+
+
+def get_measurement_unit(attrs: dict) -> str:
+    '''
+    TEEHR measurement unit of a variable from its units attribute
+    '''
+    units = zonal.decode_attribute(attrs['units'])
+    return UNIT_LOOKUP.get(units, units)
+
+def get_feature_index_file(
+    zarr_dir: Union[str, Path],
+    nwm_version: str,
+    output_type: str = 'channel_rt',
+) -> Path:
+    '''
+    Feature index location, shared by all events (next to the
+    TEEHR reference files)
+    '''
+    return Path(zarr_dir, 'feature_index', f"{nwm_version}_{output_type}.parquet")
+
+def build_feature_index(
+    url: str,
+    variable_name: str = 'streamflow',
+) -> pd.DataFrame:
+    '''
+    Feature index from one file - position, chunk and offset in the
+    chunk of each feature_id
+    '''
+    with fsspec.open(url, 'rb', block_size=zonal.READ_BLOCK_SIZE) as f:
+        with h5py.File(f, 'r') as ds:
+            feature_ids = ds['feature_id'][:]
+            chunks = ds[variable_name].chunks
+
+    n_features = len(feature_ids)
+    chunk_size = chunks[0] if chunks else n_features
+    position = np.arange(n_features)
+
+    return pd.DataFrame(dict(
+        feature_id=feature_ids.astype('int64'),
+        position=position,
+        chunk=position // chunk_size,
+        chunk_offset=position % chunk_size,
+        chunk_size=chunk_size,
+        n_features=n_features,
+    ))
+
+def get_feature_index(
+    index_file: Union[str, Path],
+    urls: List[str],
+    variable_name: str = 'streamflow',
+) -> pd.DataFrame:
+    '''
+    Read the feature index, or build it from the first existing
+    file in urls and save it
+    '''
+    index_file = Path(index_file)
+    if index_file.exists():
+        return pd.read_parquet(index_file)
+
+    for url in urls:
+        try:
+            feature_index = build_feature_index(url, variable_name)
+        except FileNotFoundError:
+            continue
+        index_file.parent.mkdir(parents=True, exist_ok=True)
+        temp_file = index_file.with_suffix('.tmp')
+        feature_index.to_parquet(temp_file, index=False)
+        temp_file.replace(index_file)
+        return feature_index
+
+    raise FileNotFoundError(f"No files found to build the feature index "\
+                            f"{index_file.name} (first url {urls[0]})")
+
+def decode_chunk(
+    raw: bytes,
+    var: dict,
+) -> np.ndarray:
+    '''
+    Values of one stored chunk - undoes the fletcher32, deflate and
+    shuffle filters (the filters used in NetCDF4 files)
+    '''
+    if var['fletcher32']:
+        raw = raw[:-4]
+    if var['compression'] == 'gzip':
+        raw = zlib.decompress(raw)
+    itemsize = var['dtype'].itemsize
+    if var['shuffle'] and itemsize > 1:
+        raw = np.frombuffer(raw, 'uint8').reshape(itemsize, -1).T.tobytes()
+
+    return np.frombuffer(raw, dtype=var['dtype'])
+
+def check_feature_index(
+    url: str,
+    n_features: int,
+    feature_index: pd.DataFrame,
+):
+    if n_features != feature_index['n_features'].iat[0]:
+        raise ValueError(f"{url} has {n_features} features, the feature "\
+                         f"index {feature_index['n_features'].iat[0]} - "\
+                         f"remove the index file to rebuild it")
+
+def read_channel_rt_points(
+    url: str,
+    feature_index: pd.DataFrame,
+    variable_name: str = 'streamflow',
+    max_gap: int = references.COALESCE_GAP_BYTES,
+    catalog: Union[references.ReferenceCatalog, None] = None,
+) -> Union[dict, None]:
+    '''
+    Values of the indexed features (feature_index rows, sorted by
+    position) from one file - only the chunks holding them are read,
+    with coalesced range requests. None if the file does not exist.
+    With a reference catalog, the chunk locations come from the 
+    (shared) file references instead of the file headers.
+    '''
+    positions = feature_index['position'].to_numpy()
+    if catalog is not None:
+        refs, reference_status = catalog.get_or_build(url)
+        if refs is None:
+            return None
+        metadata = references.get_variable_metadata(refs, variable_name)
+        check_feature_index(url, metadata['shape'][0], feature_index)
+        values = references.read_reference_points(
+            url, 
+            refs, 
+            variable_name, 
+            positions
+        )
+        attrs = metadata['attrs']
+        return dict(
+            values=zonal.apply_cf_encoding(values, attrs),
+            measurement_unit=get_measurement_unit(attrs),
+            value_time=zonal.decode_time(
+                *references.read_reference_value(url, refs, 'time')
+            ),
+            reference_time=zonal.decode_time(
+                *references.read_reference_value(url, refs, 'reference_time')
+            ),
+            reference_status=reference_status,
+        )
+
+    fs, path = fsspec.core.url_to_fs(url)
+    try:
+        f = fs.open(path, 'rb', block_size=zonal.READ_BLOCK_SIZE)
+    except FileNotFoundError:
+        return None
+
+    with f, h5py.File(f, 'r') as ds:
+        var = ds[variable_name]
+        attrs = dict(var.attrs)
+        value_time = zonal.decode_time(
+            ds['time'][0], 
+            ds['time'].attrs
+        )
+        reference_time = zonal.decode_time(
+            ds['reference_time'][0], 
+            ds['reference_time'].attrs
+        )
+        var_info = dict(
+            dtype=var.dtype,
+            compression=var.compression,
+            shuffle=var.shuffle,
+            fletcher32=var.fletcher32,
+        )
+        check_feature_index(url, len(var), feature_index)
+        chunk_size = var.chunks[0] if var.chunks else None
+        if chunk_size is None or var_info['compression'] not in [None, 'gzip']:
+            # contiguous or unsupported layout - let HDF5 read
+            values = var[positions]
+            chunk_ranges = None
+        else:
+            chunks = feature_index['chunk'].to_numpy()
+            chunk_offsets = feature_index['chunk_offset'].to_numpy()
+            if chunk_size != feature_index['chunk_size'].iat[0]:
+                chunks, chunk_offsets = np.divmod(positions, chunk_size)
+            chunk_ranges = {}
+            for chunk in np.unique(chunks):
+                info = var.id.get_chunk_info_by_coord((int(chunk) * chunk_size,))
+                chunk_ranges[chunk] = (info.byte_offset, info.size)
+
+    if chunk_ranges is not None:
+        # bulk range requests, then split into chunks
+        merged = references.coalesce_ranges(
+            [(o, o + n) for o, n in chunk_ranges.values() if o is not None],
+            max_gap
+        )
+        blocks = fs.cat_ranges(
+            [path] * len(merged),
+            [start for start, end in merged],
+            [end for start, end in merged],
+        )
+        fill_value = attrs.get('_FillValue', 0)
+        values = np.empty(len(positions), dtype=var_info['dtype'])
+        for chunk, (offset, size) in chunk_ranges.items():
+            in_chunk = chunks == chunk
+            if offset is None:
+                # never written
+                values[in_chunk] = fill_value
+                continue
+            i = next(i for i, (start, end) in enumerate(merged)
+                     if start <= offset < end)
+            start = offset - merged[i][0]
+            chunk_values = decode_chunk(
+                blocks[i][start:start + size],
+                var_info
+            )
+            values[in_chunk] = chunk_values[chunk_offsets[in_chunk]]
+
+    return dict(
+        values=zonal.apply_cf_encoding(values, attrs),
+        measurement_unit=get_measurement_unit(attrs),
+        value_time=value_time,
+        reference_time=reference_time,
+    )
+
+def nwm_points_to_parquet(
+    configuration: str,
+    output_type: str,
+    start_date: Union[str, pd.Timestamp],
+    n_days: int,
+    feature_ids: List[int],
+    output_dir: Union[str, Path],
+    nwm_version: str,
+    index_file: Union[str, Path],
+    t_minus_hours: Union[List[int], None] = None,
+    variable_name: str = 'streamflow',
+    base_url: str = nwm.NWM_BUCKET_URL,
+    catalog: Union[references.ReferenceCatalog, None] = None,
+    overwrite_output: bool = False,
+) -> int:
+    '''
+    Time series of the feature_ids from the NWM point files, in the
+    TEEHR timeseries schema, one parquet file per reference time (as
+    tlp.nwm_to_parquet writes). Bytes read scale with the number of
+    chunks holding the requested reaches rather than all reaches.
+    The file references are taken from (and added to) the catalog 
+    if given. Missing files are skipped. Returns the number of files 
+    read.
+    '''
+    urls = nwm.get_nwm_file_list(
+        configuration,
+        output_type,
+        start_date,
+        n_days,
+        t_minus_hours=t_minus_hours,
+        base_url=base_url,
+    )
+    feature_index = get_feature_index(index_file, urls, variable_name)
+    feature_index = feature_index[
+        feature_index['feature_id'].isin(feature_ids)
+    ].sort_values('position').reset_index(drop=True)
+    n_missing = len(set(feature_ids)) - len(feature_index)
+    if n_missing > 0:
+        print(f"   {n_missing} feature ids not in {nwm_version} {output_type} files")
+    location_ids = nwm_version + '-' + feature_index['feature_id'].astype(str)
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    feature_index_delayed = dask.delayed(feature_index, pure=True)
+
+    n_read = 0
+    for day_groups in zonal.get_daily_reference_time_groups(urls).values():
+        pending = {}
+        for file_name, group_urls in day_groups.items():
+            output_file = Path(output_dir, f"{file_name}.parquet")
+            if output_file.exists() and not overwrite_output:
+                progress.report(n_files=len(group_urls))
+                continue
+            pending[file_name] = (group_urls, output_file)
+
+        # read all files of the day at once, then write by reference time
+        tasks = [
+            dask.delayed(read_channel_rt_points)(
+                url,
+                feature_index_delayed,
+                variable_name,
+                catalog=catalog
+            )
+            for group_urls, _ in pending.values()
+            for url in group_urls
+        ]
+        day_results = dask.compute(*tasks)
+        if catalog is not None:
+            catalog.record([
+                r['reference_status'] for r in day_results if r is not None
+            ])
+        day_results = iter(day_results)
+
+        for file_name, (group_urls, output_file) in pending.items():
+            results = [next(day_results) for url in group_urls]
+            results = [r for r in results if r is not None]
+            n_read += len(results)
+            if len(results) == 0:
+                progress.report(n_files=len(group_urls))
+                continue
+
+            df = pd.concat([
+                pd.DataFrame(dict(
+                    location_id=location_ids,
+                    value=r['values'],
+                    value_time=r['value_time'],
+                    reference_time=r['reference_time'],
+                    configuration=configuration,
+                    variable_name=variable_name,
+                    measurement_unit=r['measurement_unit'],
+                ))
+                for r in results
+            ], ignore_index=True)
+            df.sort_values(['location_id','value_time']).to_parquet(
+                output_file,
+                index=False
+            )
+            progress.report(n_files=len(group_urls), rows=len(df))
+
+    return n_read
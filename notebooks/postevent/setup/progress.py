@@ -0,0 +1,351 @@
+'''
+live load progress - the loaders report files and rows written and the
+checkpoint reports unit states to the active LoadProgress, which keeps
+per-configuration counters (files done/total, rows, failed units), the
+network throughput (MB/s) and ETA, the dask cluster state, shows them in
+a Panel widget and appends every update to a JSON lines log, so stalled
+or throttled loads and the effect of worker counts can be followed. A
+timer thread logs and refreshes the state every TICK_SECONDS while a
+configuration runs, also when no reports arrive (stalled loads)
+'''
+import json
+import threading
+import time
+import datetime as dt
+import pandas as pd
+import panel as pn
+import psutil
+import pyarrow.parquet as pq
+
+from pathlib import Path
+from typing import Union
+
+# minimum seconds between widget refreshes from file reports
+REFRESH_SECONDS = 1
+# running configurations without updates for longer are flagged
+STALL_SECONDS = 300
+# seconds between timer updates (log and widget) while loads run
+TICK_SECONDS = 60
+
+# progress that loaders report to (set while a load runs)
+ACTIVE_PROGRESS = None
+
+
+def set_active(load_progress):
+
+    global ACTIVE_PROGRESS
+    ACTIVE_PROGRESS = load_progress
+
+def report(
+    n_files: int = 0,
+    rows: int = 0,
+):
+    '''
+    Report files read (or requests made) and rows written by a loader
+    to the active progress, if any - thread safe
+    '''
+    if ACTIVE_PROGRESS is not None:
+        ACTIVE_PROGRESS.report(n_files, rows)
+
+def count_new_rows(
+    output_dir: Union[str, Path],
+    since: float,
+) -> int:
+    '''
+    Rows of the parquet files in output_dir written after since
+    (epoch seconds), from the file metadata
+    '''
+    rows = 0
+    for filepath in Path(output_dir).glob('*.parquet'):
+        try:
+            if filepath.stat().st_mtime >= since:
+                rows += pq.read_metadata(filepath).num_rows
+        except (FileNotFoundError, OSError):
+            continue
+
+    return rows
+
+def get_network_bytes() -> int:
+    '''
+    Bytes received by this host (the loaders and a local dask cluster)
+    '''
+    return psutil.net_io_counters().bytes_recv
+
+
+class LoadProgress:
+    '''
+    Progress of the load units of an event, by configuration
+    (configuration/subdir, as in the load checkpoint)
+    '''
+    def __init__(
+        self,
+        log_file: Union[str, Path, None] = None,
+        client = None,
+    ):
+        self.log_file = None if log_file is None else Path(log_file)
+        self.client = client
+        self.sources = {}
+        self.active = None
+        self.lock = threading.Lock()
+        self.refresh_lock = threading.Lock()
+        self.last_refresh = 0
+        self.timer = None
+        self.timer_stop = threading.Event()
+        self.summary_pane = None
+        self.table_pane = None
+
+    def start_source(
+        self,
+        source: str,
+        n_units: int,
+        n_pending: int,
+        files_per_unit: int,
+    ):
+        '''
+        Start a configuration - n_units in total, of which n_pending
+        are loaded (the others are complete from a previous run)
+        '''
+        with self.lock:
+            self.sources[source] = dict(
+                state='running',
+                units_total=n_units,
+                units_done=n_units - n_pending,
+                units_failed=0,
+                files_per_unit=files_per_unit,
+                files_total=n_units * files_per_unit,
+                files_done=(n_units - n_pending) * files_per_unit,
+                files_in_unit=0,
+                rows=0,
+                started=time.time(),
+                updated=time.time(),
+                network_bytes=get_network_bytes(),
+                files_start=(n_units - n_pending) * files_per_unit,
+            )
+            self.active = source
+        self.write_log('start', source)
+        self.refresh(force=True)
+        self.start_timer()
+
+    def report(
+        self,
+        n_files: int = 0,
+        rows: int = 0,
+    ):
+        with self.lock:
+            if self.active is None:
+                return
+            info = self.sources[self.active]
+            info['files_in_unit'] += n_files
+            info['files_done'] = min(
+                info['files_total'],
+                info['units_done'] * info['files_per_unit'] \
+                    + info['files_in_unit']
+            )
+            info['rows'] += rows
+            info['updated'] = time.time()
+        self.refresh()
+
+    def update_unit(
+        self,
+        source: str,
+        key: str,
+        state: str,
+        **info,
+    ):
+        '''
+        Unit state change (checkpoint.run_units callback)
+        '''
+        with self.lock:
+            counters = self.sources[source]
+            # files of failed units are not done
+            if state == 'complete':
+                counters['units_done'] += 1
+            elif state == 'failed':
+                counters['units_failed'] += 1
+            counters['files_in_unit'] = 0
+            counters['files_done'] = min(
+                counters['files_total'],
+                counters['units_done'] * counters['files_per_unit']
+            )
+            counters['updated'] = time.time()
+        self.write_log(state, source, unit=key, **info)
+        self.refresh(force=True)
+
+    def end_source(self, source: str):
+
+        self.stop_timer()
+        with self.lock:
+            info = self.sources[source]
+            info['state'] = 'failed units' if info['units_failed'] > 0 \
+                else 'complete'
+            info['updated'] = time.time()
+            self.active = None
+        self.write_log('end', source)
+        self.refresh(force=True)
+
+    def start_timer(self):
+
+        if self.timer is not None and self.timer.is_alive():
+            return
+        self.timer_stop.clear()
+        self.timer = threading.Thread(target=self.tick, daemon=True)
+        self.timer.start()
+
+    def stop_timer(self):
+
+        self.timer_stop.set()
+        if self.timer is not None:
+            self.timer.join()
+        self.timer = None
+
+    def tick(self):
+        '''
+        Timer thread - logs and refreshes the state of the running
+        configuration every TICK_SECONDS, independently of reports
+        '''
+        while not self.timer_stop.wait(TICK_SECONDS):
+            source = self.active
+            if source is None:
+                continue
+            self.write_log('tick', source)
+            self.refresh(force=True)
+
+    def get_metrics(self, source: str) -> dict:
+        '''
+        Counters of a configuration with throughput and ETA
+        '''
+        info = self.sources[source]
+        end = time.time() if info['state'] == 'running' else info['updated']
+        seconds = max(end - info['started'], 1e-6)
+        files_loaded = info['files_done'] - info['files_start']
+        files_left = info['files_total'] - info['files_done'] \
+            - info['units_failed'] * info['files_per_unit']
+        eta_minutes = None
+        if info['state'] == 'running' and files_loaded > 0:
+            eta_minutes = round(seconds / files_loaded * files_left / 60, 1)
+        mb_per_second = None
+        if info['state'] == 'running':
+            mb_per_second = round(
+                (get_network_bytes() - info['network_bytes']) / 1e6 / seconds,
+                2
+            )
+            info['mb_per_second'] = mb_per_second
+        else:
+            mb_per_second = info.get('mb_per_second')
+        state = info['state']
+        if state == 'running' and time.time() - info['updated'] > STALL_SECONDS:
+            state = 'stalled?'
+
+        return dict(
+            configuration=source,
+            state=state,
+            files_done=info['files_done'],
+            files_total=info['files_total'],
+            rows=info['rows'],
+            mb_per_second=mb_per_second,
+            files_per_minute=round(files_loaded / seconds * 60, 1),
+            eta_minutes=eta_minutes,
+            units_failed=info['units_failed'],
+            minutes=round(seconds / 60, 1),
+        )
+
+    def get_table(self) -> pd.DataFrame:
+
+        with self.lock:
+            rows = [self.get_metrics(source) for source in self.sources]
+        return pd.DataFrame(rows, columns=[
+            'configuration','state','files_done','files_total','rows',
+            'mb_per_second','files_per_minute','eta_minutes',
+            'units_failed','minutes'
+        ])
+
+    def get_cluster_info(self) -> dict:
+        '''
+        Workers, threads and tasks in progress of the dask cluster
+        '''
+        if self.client is None:
+            return {}
+        try:
+            return dict(
+                n_workers=len(self.client.scheduler_info()['workers']),
+                n_threads=sum(self.client.nthreads().values()),
+                n_processing=sum(
+                    len(tasks) for tasks in self.client.processing().values()
+                ),
+            )
+        except Exception:
+            # cluster closed or restarting
+            return {}
+
+    def write_log(
+        self,
+        event: str,
+        source: str,
+        **info,
+    ):
+        if self.log_file is None:
+            return
+        with self.lock:
+            metrics = self.get_metrics(source)
+        record = dict(
+            time=dt.datetime.now().isoformat(timespec='seconds'),
+            event=event,
+            **metrics,
+            **self.get_cluster_info(),
+            **info,
+        )
+        self.log_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.log_file, 'a') as f:
+            f.write(json.dumps(record, default=str) + '\n')
+
+    def get_summary(self) -> str:
+
+        table = self.get_table()
+        cluster = self.get_cluster_info()
+        text = '#### Load progress: '
+        if len(table) == 0:
+            text += 'nothing loaded yet'
+        else:
+            text += f"{table['files_done'].sum():,} of "\
+                    f"{table['files_total'].sum():,} files/requests, "\
+                    f"{table['rows'].sum():,} rows, "\
+                    f"{table['units_failed'].sum()} failed units"
+        if cluster:
+            text += f" - {cluster['n_workers']} workers, "\
+                    f"{cluster['n_threads']} threads, "\
+                    f"{cluster['n_processing']} tasks running"
+
+        return text
+
+    def refresh(self, force: bool = False):
+        '''
+        Update the widget (if shown) - from the main thread or the
+        timer thread only (not from loader threads), at most every 
+        REFRESH_SECONDS unless forced
+        '''
+        if self.table_pane is None \
+            or threading.current_thread() not in (
+                threading.main_thread(), 
+                self.timer
+            ):
+            return
+        with self.refresh_lock:
+            if not force and time.time() - self.last_refresh < REFRESH_SECONDS:
+                return
+            self.last_refresh = time.time()
+            self.summary_pane.object = self.get_summary()
+            self.table_pane.object = self.get_table()
+
+    def view(self) -> pn.layout:
+        '''
+        Panel widget, updated while loads run
+        '''
+        self.summary_pane = pn.pane.Markdown('')
+        self.table_pane = pn.pane.DataFrame(
+            None,
+            index=False,
+            sizing_mode='stretch_width',
+        )
+        self.refresh(force=True)
+
+        return pn.Column(self.summary_pane, self.table_pane)
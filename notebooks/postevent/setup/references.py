@@ -0,0 +1,416 @@
+'''
+shared kerchunk reference catalog - the references (byte ranges of every
+chunk, array metadata and attributes) of each NWM file are generated
+once and kept in a catalog shared by all events, keyed by the identity
+of the source file (bucket path and size, independent of the mirror it
+was read from). Writes are atomic, the catalog is capped in size and the
+least recently used references are evicted. Readers use the references
+to fetch only the chunks they need, without scanning the file headers.
+'''
+import base64
+import hashlib
+import itertools
+import json
+import os
+import re
+import uuid
+import fsspec
+import numcodecs
+import numpy as np
+
+from pathlib import Path
+from typing import Dict, List, Tuple, Union
+
+# default catalog size cap
+CATALOG_MAX_BYTES = 5 * 2**30
+# references written between checks of the catalog size
+EVICT_INTERVAL = 100
+# bytes per range request when scanning file headers
+HEADER_BLOCK_SIZE = 2**18
+# chunks separated by fewer bytes are fetched in one range request
+COALESCE_GAP_BYTES = 2**20
+# the identity of NWM files starts at the date directory
+SOURCE_PATH_PATTERN = re.compile(r"nwm\.\d{8}/.+$")
+
+
+def get_source_path(url: str) -> str:
+    '''
+    Bucket path of an NWM file, the same for all mirrors (gcs, https,
+    local copies), the url without protocol for other files
+    '''
+    match = SOURCE_PATH_PATTERN.search(url)
+    if match is not None:
+        return match.group(0)
+    return url.split('://')[-1]
+
+def coalesce_ranges(
+    ranges: List[Tuple[int, int]],
+    max_gap: int = COALESCE_GAP_BYTES,
+) -> List[Tuple[int, int]]:
+    '''
+    Merge (start, end) byte ranges that overlap or are separated
+    by no more than max_gap bytes
+    '''
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start - merged[-1][1] <= max_gap:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+
+    return merged
+
+def build_references(url: str) -> dict:
+    '''
+    Kerchunk references of one NetCDF4/HDF5 file - raises
+    FileNotFoundError if the file does not exist
+    '''
+    from kerchunk.hdf import SingleHdf5ToZarr
+
+    with fsspec.open(url, 'rb', block_size=HEADER_BLOCK_SIZE) as f:
+        return SingleHdf5ToZarr(f, url, inline_threshold=300).translate()
+
+
+class ReferenceCatalog:
+    '''
+    Content-addressed catalog of kerchunk references (JSON files
+    under catalog_dir), max_bytes caps the total size
+    '''
+    def __init__(
+        self,
+        catalog_dir: Union[str, Path],
+        max_bytes: int = CATALOG_MAX_BYTES,
+    ):
+        self.catalog_dir = Path(catalog_dir)
+        self.max_bytes = max_bytes
+        self.n_written = 0
+        self.stats = dict(hits=0, misses=0, evicted=0)
+
+    def get_key(
+        self,
+        url: str,
+        size: Union[int, None],
+    ) -> str:
+
+        identity = f"{get_source_path(url)}:{size}"
+        return hashlib.sha1(identity.encode()).hexdigest()
+
+    def get_filepath(self, key: str) -> Path:
+
+        return Path(self.catalog_dir, key[:2], f"{key}.json")
+
+    def get_file_size(self, url: str) -> Union[int, None]:
+        '''
+        Source file size (raises FileNotFoundError if missing)
+        '''
+        fs, path = fsspec.core.url_to_fs(url)
+        return fs.info(path).get('size')
+
+    def get(
+        self,
+        url: str,
+        size: Union[int, None] = None,
+    ) -> Union[dict, None]:
+        '''
+        Stored references of the file, None if not in the catalog
+        '''
+        if size is None:
+            size = self.get_file_size(url)
+        filepath = self.get_filepath(self.get_key(url, size))
+        try:
+            with open(filepath) as f:
+                references = json.load(f)
+            # last use, for eviction
+            os.utime(filepath)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        return references
+
+    def put(
+        self,
+        url: str,
+        references: dict,
+        size: Union[int, None] = None,
+    ) -> Path:
+        '''
+        Store references (written to a temporary file then renamed,
+        so readers never see partial files)
+        '''
+        if size is None:
+            size = self.get_file_size(url)
+        filepath = self.get_filepath(self.get_key(url, size))
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+        temp_filepath = filepath.with_suffix(f".{uuid.uuid4().hex}.tmp")
+        with open(temp_filepath, 'w') as f:
+            json.dump(references, f, separators=(',',':'))
+        os.replace(temp_filepath, filepath)
+
+        return filepath
+
+    def get_or_build(
+        self,
+        url: str,
+    ) -> Tuple[Union[dict, None], Union[str, None]]:
+        '''
+        References from the catalog, generated and stored if missing,
+        None if the source file does not exist - with the lookup status
+        ('hit', 'miss' or None). Nothing is counted or evicted here, so
+        it can run in dask tasks (on copies of the catalog), the driver
+        passes the statuses to record().
+        '''
+        try:
+            size = self.get_file_size(url)
+        except FileNotFoundError:
+            return None, None
+
+        references = self.get(url, size)
+        if references is not None:
+            return references, 'hit'
+
+        try:
+            references = build_references(url)
+        except FileNotFoundError:
+            return None, None
+        self.put(url, references, size)
+
+        return references, 'miss'
+
+    def record(self, statuses: List[Union[str, None]]) -> int:
+        '''
+        Count the lookup statuses of get_or_build calls (in the driver)
+        and check the catalog size every EVICT_INTERVAL references
+        written (and at the first), returns the number evicted
+        '''
+        n_hits = statuses.count('hit')
+        n_misses = statuses.count('miss')
+        self.stats['hits'] += n_hits
+        self.stats['misses'] += n_misses
+        n_written = self.n_written + n_misses
+        check = n_misses > 0 and (
+            self.n_written == 0 
+            or n_written // EVICT_INTERVAL > self.n_written // EVICT_INTERVAL
+        )
+        self.n_written = n_written
+        if check:
+            return self.evict()
+
+        return 0
+
+    def get_entries(self) -> List[Tuple[float, int, Path]]:
+
+        entries = []
+        for filepath in self.catalog_dir.glob('*/*.json'):
+            try:
+                stat = filepath.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, filepath))
+
+        return entries
+
+    def evict(self) -> int:
+        '''
+        Remove the least recently used references until the catalog
+        is under 90% of max_bytes, returns the number removed
+        '''
+        entries = self.get_entries()
+        total_bytes = sum(size for _, size, _ in entries)
+        if total_bytes <= self.max_bytes:
+            return 0
+
+        n_removed = 0
+        for _, size, filepath in sorted(entries):
+            if total_bytes <= 0.9 * self.max_bytes:
+                break
+            filepath.unlink(missing_ok=True)
+            total_bytes -= size
+            n_removed += 1
+        self.stats['evicted'] += n_removed
+
+        return n_removed
+
+    def summary(self) -> dict:
+
+        entries = self.get_entries()
+        return dict(
+            n_files=len(entries),
+            n_bytes=sum(size for _, size, _ in entries),
+            max_bytes=self.max_bytes,
+            **self.stats,
+        )
+
+
+def get_variable_metadata(
+    references: dict,
+    variable_name: str,
+) -> dict:
+    '''
+    Zarr array metadata and attributes of a variable (the fill value
+    is added to the attributes as _FillValue, as in the NetCDF file)
+    '''
+    refs = references.get('refs', references)
+    metadata = refs[f"{variable_name}/.zarray"]
+    attrs = refs.get(f"{variable_name}/.zattrs", {})
+    # JSON strings as written by kerchunk
+    if isinstance(metadata, str):
+        metadata = json.loads(metadata)
+    if isinstance(attrs, str):
+        attrs = json.loads(attrs)
+    metadata = dict(metadata)
+    attrs = dict(attrs)
+    if metadata['fill_value'] is not None and '_FillValue' not in attrs:
+        attrs['_FillValue'] = metadata['fill_value']
+    metadata['attrs'] = attrs
+
+    return metadata
+
+def decode_reference_chunk(
+    raw: bytes,
+    metadata: dict,
+) -> np.ndarray:
+    '''
+    Values of one chunk (undoing the compressor and filters)
+    '''
+    if metadata['compressor'] is not None:
+        raw = numcodecs.get_codec(metadata['compressor']).decode(raw)
+    for codec in reversed(metadata['filters'] or []):
+        raw = numcodecs.get_codec(codec).decode(raw)
+    values = np.frombuffer(bytes(raw), dtype=np.dtype(metadata['dtype']))
+
+    return values.reshape(metadata['chunks'], order=metadata['order'])
+
+def read_reference_chunks(
+    url: str,
+    references: dict,
+    variable_name: str,
+    chunk_coords: List[Tuple[int, ...]],
+    max_gap: int = COALESCE_GAP_BYTES,
+) -> Dict[Tuple[int, ...], np.ndarray]:
+    '''
+    Decoded chunks of a variable by chunk coordinates, read from url
+    (the referenced file or a mirror of it) with range requests -
+    chunks less than max_gap bytes apart are fetched together.
+    Chunks never written are filled with the fill value.
+    '''
+    refs = references.get('refs', references)
+    metadata = get_variable_metadata(references, variable_name)
+
+    raw_chunks = {}
+    ranges = {}
+    for coords in chunk_coords:
+        key = f"{variable_name}/{'.'.join(str(c) for c in coords)}"
+        ref = refs.get(key)
+        if ref is None:
+            raw_chunks[coords] = None
+        elif isinstance(ref, str):
+            # inlined chunk
+            raw_chunks[coords] = base64.b64decode(ref[7:]) \
+                if ref.startswith('base64:') else ref.encode()
+        else:
+            ranges[coords] = (ref[1], ref[1] + ref[2])
+
+    if ranges:
+        fs, path = fsspec.core.url_to_fs(url)
+        merged = coalesce_ranges(list(ranges.values()), max_gap)
+        blocks = fs.cat_ranges(
+            [path] * len(merged),
+            [start for start, end in merged],
+            [end for start, end in merged],
+        )
+        for coords, (start, end) in ranges.items():
+            i = next(i for i, (block_start, block_end) in enumerate(merged)
+                     if block_start <= start < block_end)
+            offset = start - merged[i][0]
+            raw_chunks[coords] = blocks[i][offset:offset + end - start]
+
+    chunks = {}
+    for coords, raw in raw_chunks.items():
+        if raw is None:
+            fill_value = metadata['fill_value']
+            chunks[coords] = np.full(
+                metadata['chunks'],
+                fill_value if fill_value is not None else 0,
+                dtype=np.dtype(metadata['dtype'])
+            )
+        else:
+            chunks[coords] = decode_reference_chunk(raw, metadata)
+
+    return chunks
+
+def read_reference_window(
+    url: str,
+    references: dict,
+    variable_name: str,
+    window: Tuple[slice, ...],
+) -> np.ndarray:
+    '''
+    Values of a window (one slice with start and stop per dimension)
+    of a variable, reading only the chunks it overlaps
+    '''
+    metadata = get_variable_metadata(references, variable_name)
+    chunk_shape = metadata['chunks']
+    chunk_coords = list(itertools.product(*[
+        range(s.start // c, (s.stop - 1) // c + 1)
+        for s, c in zip(window, chunk_shape)
+    ]))
+    chunks = read_reference_chunks(url, references, variable_name, chunk_coords)
+
+    values = np.empty(
+        [s.stop - s.start for s in window],
+        dtype=np.dtype(metadata['dtype'])
+    )
+    for coords, chunk in chunks.items():
+        source, target = [], []
+        for s, c, i in zip(window, chunk_shape, coords):
+            start = max(s.start, i * c)
+            stop = min(s.stop, (i + 1) * c)
+            source.append(slice(start - i * c, stop - i * c))
+            target.append(slice(start - s.start, stop - s.start))
+        values[tuple(target)] = chunk[tuple(source)]
+
+    return values
+
+def read_reference_points(
+    url: str,
+    references: dict,
+    variable_name: str,
+    positions: np.ndarray,
+) -> np.ndarray:
+    '''
+    Values at positions of a 1-D variable, reading only the chunks
+    holding them
+    '''
+    metadata = get_variable_metadata(references, variable_name)
+    chunk_size = metadata['chunks'][0]
+    chunk_ids, chunk_offsets = np.divmod(positions, chunk_size)
+    chunks = read_reference_chunks(
+        url,
+        references,
+        variable_name,
+        [(int(c),) for c in np.unique(chunk_ids)]
+    )
+
+    values = np.empty(len(positions), dtype=np.dtype(metadata['dtype']))
+    for (chunk_id,), chunk in chunks.items():
+        in_chunk = chunk_ids == chunk_id
+        values[in_chunk] = chunk[chunk_offsets[in_chunk]]
+
+    return values
+
+def read_reference_value(
+    url: str,
+    references: dict,
+    variable_name: str,
+) -> tuple:
+    '''
+    First value and attributes of a variable (e.g. time)
+    '''
+    metadata = get_variable_metadata(references, variable_name)
+    value = read_reference_window(
+        url,
+        references,
+        variable_name,
+        tuple(slice(0, 1) for _ in metadata['shape'])
+    )
+    return value.ravel()[0], metadata['attrs']
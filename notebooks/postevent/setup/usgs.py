@@ -0,0 +1,311 @@
+'''
+USGS streamflow retrieval from the NWIS instantaneous values service -
+a load is planned as location batches x date spans with a cost model
+(request overhead vs. response size, server limits and the number of
+concurrent workers), the requests are issued with a bounded thread pool
+sharing one pooled http session, and the responses are written in the
+TEEHR timeseries schema (as tlu.usgs_to_parquet writes)
+'''
+import hashlib
+import math
+import os
+import uuid
+import requests
+import numpy as np
+import pandas as pd
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Union
+
+from . import checkpoint
+from . import progress
+
+# NWIS instantaneous values service (the base_url of a local stand-in
+# endpoint can be used instead, e.g. USGS_IV_URL in the config file)
+USGS_IV_URL = 'https://waterservices.usgs.gov/nwis/iv/'
+# discharge parameter code
+USGS_PARAMETER_CODE = '00060'
+# ft3/s to m3/s
+CFS_TO_CMS = 0.3048**3
+# cost model - seconds per request (latency, query setup) and per site-day
+# of 15-minute values in a response (transfer and parsing)
+REQUEST_SECONDS = 1.0
+SITE_DAY_SECONDS = 0.02
+# server limits - sites per request (url length) and site-days per
+# request (response size, time-outs of long queries)
+MAX_SITES_PER_REQUEST = 100
+MAX_SITE_DAYS_PER_REQUEST = 1000
+# concurrent requests
+N_WORKERS = 8
+# seconds to wait for a response
+REQUEST_TIMEOUT_SECONDS = 120
+
+
+def get_request_plan(
+    n_sites: int,
+    n_days: int,
+    n_workers: int = N_WORKERS,
+    max_sites_per_request: int = MAX_SITES_PER_REQUEST,
+    max_site_days_per_request: int = MAX_SITE_DAYS_PER_REQUEST,
+    max_days_per_request: Union[int, None] = None,
+) -> dict:
+    '''
+    Sites and days per request with the lowest estimated load time -
+    requests run in waves of n_workers, each wave takes as long as
+    one request (overhead + site-days of values), so few large
+    requests are preferred while they keep the workers busy and stay
+    within the server limits. Ties go to fewer requests.
+    '''
+    if max_days_per_request is None:
+        max_days_per_request = n_days
+
+    best = None
+    for n_batches in range(1, n_sites + 1):
+        sites = math.ceil(n_sites / n_batches)
+        if sites > max_sites_per_request:
+            continue
+        # only balanced batch sizes
+        if n_batches > 1 and math.ceil(n_sites / (n_batches - 1)) == sites:
+            continue
+        for n_spans in range(1, n_days + 1):
+            days = math.ceil(n_days / n_spans)
+            if days > max_days_per_request \
+                or sites * days > max_site_days_per_request:
+                continue
+            n_requests = n_batches * math.ceil(n_days / days)
+            seconds = math.ceil(n_requests / n_workers) \
+                * (REQUEST_SECONDS + sites * days * SITE_DAY_SECONDS)
+            if best is None or (seconds, n_requests) \
+                < (best['seconds'], best['n_requests']):
+                best = dict(
+                    sites_per_request=sites,
+                    days_per_request=days,
+                    n_requests=n_requests,
+                    seconds=seconds,
+                )
+
+    if best is None:
+        raise ValueError(f"No request plan for {n_sites} sites and "\
+                         f"{n_days} days within the request limits")
+    return best
+
+def get_site_key(site_ids: List[str]) -> str:
+    '''
+    Short hash of a site list (order and duplicates ignored)
+    '''
+    key = hashlib.sha1(','.join(sorted(set(site_ids))).encode())
+    return key.hexdigest()[:12]
+
+def get_requests(
+    site_ids: List[str],
+    start: pd.Timestamp,
+    end: pd.Timestamp,
+    plan: dict,
+) -> List[dict]:
+    '''
+    Requests of a plan - site batch, start and end (inclusive) of the
+    value times. Spans start at midnight (the first at start), values
+    at a span end belong to the next span except for the last span.
+    File names are keyed by the span and the sites of the batch.
+    '''
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    span = pd.Timedelta(days=plan['days_per_request'])
+    n_sites = plan['sites_per_request']
+    batches = [
+        site_ids[i:i + n_sites] for i in range(0, len(site_ids), n_sites)
+    ]
+
+    request_list = []
+    span_start = start
+    while span_start <= end:
+        span_end = start.normalize() + span \
+            * ((span_start - start.normalize()) // span + 1)
+        if span_end > end:
+            span_end = end
+        else:
+            span_end = span_end - pd.Timedelta(minutes=1)
+        for i, batch in enumerate(batches):
+            request_list.append(dict(
+                sites=batch,
+                start=span_start,
+                end=span_end,
+                file_name=f"{span_start.strftime('%Y%m%dT%H%M')}_"\
+                          f"{span_end.strftime('%Y%m%dT%H%M')}_"\
+                          f"{get_site_key(batch)}_{i:03d}.parquet",
+            ))
+        span_start = span_end + pd.Timedelta(minutes=1)
+
+    return request_list
+
+def get_session(n_workers: int = N_WORKERS) -> requests.Session:
+    '''
+    Http session with a connection pool for n_workers threads
+    (connections are reused between requests)
+    '''
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=n_workers,
+        pool_maxsize=n_workers
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    return session
+
+def parse_iv_json(content: dict) -> pd.DataFrame:
+    '''
+    Discharge time series of a WaterML JSON response in the TEEHR
+    timeseries schema - m3/s, hourly values (top of the hour, as
+    TEEHR keeps), no data values dropped
+    '''
+    dfs = []
+    for ts in content['value']['timeSeries']:
+        site = ts['sourceInfo']['siteCode'][0]['value']
+        no_data = ts['variable'].get('noDataValue')
+        for values in ts['values']:
+            if len(values['value']) == 0:
+                continue
+            value = np.array(
+                [v['value'] for v in values['value']],
+                dtype=float
+            )
+            value_time = pd.to_datetime(
+                [v['dateTime'] for v in values['value']],
+                utc=True
+            ).tz_localize(None)
+            keep = (value_time.minute == 0) & ~np.isnan(value)
+            if no_data is not None:
+                keep &= value != no_data
+            dfs.append(pd.DataFrame(dict(
+                location_id='usgs-' + site,
+                value=value[keep] * CFS_TO_CMS,
+                value_time=value_time[keep],
+            )))
+
+    if dfs:
+        df = pd.concat(dfs, ignore_index=True)
+    else:
+        df = pd.DataFrame(dict(
+            location_id=pd.Series(dtype=str),
+            value=pd.Series(dtype=float),
+            value_time=pd.Series(dtype='datetime64[ns]'),
+        ))
+    df['reference_time'] = pd.NaT
+    df['configuration'] = 'usgs'
+    df['variable_name'] = 'streamflow'
+    df['measurement_unit'] = 'm3/s'
+
+    return df.drop_duplicates(['location_id','value_time'])
+
+def get_iv(
+    session: requests.Session,
+    sites: List[str],
+    start: pd.Timestamp,
+    end: pd.Timestamp,
+    base_url: str = USGS_IV_URL,
+) -> pd.DataFrame:
+    '''
+    One NWIS IV request - discharge of sites from start to end (UTC)
+    '''
+    response = session.get(
+        base_url,
+        params=dict(
+            format='json',
+            sites=','.join(sites),
+            startDT=start.strftime('%Y-%m-%dT%H:%MZ'),
+            endDT=end.strftime('%Y-%m-%dT%H:%MZ'),
+            parameterCd=USGS_PARAMETER_CODE,
+        ),
+        timeout=REQUEST_TIMEOUT_SECONDS,
+    )
+    # no data for any of the sites
+    if response.status_code == 404:
+        return parse_iv_json(dict(value=dict(timeSeries=[])))
+    response.raise_for_status()
+
+    return parse_iv_json(response.json())
+
+def usgs_to_parquet(
+    site_ids: List[str],
+    start: Union[str, pd.Timestamp],
+    end: Union[str, pd.Timestamp],
+    output_dir: Union[str, Path],
+    base_url: str = USGS_IV_URL,
+    n_workers: int = N_WORKERS,
+    max_days_per_request: Union[int, None] = None,
+    retries: int = 3,
+    backoff_seconds: float = 5,
+    overwrite_output: bool = False,
+) -> int:
+    '''
+    USGS streamflow of site_ids from start to end (inclusive) in the
+    TEEHR timeseries schema, one parquet file per request of the plan
+    (location batch x date span). Requests run concurrently on
+    n_workers threads with a shared session, each retried with backoff.
+    Existing request files are kept unless overwrite_output (then
+    all parquet files in output_dir are replaced), files of other plans
+    (another site list or period) are removed so values are not
+    duplicated. Returns the number of requests made.
+    '''
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    site_ids = sorted(set(site_ids))
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    if len(site_ids) == 0 or end < start:
+        return 0
+
+    n_days = (end.normalize() - start.normalize()).days + 1
+    plan = get_request_plan(
+        len(site_ids),
+        n_days,
+        n_workers=n_workers,
+        max_days_per_request=max_days_per_request,
+    )
+    request_list = get_requests(site_ids, start, end, plan)
+    file_names = set(r['file_name'] for r in request_list)
+    for filepath in output_dir.glob('*.parquet'):
+        if not filepath.is_symlink() \
+            and (overwrite_output or filepath.name not in file_names):
+            filepath.unlink()
+    if not overwrite_output:
+        n_requests = len(request_list)
+        request_list = [
+            r for r in request_list
+            if not Path(output_dir, r['file_name']).exists()
+        ]
+        progress.report(n_files=n_requests - len(request_list))
+    print(f"   {len(request_list)} USGS requests of "\
+          f"{plan['sites_per_request']} sites x "\
+          f"{plan['days_per_request']} days on {n_workers} workers")
+
+    session = get_session(n_workers)
+
+    def load(request):
+        df = checkpoint.run_with_retries(
+            lambda: get_iv(
+                session,
+                request['sites'],
+                request['start'],
+                request['end'],
+                base_url
+            ),
+            retries=retries,
+            backoff_seconds=backoff_seconds,
+            label=f"USGS {request['file_name']}",
+        )
+        filepath = Path(output_dir, request['file_name'])
+        temp_filepath = Path(output_dir, f".{uuid.uuid4().hex}.tmp")
+        df.sort_values(['location_id','value_time']).to_parquet(
+            temp_filepath,
+            index=False
+        )
+        os.replace(temp_filepath, filepath)
+        progress.report(n_files=1, rows=len(df))
+
+    with session, ThreadPoolExecutor(max_workers=n_workers) as executor:
+        # raises the error of the first failed request
+        for _ in executor.map(load, request_list):
+            pass
+
+    return len(request_list)
@@ -0,0 +1,398 @@
+'''
+shared time series warehouse - loaded time series are kept once for all
+events, partitioned by source, configuration, reach set (subdir, as in
+the event parquet directories), date and location bucket:
+
+    WAREHOUSE_DIR/<source>/<configuration>/<subdir>/date=YYYYMMDD/bNN_<id>.parquet
+
+each date directory has a manifest of the locations loaded and the part
+files of each bucket, so a load only fetches the locations missing from
+the warehouse. Events see the warehouse through views - their parquet
+directories hold links to the part files of the buckets they use, so
+the TEEHR queries (and Paths filepaths) are unchanged.
+'''
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+import duckdb
+import numpy as np
+import pandas as pd
+
+from pathlib import Path
+from typing import Callable, List, Union
+
+# location buckets per date (files per date and configuration)
+N_LOCATION_BUCKETS = 16
+# seconds after which a slice lock is considered abandoned
+LOCK_TIMEOUT_SECONDS = 600
+# seconds between updates of a held slice lock (its age stays below
+# the timeout while the holder works)
+LOCK_TOUCH_SECONDS = 30
+
+
+def get_location_buckets(
+    location_ids: Union[List[str], pd.Series],
+    n_buckets: int = N_LOCATION_BUCKETS,
+) -> np.ndarray:
+    '''
+    Stable bucket number of each location id
+    '''
+    hashes = pd.util.hash_array(np.asarray(location_ids, dtype=object))
+    return (hashes % n_buckets).astype(int)
+
+
+class SliceLock:
+    '''
+    Exclusive lock on a warehouse slice (date directory) while its
+    manifest is updated - a lock file, so it also holds between
+    processes and notebooks loading overlapping events. A held lock
+    is touched every LOCK_TOUCH_SECONDS, so only locks of stopped
+    processes time out.
+    '''
+    def __init__(self, slice_dir: Path):
+        self.filepath = Path(slice_dir, 'manifest.lock')
+        self.stop = threading.Event()
+        self.thread = None
+
+    def keep_alive(self):
+
+        while not self.stop.wait(LOCK_TOUCH_SECONDS):
+            try:
+                os.utime(self.filepath)
+            except FileNotFoundError:
+                return
+
+    def __enter__(self):
+        self.filepath.parent.mkdir(parents=True, exist_ok=True)
+        while True:
+            try:
+                fd = os.open(self.filepath, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.close(fd)
+                self.stop.clear()
+                self.thread = threading.Thread(
+                    target=self.keep_alive, 
+                    daemon=True
+                )
+                self.thread.start()
+                return self
+            except FileExistsError:
+                try:
+                    age = time.time() - self.filepath.stat().st_mtime
+                except FileNotFoundError:
+                    continue
+                if age > LOCK_TIMEOUT_SECONDS:
+                    self.filepath.unlink(missing_ok=True)
+                time.sleep(0.5)
+
+    def __exit__(self, *args):
+        self.stop.set()
+        self.thread.join()
+        self.filepath.unlink(missing_ok=True)
+
+
+class Warehouse:
+    '''
+    Partitioned time series store shared by all events
+    '''
+    def __init__(
+        self,
+        warehouse_dir: Union[str, Path],
+        n_buckets: int = N_LOCATION_BUCKETS,
+    ):
+        self.warehouse_dir = Path(warehouse_dir)
+        self.n_buckets = n_buckets
+
+    def get_slice_dir(
+        self,
+        source: str,
+        configuration: str,
+        subdir: str,
+        day: pd.Timestamp,
+    ) -> Path:
+
+        return Path(
+            self.warehouse_dir,
+            source,
+            configuration,
+            subdir,
+            f"date={pd.Timestamp(day).strftime('%Y%m%d')}"
+        )
+
+    def read_manifest(self, slice_dir: Path) -> dict:
+
+        filepath = Path(slice_dir, 'manifest.json')
+        if not filepath.exists():
+            return dict(locations=[], parts={}, superseded=[])
+        with open(filepath) as f:
+            return json.load(f)
+
+    def write_manifest(
+        self,
+        slice_dir: Path,
+        manifest: dict,
+    ):
+        filepath = Path(slice_dir, 'manifest.json')
+        temp_filepath = filepath.with_suffix('.tmp')
+        with open(temp_filepath, 'w') as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(temp_filepath, filepath)
+
+    def get_missing_locations(
+        self,
+        source: str,
+        configuration: str,
+        subdir: str,
+        day: pd.Timestamp,
+        location_ids: List[str],
+    ) -> List[str]:
+        '''
+        Locations not loaded in the warehouse for this date
+        '''
+        slice_dir = self.get_slice_dir(source, configuration, subdir, day)
+        loaded = set(self.read_manifest(slice_dir)['locations'])
+
+        return [i for i in location_ids if i not in loaded]
+
+    def ingest(
+        self,
+        source: str,
+        configuration: str,
+        subdir: str,
+        day: pd.Timestamp,
+        files: List[Path],
+        overwrite: bool = False,
+    ) -> List[Path]:
+        '''
+        Add loaded time series files to the warehouse, as new part 
+        files per location bucket - only the locations in the files
+        are recorded as loaded (locations without data, e.g. of missing
+        source files, are loaded again next time). The files are split
+        into buckets in one DuckDB pass before the slice is locked. With
+        overwrite, the buckets are rewritten without the old values of
+        these locations (the replaced parts are kept until vacuum, as
+        other event views may link to them).
+        '''
+        if len(files) == 0:
+            return []
+        slice_dir = self.get_slice_dir(source, configuration, subdir, day)
+        slice_dir.mkdir(parents=True, exist_ok=True)
+        file_list = ", ".join(f"'{f}'" for f in files)
+        # next to the part files (same file system), not matched by 
+        # the part file patterns
+        staging_dir = Path(slice_dir, f".ingest_{uuid.uuid4().hex[:12]}")
+
+        con = duckdb.connect()
+        try:
+            loaded_ids = con.sql(
+                f"SELECT DISTINCT location_id "\
+                f"FROM read_parquet([{file_list}])"
+            ).df()['location_id'].tolist()
+            if len(loaded_ids) == 0:
+                return []
+            bucket_map = pd.DataFrame(dict(
+                location_id=loaded_ids,
+                bucket=get_location_buckets(loaded_ids, self.n_buckets),
+            ))
+            con.register('bucket_map', bucket_map)
+            con.sql(f'''
+                COPY (
+                    SELECT s.*, m.bucket
+                    FROM read_parquet([{file_list}]) s
+                    JOIN bucket_map m ON s.location_id = m.location_id
+                    ORDER BY s.location_id, s.value_time
+                ) TO '{staging_dir}' (FORMAT PARQUET, PARTITION_BY (bucket))
+            ''')
+
+            written = []
+            with SliceLock(slice_dir):
+                manifest = self.read_manifest(slice_dir)
+                skipped = pd.DataFrame(dict(location_id=pd.Series(
+                    [] if overwrite else sorted(
+                        set(loaded_ids) & set(manifest['locations'])
+                    ),
+                    dtype=object
+                )))
+                # loaded meanwhile by another event
+                con.register('skipped', skipped)
+                new_ids = bucket_map[
+                    ~bucket_map['location_id'].isin(skipped['location_id'])
+                ]
+                for bucket_dir in sorted(staging_dir.glob('bucket=*')):
+                    bucket = int(bucket_dir.name.split('=')[1])
+                    if not (new_ids['bucket'] == bucket).any():
+                        continue
+                    new_files = sorted(bucket_dir.glob('*.parquet'))
+                    existing = manifest['parts'].get(str(bucket), [])
+                    part = f"b{bucket:02d}_{uuid.uuid4().hex[:12]}.parquet"
+                    filepath = Path(slice_dir, part)
+
+                    new_list = ", ".join(f"'{f}'" for f in new_files)
+                    query = f"SELECT * FROM read_parquet([{new_list}]) "\
+                            f"WHERE location_id NOT IN "\
+                            f"(SELECT location_id FROM skipped)"
+                    merge = overwrite and len(existing) > 0
+                    if merge:
+                        existing_list = ", ".join(
+                            f"'{Path(slice_dir, p)}'" for p in existing
+                        )
+                        query += f" UNION ALL BY NAME "\
+                                 f"SELECT * FROM read_parquet([{existing_list}]) "\
+                                 f"WHERE location_id NOT IN "\
+                                 f"(SELECT location_id FROM bucket_map)"
+                        manifest['superseded'] += existing
+                        existing = []
+
+                    if len(new_files) == 1 and len(skipped) == 0 and not merge:
+                        os.replace(new_files[0], filepath)
+                    else:
+                        # written by several threads, filtered or merged
+                        temp_filepath = Path(slice_dir, f".{part}.tmp")
+                        con.sql(f"COPY ({query} ORDER BY location_id, value_time) "\
+                                f"TO '{temp_filepath}' (FORMAT PARQUET)")
+                        os.replace(temp_filepath, filepath)
+                    manifest['parts'][str(bucket)] = existing + [part]
+                    written.append(filepath)
+
+                manifest['locations'] = sorted(
+                    set(manifest['locations']) | set(new_ids['location_id'])
+                )
+                self.write_manifest(slice_dir, manifest)
+        finally:
+            con.close()
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+        return written
+
+    def link_view(
+        self,
+        source: str,
+        configuration: str,
+        subdir: str,
+        day: pd.Timestamp,
+        location_ids: List[str],
+        view_dir: Union[str, Path],
+    ) -> int:
+        '''
+        Link the current part files of the buckets holding location_ids
+        into an event directory (links to replaced parts are removed),
+        returns the number of links
+        '''
+        slice_dir = self.get_slice_dir(source, configuration, subdir, day)
+        manifest = self.read_manifest(slice_dir)
+        prefix = pd.Timestamp(day).strftime('%Y%m%d')
+        view_dir = Path(view_dir)
+        view_dir.mkdir(parents=True, exist_ok=True)
+
+        linked = set()
+        for bucket in np.unique(get_location_buckets(location_ids, self.n_buckets)):
+            for part in manifest['parts'].get(str(bucket), []):
+                link = Path(view_dir, f"{prefix}_{part}")
+                if not link.is_symlink():
+                    link.symlink_to(Path(slice_dir, part))
+                linked.add(link.name)
+
+        for link in view_dir.glob(f"{prefix}_b*.parquet"):
+            if link.is_symlink() and link.name not in linked:
+                link.unlink()
+
+        return len(linked)
+
+    def load_slice(
+        self,
+        source: str,
+        configuration: str,
+        subdir: str,
+        day: pd.Timestamp,
+        location_ids: List[str],
+        view_dir: Union[str, Path],
+        staging_dir: Union[str, Path],
+        load_function: Callable,
+        overwrite: bool = False,
+    ) -> int:
+        '''
+        Load the locations missing from the warehouse for one date
+        with load_function(location_ids, output_dir) into a staging
+        directory, add them to the warehouse and link the date into
+        the event view. Returns the number of locations loaded.
+        '''
+        if overwrite:
+            missing = list(location_ids)
+        else:
+            missing = self.get_missing_locations(
+                source,
+                configuration,
+                subdir,
+                day,
+                location_ids
+            )
+
+        if missing:
+            staging_dir = Path(staging_dir, uuid.uuid4().hex[:12])
+            staging_dir.mkdir(parents=True)
+            try:
+                load_function(missing, staging_dir)
+                self.ingest(
+                    source,
+                    configuration,
+                    subdir,
+                    day,
+                    sorted(staging_dir.glob('*.parquet')),
+                    overwrite
+                )
+            finally:
+                shutil.rmtree(staging_dir, ignore_errors=True)
+
+        self.link_view(
+            source, 
+            configuration, 
+            subdir, 
+            day, 
+            location_ids, 
+            view_dir
+        )
+
+        return len(missing)
+
+    def vacuum(self) -> int:
+        '''
+        Remove replaced part files (event views linking to them are
+        relinked the next time the event is loaded), returns the number
+        of files removed
+        '''
+        n_removed = 0
+        for filepath in self.warehouse_dir.glob('*/*/*/date=*/manifest.json'):
+            slice_dir = filepath.parent
+            with SliceLock(slice_dir):
+                manifest = self.read_manifest(slice_dir)
+                for part in manifest['superseded']:
+                    Path(slice_dir, part).unlink(missing_ok=True)
+                    n_removed += 1
+                manifest['superseded'] = []
+                self.write_manifest(slice_dir, manifest)
+
+        return n_removed
+
+    def summary(self) -> pd.DataFrame:
+        '''
+        Locations, part files and size per source, configuration, 
+        subdir and date
+        '''
+        rows = []
+        for filepath in sorted(self.warehouse_dir.glob('*/*/*/date=*/manifest.json')):
+            slice_dir = filepath.parent
+            manifest = self.read_manifest(slice_dir)
+            parts = [p for ps in manifest['parts'].values() for p in ps]
+            rows.append(dict(
+                source=slice_dir.parents[2].name,
+                configuration=slice_dir.parents[1].name,
+                subdir=slice_dir.parent.name,
+                date=slice_dir.name.split('=')[1],
+                n_locations=len(manifest['locations']),
+                n_parts=len(parts),
+                mb=sum(Path(slice_dir, p).stat().st_size for p in parts) / 1e6,
+            ))
+
+        return pd.DataFrame(rows)
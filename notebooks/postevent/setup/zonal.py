@@ -0,0 +1,481 @@
+'''
+zonal (mean areal) aggregation of NWM forcing grids - each grid file is
+read once and the weights of every polygon set (HUC10s, USGS basins, ...)
+are applied to it, writing one TEEHR-schema parquet file per reference
+time and polygon set. The weights of each polygon set are a sparse
+(CSR) polygons x cells matrix, built once per event, so the MAPs of a
+stack of grids are one sparse-dense matrix product. Only the
+(chunk-aligned) window of each grid covering the weight cells is read.
+'''
+import hashlib
+import os
+import dask
+import fsspec
+import h5py
+import numpy as np
+import pandas as pd
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from scipy import sparse
+from typing import Dict, List, Tuple, Union
+
+from ..utils import nwm
+from . import progress
+from . import references
+
+# bytes per range request when reading forcing files
+READ_BLOCK_SIZE = 2**18
+# weight matrices by weights content hash
+WEIGHT_MATRIX_CACHE = {}
+
+
+def get_weights_key(
+    weight_sets: Dict[str, pd.DataFrame],
+) -> str:
+    '''
+    Content hash of the weight sets (names the cached matrices)
+    '''
+    key = hashlib.sha1()
+    for name, weights in sorted(weight_sets.items()):
+        key.update(name.encode())
+        key.update(pd.util.hash_pandas_object(
+            weights[['location_id','row','col','weight']],
+            index=False
+        ).to_numpy().tobytes())
+    return key.hexdigest()[:16]
+
+def build_weight_matrices(
+    weight_sets: Dict[str, pd.DataFrame],
+) -> dict:
+    '''
+    Sparse (CSR) weight matrix per polygon set, polygons x grid cells,
+    over the union of the cells used by any set (rows, cols), so
+    MAPs are the matrix product with the cell values
+    '''
+    cells = pd.concat(
+        [w[['row','col']] for w in weight_sets.values()]
+    ).drop_duplicates().reset_index(drop=True)
+    cell_index = pd.Series(
+        np.arange(len(cells)),
+        index=pd.MultiIndex.from_frame(cells)
+    )
+
+    matrices = {}
+    for name, weights in weight_sets.items():
+        location_ids, polygon_index = np.unique(
+            weights['location_id'].to_numpy().astype(str),
+            return_inverse=True
+        )
+        cell_position = cell_index.reindex(
+            pd.MultiIndex.from_frame(weights[['row','col']])
+        ).to_numpy()
+        matrices[name] = dict(
+            matrix=sparse.csr_matrix(
+                (weights['weight'].to_numpy('float64'),
+                 (polygon_index, cell_position)),
+                shape=(len(location_ids), len(cells))
+            ),
+            location_ids=location_ids,
+        )
+
+    return dict(
+        rows=cells['row'].to_numpy(),
+        cols=cells['col'].to_numpy(),
+        matrices=matrices,
+    )
+
+def write_weight_matrices(
+    zonal_weights: dict,
+    filepath: Union[str, Path],
+):
+    arrays = dict(rows=zonal_weights['rows'], cols=zonal_weights['cols'])
+    for name, m in zonal_weights['matrices'].items():
+        arrays[f"{name}/data"] = m['matrix'].data
+        arrays[f"{name}/indices"] = m['matrix'].indices
+        arrays[f"{name}/indptr"] = m['matrix'].indptr
+        arrays[f"{name}/shape"] = np.array(m['matrix'].shape)
+        arrays[f"{name}/location_ids"] = m['location_ids']
+    filepath = Path(filepath)
+    filepath.parent.mkdir(parents=True, exist_ok=True)
+    temp_filepath = filepath.with_suffix('.tmp.npz')
+    np.savez(temp_filepath, **arrays)
+    os.replace(temp_filepath, filepath)
+
+def read_weight_matrices(
+    filepath: Union[str, Path],
+) -> dict:
+
+    with np.load(filepath) as f:
+        names = sorted(set(k.split('/')[0] for k in f.files if '/' in k))
+        matrices = {
+            name: dict(
+                matrix=sparse.csr_matrix(
+                    (f[f"{name}/data"], f[f"{name}/indices"], 
+                     f[f"{name}/indptr"]),
+                    shape=tuple(f[f"{name}/shape"])
+                ),
+                location_ids=f[f"{name}/location_ids"],
+            )
+            for name in names
+        }
+        return dict(rows=f['rows'], cols=f['cols'], matrices=matrices)
+
+def get_weight_matrices(
+    weight_sets: Dict[str, pd.DataFrame],
+    cache_dir: Union[str, Path, None] = None,
+) -> dict:
+    '''
+    Weight matrices for the weight sets - built once and reused from
+    memory or (if cache_dir, e.g. the event zonal directory) from disk
+    '''
+    key = get_weights_key(weight_sets)
+    if key in WEIGHT_MATRIX_CACHE:
+        return WEIGHT_MATRIX_CACHE[key]
+
+    filepath = None
+    if cache_dir is not None:
+        filepath = Path(cache_dir, f"weights_{key}.npz")
+    if filepath is not None and filepath.exists():
+        zonal_weights = read_weight_matrices(filepath)
+    else:
+        zonal_weights = build_weight_matrices(weight_sets)
+        if filepath is not None:
+            write_weight_matrices(zonal_weights, filepath)
+
+    WEIGHT_MATRIX_CACHE[key] = zonal_weights
+    return zonal_weights
+
+def compute_zonal_means(
+    values: np.ndarray,
+    matrix: sparse.csr_matrix,
+    n_threads: int = 1,
+) -> np.ndarray:
+    '''
+    Weighted mean per polygon for a stack of grids - values are the
+    grid values at the matrix cells (time x cells), returns time x
+    polygons. As in TEEHR's weighted average (sum of weighted values
+    over the sum of weights), cells with missing values count as zero
+    and keep their weight, a polygon with only missing cells is zero
+    (NaN only for a polygon without cells). The time steps are split 
+    in chunks over n_threads threads.
+    '''
+    values = np.atleast_2d(values)
+    weight_sum = np.asarray(matrix.sum(axis=1))
+
+    def compute_chunk(chunk):
+        weighted_sum = matrix @ np.nan_to_num(chunk, nan=0.0).T
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(
+                weight_sum > 0, 
+                weighted_sum / weight_sum, 
+                np.nan
+            ).T
+
+    n_chunks = min(max(n_threads, 1), len(values))
+    if n_chunks <= 1:
+        return compute_chunk(values)
+
+    chunks = np.array_split(values, n_chunks)
+    with ThreadPoolExecutor(max_workers=n_chunks) as executor:
+        return np.concatenate(list(executor.map(compute_chunk, chunks)))
+
+def get_grid_window(
+    rows: np.ndarray,
+    cols: np.ndarray,
+    grid_shape: Tuple[int, int],
+    chunk_shape: Union[Tuple[int, int], None] = None,
+) -> Tuple[slice, slice]:
+    '''
+    Row and column window covering the cells, expanded to the storage
+    chunk boundaries (every chunk read is used whole)
+    '''
+    n_rows, n_cols = grid_shape
+    chunk_rows, chunk_cols = chunk_shape if chunk_shape else (1, 1)
+    row_start = rows.min() // chunk_rows * chunk_rows
+    row_end = min(-(-(rows.max() + 1) // chunk_rows) * chunk_rows, n_rows)
+    col_start = cols.min() // chunk_cols * chunk_cols
+    col_end = min(-(-(cols.max() + 1) // chunk_cols) * chunk_cols, n_cols)
+
+    return slice(int(row_start), int(row_end)), slice(int(col_start), int(col_end))
+
+def decode_attribute(value) -> str:
+
+    if isinstance(value, np.ndarray):
+        value = value[0]
+    if isinstance(value, bytes):
+        value = value.decode()
+    return value
+
+def decode_time(value, attrs: dict) -> pd.Timestamp:
+    '''
+    CF time value (e.g. minutes since 1970-01-01 00:00:00 UTC)
+    '''
+    unit, origin = decode_attribute(attrs['units']).split(' since ')
+    origin = pd.Timestamp(origin.replace('UTC','').strip())
+    return origin + pd.to_timedelta(float(value), unit=unit.strip())
+
+def apply_cf_encoding(
+    values: np.ndarray,
+    attrs: dict,
+) -> np.ndarray:
+    '''
+    NetCDF fill values and packing (h5py does not apply them),
+    missing values are NaN
+    '''
+    missing = np.zeros(values.shape, dtype=bool)
+    for attr in ['_FillValue', 'missing_value']:
+        if attr in attrs:
+            missing |= values == attrs[attr]
+    values = values.astype('float64')
+    if 'scale_factor' in attrs:
+        values *= float(np.ravel(attrs['scale_factor'])[0])
+    if 'add_offset' in attrs:
+        values += float(np.ravel(attrs['add_offset'])[0])
+    values[missing] = np.nan
+
+    return values
+
+def read_forcing_values(
+    url: str,
+    rows: np.ndarray,
+    cols: np.ndarray,
+    variable_name: str = 'RAINRATE',
+    windowed: bool = True,
+    catalog: Union[references.ReferenceCatalog, None] = None,
+) -> Union[dict, None]:
+    '''
+    Grid values at the weight cells from one forcing file (any fsspec
+    url - gcs, https, local), None if the file does not exist. If 
+    windowed, only the chunks of the window covering the cells are 
+    read (range requests) instead of the whole CONUS grid. With a 
+    reference catalog, the chunk locations come from the (shared) 
+    file references instead of the file headers.
+    '''
+    if catalog is not None:
+        refs, reference_status = catalog.get_or_build(url)
+        if refs is None:
+            return None
+        metadata = references.get_variable_metadata(refs, variable_name)
+        grid_shape = metadata['shape'][-2:]
+        if windowed:
+            row_window, col_window = get_grid_window(
+                rows, 
+                cols, 
+                grid_shape, 
+                metadata['chunks'][-2:]
+            )
+        else:
+            row_window, col_window = [slice(0, n) for n in grid_shape]
+        window = references.read_reference_window(
+            url, 
+            refs, 
+            variable_name, 
+            (slice(0, 1), row_window, col_window)
+        )[0]
+        attrs = metadata['attrs']
+        value_time = decode_time(
+            *references.read_reference_value(url, refs, 'time')
+        )
+        reference_time = decode_time(
+            *references.read_reference_value(url, refs, 'reference_time')
+        )
+    else:
+        reference_status = None
+        try:
+            f = fsspec.open(url, 'rb', block_size=READ_BLOCK_SIZE).open()
+        except FileNotFoundError:
+            return None
+
+        with f, h5py.File(f, 'r') as ds:
+            var = ds[variable_name]
+            if windowed:
+                row_window, col_window = get_grid_window(
+                    rows, 
+                    cols, 
+                    var.shape[-2:], 
+                    var.chunks[-2:] if var.chunks else None
+                )
+            else:
+                row_window, col_window = slice(0, None), slice(0, None)
+            window = var[0, row_window, col_window]
+            attrs = dict(var.attrs)
+            value_time = decode_time(
+                ds['time'][0], 
+                ds['time'].attrs
+            )
+            reference_time = decode_time(
+                ds['reference_time'][0], 
+                ds['reference_time'].attrs
+            )
+
+    window = apply_cf_encoding(window, attrs)
+
+    return dict(
+        values=window[rows - row_window.start, cols - col_window.start],
+        measurement_unit=decode_attribute(attrs['units']),
+        value_time=value_time,
+        reference_time=reference_time,
+        reference_status=reference_status,
+    )
+
+def get_zonal_dataframe(
+    means: np.ndarray,
+    location_ids: np.ndarray,
+    forcings: List[dict],
+    configuration: str,
+    variable_name: str = 'RAINRATE',
+) -> pd.DataFrame:
+    '''
+    Zonal means (time x polygons) in the TEEHR timeseries schema
+    '''
+    n_times, n_polys = means.shape
+    return pd.DataFrame(dict(
+        location_id=np.tile(location_ids, n_times),
+        value=means.ravel(),
+        value_time=np.repeat(
+            [f['value_time'] for f in forcings], n_polys),
+        reference_time=np.repeat(
+            [f['reference_time'] for f in forcings], n_polys),
+        configuration=configuration,
+        variable_name=variable_name,
+        measurement_unit=forcings[0]['measurement_unit'],
+    ))
+
+def get_reference_time_groups(
+    urls: List[str]
+) -> Dict[str, List[str]]:
+    '''
+    Group file urls by reference time (nwm.YYYYMMDD/.../nwm.tHHz...),
+    keys are the output file names YYYYMMDDTHHZ
+    '''
+    groups = {}
+    for url in urls:
+        parts = url.split('/')
+        date = parts[-3].split('.')[1]
+        hour = parts[-1].split('.')[1][1:3]
+        groups.setdefault(f"{date}T{hour}Z", []).append(url)
+
+    return groups
+
+def get_daily_reference_time_groups(
+    urls: List[str]
+) -> Dict[str, Dict[str, List[str]]]:
+    '''
+    Reference time groups (see get_reference_time_groups) by day,
+    keys YYYYMMDD - the files of a day are read in one dask compute
+    (analysis configurations have 24 groups of one or two files)
+    '''
+    days = {}
+    for file_name, group_urls in get_reference_time_groups(urls).items():
+        days.setdefault(file_name[:8], {})[file_name] = group_urls
+
+    return days
+
+def nwm_grids_to_parquet_multi(
+    configuration: str,
+    start_date: Union[str, pd.Timestamp],
+    n_days: int,
+    weight_sets: Dict[str, pd.DataFrame],
+    output_dirs: Dict[str, Union[str, Path]],
+    t_minus_hours: Union[List[int], None] = None,
+    variable_name: str = 'RAINRATE',
+    base_url: str = nwm.NWM_BUCKET_URL,
+    cache_dir: Union[str, Path, None] = None,
+    n_threads: int = 1,
+    windowed: bool = True,
+    catalog: Union[references.ReferenceCatalog, None] = None,
+    overwrite_output: bool = False,
+) -> int:
+    '''
+    Mean areal precipitation for several polygon sets in one pass over
+    the forcing files - weight_sets and output_dirs are keyed by polygon
+    set. Files are read in parallel with dask (on the distributed
+    client if one is running), one day at a time, and the 
+    MAPs of each reference time are computed as one sparse matrix 
+    product (see compute_zonal_means). Only the window of each grid 
+    covering the weight cells is read, unless windowed is False. 
+    The file references are taken from (and added to) the catalog 
+    if given. Missing files are skipped. Returns the number of files 
+    read.
+    '''
+    urls = nwm.get_nwm_file_list(
+        configuration,
+        'forcing',
+        start_date,
+        n_days,
+        t_minus_hours=t_minus_hours,
+        base_url=base_url,
+    )
+    for output_dir in output_dirs.values():
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+    zonal_weights = get_weight_matrices(weight_sets, cache_dir)
+    # one copy of the cell indices shared by all tasks
+    rows = dask.delayed(zonal_weights['rows'], pure=True)
+    cols = dask.delayed(zonal_weights['cols'], pure=True)
+
+    n_read = 0
+    for day_groups in get_daily_reference_time_groups(urls).values():
+        pending = {}
+        for file_name, group_urls in day_groups.items():
+            output_files = {
+                name: Path(output_dirs[name], f"{file_name}.parquet")
+                for name in weight_sets
+            }
+            if not overwrite_output \
+                and all(f.exists() for f in output_files.values()):
+                progress.report(n_files=len(group_urls))
+                continue
+            pending[file_name] = (group_urls, output_files)
+
+        # read all files of the day at once, then write by reference time
+        tasks = [
+            dask.delayed(read_forcing_values)(
+                url, 
+                rows, 
+                cols, 
+                variable_name,
+                windowed,
+                catalog
+            )
+            for group_urls, _ in pending.values()
+            for url in group_urls
+        ]
+        day_forcings = dask.compute(*tasks)
+        if catalog is not None:
+            catalog.record([
+                f['reference_status'] for f in day_forcings if f is not None
+            ])
+        day_forcings = iter(day_forcings)
+
+        for file_name, (group_urls, output_files) in pending.items():
+            forcings = [next(day_forcings) for url in group_urls]
+            forcings = [f for f in forcings if f is not None]
+            n_read += len(forcings)
+            if len(forcings) == 0:
+                progress.report(n_files=len(group_urls))
+                continue
+            values = np.stack([f['values'] for f in forcings])
+
+            for name, output_file in output_files.items():
+                weights = zonal_weights['matrices'][name]
+                means = compute_zonal_means(
+                    values, 
+                    weights['matrix'], 
+                    n_threads
+                )
+                df = get_zonal_dataframe(
+                    means,
+                    weights['location_ids'],
+                    forcings,
+                    configuration,
+                    variable_name,
+                )
+                df.sort_values(['location_id','value_time']).to_parquet(
+                    output_file,
+                    index=False
+                )
+                progress.report(rows=len(df))
+            progress.report(n_files=len(group_urls))
+
+    return n_read
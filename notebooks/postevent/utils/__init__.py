@@ -3,3 +3,4 @@ from . import convert
 from . import geom
 from . import nwm
 from . import locations
+from . import timing
@@ -3,10 +3,12 @@ unit conversion related utilities
 (temporary - unit handling will eventually be added to teehr)
 '''
 
+import functools
+import numpy as np
 import pandas as pd
 import geopandas as gpd
 
-from typing import List, Union
+from typing import List, Tuple, Union
 
 
 def convert_area_to_ft2(
@@ -156,91 +158,211 @@ def get_depth_units(units: str) -> str:
   
     return new_units
 
+def convert_precip_to_in(
+    units: str, 
+    values: pd.Series,
+) -> pd.Series:
+    
+    depth_units = get_depth_units(units)
+    return convert_depth_to_in(
+        depth_units, 
+        convert_rate_to_depth(units, values)
+    )
+
+def convert_precip_to_mm(
+    units: str, 
+    values: pd.Series,
+) -> pd.Series:
+    
+    depth_units = get_depth_units(units)
+    return convert_depth_to_mm(
+        depth_units, 
+        convert_rate_to_depth(units, values)
+    )
+
+# query columns that carry the measurement unit of the queried variable
+# (need a metric library to look up units and ranges)
+QUERY_VALUE_COLUMNS = [
+    "value",
+    "bias",
+    "secondary_value",
+    "primary_value",
+    "secondary_average",
+    "primary_average",
+    "secondary_minimum",
+    "primary_minimum",
+    "primary_maximum",
+    "secondary_maximum",
+    "max_value_delta",
+    "secondary_sum",
+    "primary_sum",
+    "secondary_variance",
+    "primary_variance",
+    "min",
+    "max",
+    "average",
+    "sum"]
+
+# variable names used in the queries mapped to the conversion variable
+QUERY_VARIABLES = {
+    'streamflow': 'streamflow',
+    'flow': 'streamflow',
+    'discharge': 'streamflow',
+    'precip': 'precipitation',
+    'precipitation': 'precipitation',
+    'precipitation_rate': 'precipitation',
+    'RAINRATE': 'precipitation',
+}
+
+# native units that may be found in the measurement_unit column
+QUERY_UNITS = {
+    'streamflow': ['cms','m3/s','cfs','ft3/s'],
+    'precipitation': [
+        'mm s^-1','mm/s','in s^-1','in/s',
+        'mm','mm/hr','cm','cm/hr','m','m/hr',
+        'in','inches','in/hr','ft','feet','ft/hr'
+    ],
+}
+
+# (variable, unit system) lookup of the conversion function 
+# and the resulting measurement unit
+QUERY_UNIT_CONVERSIONS = {
+    ('streamflow', 'english'): (convert_flow_to_cfs, 'ft3/s'),
+    ('streamflow', 'metric'): (convert_flow_to_cms, 'm3/s'),
+    ('precipitation', 'english'): (convert_precip_to_in, 'in/hr'),
+    ('precipitation', 'metric'): (convert_precip_to_mm, 'mm/hr'),
+}
+
+# rows converted per pass - bounds the size of temporary arrays 
+# when converting very large (e.g., all-reach) metric frames
+CONVERSION_CHUNK_SIZE = 500_000
+
+@functools.lru_cache(maxsize=None)
+def get_query_unit_factor(
+    from_units: str, 
+    to_units: str,
+    variable: Union[str, None] = None,
+) -> Tuple[float, str]:
+    '''
+    Resolve the single scale factor and converted measurement unit
+    for a (from_units, to_units, variable) combination. Returns a 
+    factor of 1 and the original units if no conversion is defined.
+    '''
+    key = (QUERY_VARIABLES.get(variable), to_units)
+    if key not in QUERY_UNIT_CONVERSIONS:
+        return 1.0, from_units
+    
+    convert_function, new_units = QUERY_UNIT_CONVERSIONS[key]
+    if from_units not in QUERY_UNITS[key[0]]:
+        raise ValueError(f"unrecognized measurement unit '{from_units}' "\
+                         f"for variable {variable}")
+    
+    # all conversions are linear, so converting 1 gives the factor
+    factor = convert_function(from_units, 1.0)
+    
+    return float(factor), new_units
+
+def scale_column(
+    df: Union[pd.DataFrame, gpd.GeoDataFrame], 
+    column: str, 
+    factor: float,
+    chunk_size: int = CONVERSION_CHUNK_SIZE,
+):
+    '''
+    Multiply a column by a scale factor in place, chunk_size rows 
+    at a time into the column array, so no full-length temporaries 
+    are allocated (non-float64 columns are converted once)
+    '''
+    values = df[column].to_numpy(dtype='float64', copy=False)
+    is_view = values.flags.writeable \
+        and np.shares_memory(values, df[column].to_numpy())
+    if not is_view:
+        # converted dtype or read-only (copy-on-write) column
+        values = np.array(values, dtype='float64')
+    for start in range(0, len(values), chunk_size):
+        chunk = values[start:start + chunk_size]
+        np.multiply(chunk, factor, out=chunk)
+    if not is_view:
+        df[column] = values
         
 def convert_query_units(
-    gdf_orig: Union[pd.DataFrame, gpd.GeoDataFrame], 
+    gdf: Union[pd.DataFrame, gpd.GeoDataFrame], 
     to_units: 'str',
     variable: Union['str', None] = None,
+    inplace: bool = False,
+    chunk_size: int = CONVERSION_CHUNK_SIZE,
 ) -> Union[pd.DataFrame, gpd.GeoDataFrame]:
+    '''
+    Convert query value columns to the requested unit system. A single 
+    scale factor is resolved per measurement unit in the query and 
+    applied chunk by chunk, to a copy of the frame unless inplace = True.
+    Raises ValueError for an unrecognized unit - measurement_unit is only
+    rewritten when a conversion is applied.
+    '''
+    if not inplace:
+        gdf = gdf.copy()
+    if gdf.empty:
+        return gdf
     
-    # need a metric library to look up units and ranges
+    conversions = {
+        unit: get_query_unit_factor(unit, to_units, variable)
+        for unit in gdf['measurement_unit'].unique()
+    }
+    if all(new_units == unit for unit, (_, new_units) in conversions.items()):
+        # no conversion defined for the variable and unit system
+        return gdf
+    new_units = list(conversions.values())[0][1]
+    value_columns = [c for c in gdf.columns if c in QUERY_VALUE_COLUMNS]
     
-    convert_columns = [
-        "value",
-        "bias",
-        "secondary_value",
-        "primary_value",
-        "secondary_average",
-        "primary_average",
-        "secondary_minimum",
-        "primary_minimum",
-        "primary_maximum",
-        "secondary_maximum",
-        "max_value_delta",
-        "secondary_sum",
-        "primary_sum",
-        "secondary_variance",
-        "primary_variance",
-        "min",
-        "max",
-        "average",
-        "sum"]
-    
-    gdf = gdf_orig.copy()
-    measurement_unit = gdf['measurement_unit'][0]
-    
-    if variable in ['streamflow','flow','discharge']:
-        if to_units == 'english':
-            for col in gdf.columns:
-                if col in convert_columns:
-                    gdf[col] = convert_flow_to_cfs(
-                        measurement_unit, 
-                        gdf[col]
-                    )
-            gdf['measurement_unit'] = 'ft3/s'
-        elif to_units == 'metric':
-            for col in gdf.columns:
-                if col in convert_columns:
-                    gdf[col] = convert_flow_to_cms(
-                        measurement_unit, 
-                        gdf[col]
-                    )  
-            gdf['measurement_unit'] = 'm3/s'
-            
-    elif variable in ['precip','precipitation','precipitation_rate','RAINRATE']:
-        
-        if to_units == 'english':
-            for col in gdf.columns:
-                if col in convert_columns:
-                    gdf[col] = convert_rate_to_depth(
-                        measurement_unit, 
-                        gdf[col]
-                    )
-                    depth_measurement_unit = get_depth_units(
-                        measurement_unit
-                    )
-                    gdf[col] = convert_depth_to_in(
-                        depth_measurement_unit, 
-                        gdf[col])
-                    
-            gdf['measurement_unit'] = 'in/hr'
-        elif to_units == 'metric':
-            for col in gdf.columns:
-                if col in convert_columns:
-                    gdf[col] = convert_rate_to_depth(
-                        measurement_unit, 
-                        gdf[col]
-                    )
-                    depth_measurement_unit = get_depth_units(
-                        measurement_unit
-                    )
-                    gdf[col] = convert_depth_to_mm(
-                        depth_measurement_unit, 
-                        gdf[col]
-                    )                   
-            gdf['measurement_unit'] = 'mm/hr'        
+    if len(conversions) == 1:
+        factor = list(conversions.values())[0][0]
+        if factor != 1.0:
+            for col in value_columns:
+                scale_column(gdf, col, factor, chunk_size)
+    else:
+        # mixed units (e.g., sources loaded separately) - one factor per row
+        factors = gdf['measurement_unit'].map(
+            {unit: factor for unit, (factor, _) in conversions.items()}
+        ).to_numpy(dtype='float64')
+        for col in value_columns:
+            gdf[col] = gdf[col].to_numpy(dtype='float64') * factors
+    gdf['measurement_unit'] = new_units
 
     return gdf
+
+def get_query_unit_projection(
+    columns: List[str],
+    to_units: 'str',
+    variable: Union['str', None] = None,
+) -> str:
+    '''
+    Build a DuckDB select list that applies the unit conversion lazily 
+    inside a query - value columns are scaled by a factor looked up 
+    from the measurement_unit of each row and measurement_unit is 
+    rewritten. Returns '*' if no conversion is defined.
+    '''
+    key = (QUERY_VARIABLES.get(variable), to_units)
+    if key not in QUERY_UNIT_CONVERSIONS:
+        return "*"
+    new_units = QUERY_UNIT_CONVERSIONS[key][1]
+    
+    when_clauses = " ".join(
+        [f"WHEN '{u}' THEN {get_query_unit_factor(u, to_units, variable)[0]!r}"
+         for u in QUERY_UNITS[key[0]]]
+    )
+    # unknown units fail the query (as in convert_query_units) rather
+    # than silently becoming NULL values
+    factor_sql = f"(CASE measurement_unit {when_clauses} "\
+                 f"ELSE error('unrecognized measurement unit ' "\
+                 f"|| measurement_unit) END)"
+    
+    replace_list = [
+        f"{col} * {factor_sql} AS {col}" 
+        for col in columns if col in QUERY_VALUE_COLUMNS
+    ]
+    replace_list.append(f"'{new_units}' AS measurement_unit")
+    
+    return f"* REPLACE ({', '.join(replace_list)})"
     
 def convert_attr_units(
     df: pd.DataFrame, 
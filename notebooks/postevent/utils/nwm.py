@@ -4,7 +4,25 @@ nwm-related utilities
 import datetime as dt
 import pandas as pd
 
-from typing import List
+from typing import List, Union
+
+# public NWM operational output (Google Cloud Storage) over https
+NWM_BUCKET_URL = 'https://storage.googleapis.com/national-water-model'
+
+# reference time hours (UTC) and time step labels (f = lead hours,
+# tm = hours before the reference time) of the operational files
+NWM_FILE_SPECS = {
+    'short_range': (range(24), 'f', range(1, 19)),
+    'medium_range_mem1': (range(0, 24, 6), 'f', range(3, 243, 3)),
+    'forcing_short_range': (range(24), 'f', range(1, 19)),
+    'forcing_medium_range': (range(0, 24, 6), 'f', range(1, 241)),
+    'analysis_assim': (range(24), 'tm', range(0, 3)),
+    'analysis_assim_no_da': (range(24), 'tm', range(0, 3)),
+    'forcing_analysis_assim': (range(24), 'tm', range(0, 3)),
+    'analysis_assim_extend': ([16], 'tm', range(0, 28)),
+    'analysis_assim_extend_no_da': ([16], 'tm', range(0, 28)),
+    'forcing_analysis_assim_extend': ([16], 'tm', range(0, 28)),
+}
 
 def get_nwm_version(
     start_date: dt.datetime,
@@ -81,3 +99,61 @@ def get_value_times_for_ref_time_range(
 
     return [value_time_start, value_time_end] 
 
+
+def get_nwm_filename(
+    configuration: str,
+    output_type: str,
+    reference_time: dt.datetime,
+    step_label: str,
+    step: int,
+) -> str:
+    '''
+    Bucket path of one operational NWM file, e.g., 
+    nwm.20230101/short_range/nwm.t00z.short_range.channel_rt.f001.conus.nc
+    '''
+    # file names use the configuration without forcing_ or member
+    file_config = configuration.replace('forcing_', '')
+    if file_config == 'medium_range_mem1':
+        file_config = 'medium_range'
+    step_digits = 3 if step_label == 'f' else 2
+
+    return f"nwm.{reference_time.strftime('%Y%m%d')}/{configuration}/"\
+           f"nwm.t{reference_time.strftime('%H')}z.{file_config}."\
+           f"{output_type}.{step_label}{step:0{step_digits}d}.conus.nc"
+
+def get_nwm_file_list(
+    configuration: str,
+    output_type: str,
+    start_date: Union[str, dt.datetime, pd.Timestamp],
+    n_days: int,
+    t_minus_hours: Union[List[int], None] = None,
+    base_url: str = NWM_BUCKET_URL,
+) -> List[str]:
+    '''
+    URLs of the operational NWM files for all reference times 
+    in n_days from start_date (same selection as the TEEHR loaders, 
+    t_minus_hours limits the analysis time steps)
+    '''
+    if configuration not in NWM_FILE_SPECS:
+        raise ValueError(f"NWM configuration {configuration} not "\
+                         f"recognized, options are {list(NWM_FILE_SPECS.keys())}")
+    ref_hours, step_label, steps = NWM_FILE_SPECS[configuration]
+    if t_minus_hours is not None and step_label == 'tm':
+        steps = t_minus_hours
+
+    start_date = pd.Timestamp(start_date).normalize()
+    urls = []
+    for day in range(n_days):
+        for hour in ref_hours:
+            reference_time = start_date + pd.Timedelta(days=day, hours=hour)
+            for step in steps:
+                filename = get_nwm_filename(
+                    configuration, 
+                    output_type, 
+                    reference_time, 
+                    step_label, 
+                    step
+                )
+                urls.append(f"{base_url.rstrip('/')}/{filename}")
+
+    return urls
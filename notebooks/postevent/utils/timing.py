@@ -0,0 +1,259 @@
+'''
+lightweight timing instrumentation - queries, metric calculations,
+dashboard callbacks and geometry setup record their wall time, rows
+returned, bytes read and (optionally) peak memory into an in-process 
+ring buffer that can be viewed in a dashboard or saved for comparison
+'''
+import functools
+import json
+import threading
+import time
+import tracemalloc
+import pandas as pd
+import panel as pn
+
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Union
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# set False to skip all recording (decorated functions run unchanged)
+TIMING_ENABLED = True
+# set True to record the peak memory of each call (tracemalloc - counts
+# Python and numpy allocations, not DuckDB or Arrow buffers, and slows
+# down the traced code)
+TRACE_MEMORY = False
+# most recent records are kept
+TIMING_RECORDS = deque(maxlen=5000)
+
+_LOCAL = threading.local()
+
+
+def get_read_bytes() -> Union[int, None]:
+    '''
+    Bytes read by this process so far (None if not available)
+    '''
+    if psutil is None:
+        return None
+    try:
+        return psutil.Process().io_counters().read_bytes
+    except (AttributeError, psutil.Error):
+        return None
+
+def start_peak_memory() -> Union[int, None]:
+    '''
+    Start measuring the peak memory of a call, returns the traced memory
+    at the start (None if TRACE_MEMORY is off) - the tracemalloc peak
+    is reset, so the peak reached so far by an enclosing call is kept
+    in its frame
+    '''
+    if not TRACE_MEMORY:
+        return None
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    current, peak = tracemalloc.get_traced_memory()
+    frames = getattr(_LOCAL, 'memory_frames', [])
+    if frames:
+        frames[-1] = max(frames[-1], peak)
+    frames.append(current)
+    _LOCAL.memory_frames = frames
+    tracemalloc.reset_peak()
+
+    return current
+
+def end_peak_memory(
+    start: Union[int, None]
+) -> Union[float, None]:
+    '''
+    Peak memory (MB) of a call above the memory at its start, including
+    the peaks of nested calls
+    '''
+    if start is None:
+        return None
+    frames = _LOCAL.memory_frames
+    frame_peak = frames.pop()
+    if not tracemalloc.is_tracing():
+        return None
+    peak = max(frame_peak, tracemalloc.get_traced_memory()[1])
+    if frames:
+        frames[-1] = max(frames[-1], peak)
+
+    return round((peak - start) / 1e6, 3)
+
+def count_rows(
+    result
+) -> Union[int, None]:
+
+    if isinstance(result, (pd.DataFrame, pd.Series)):
+        return len(result)
+    return None
+
+@contextmanager
+def timer(
+    name: str,
+    stage: str = '',
+):
+    '''
+    Record the block as one timing, yields the record so the caller
+    can set 'rows'
+    '''
+    if not TIMING_ENABLED:
+        yield {}
+        return
+
+    depth = getattr(_LOCAL, 'depth', 0)
+    _LOCAL.depth = depth + 1
+    record = dict(
+        start=datetime.now(),
+        stage=stage,
+        name=name,
+        depth=depth,
+        seconds=None,
+        rows=None,
+        read_mb=None,
+        peak_mb=None,
+        error='',
+    )
+    read_start = get_read_bytes()
+    memory_start = start_peak_memory()
+    t_start = time.perf_counter()
+    try:
+        yield record
+    except Exception as e:
+        record['error'] = type(e).__name__
+        raise
+    finally:
+        record['seconds'] = round(time.perf_counter() - t_start, 6)
+        read_end = get_read_bytes()
+        if read_start is not None and read_end is not None:
+            record['read_mb'] = round((read_end - read_start) / 1e6, 3)
+        record['peak_mb'] = end_peak_memory(memory_start)
+        _LOCAL.depth = depth
+        TIMING_RECORDS.append(record)
+
+def timed(
+    stage: str = '',
+):
+    '''
+    Decorator that records each call (functools.wraps keeps the
+    function attributes, including param.depends dependency info)
+    '''
+    def decorator(function):
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not TIMING_ENABLED:
+                return function(*args, **kwargs)
+            with timer(function.__qualname__, stage) as record:
+                result = function(*args, **kwargs)
+                record['rows'] = count_rows(result)
+            return result
+
+        return wrapper
+
+    return decorator
+
+def instrument_callbacks(
+    cls,
+    stage: str = 'callback',
+):
+    '''
+    Time all methods of a class that are decorated with param.depends
+    '''
+    for name, method in list(vars(cls).items()):
+        if callable(method) and hasattr(method, '_dinfo'):
+            setattr(cls, name, timed(stage)(method))
+
+    return cls
+
+def get_timings_df() -> pd.DataFrame:
+
+    return pd.DataFrame(list(TIMING_RECORDS))
+
+def summarize_timings() -> pd.DataFrame:
+    '''
+    Calls, total/mean/max seconds and rows per timed function,
+    slowest first
+    '''
+    df = get_timings_df()
+    if df.empty:
+        return df
+    summary_df = df.groupby(['stage','name']).agg(
+        calls=('seconds','count'),
+        total_seconds=('seconds','sum'),
+        mean_seconds=('seconds','mean'),
+        max_seconds=('seconds','max'),
+        total_rows=('rows','sum'),
+        read_mb=('read_mb','sum'),
+        peak_mb=('peak_mb','max'),
+    ).reset_index()
+
+    return summary_df.sort_values('total_seconds', ascending=False)
+
+def clear_timings():
+    TIMING_RECORDS.clear()
+
+def dump_timings(
+    filepath: Union[str, Path]
+) -> Path:
+    '''
+    Write all records to .json or .csv (by file suffix)
+    '''
+    filepath = Path(filepath)
+    df = get_timings_df()
+    if filepath.suffix == '.json':
+        with open(filepath, 'w') as f:
+            json.dump(df.to_dict(orient='records'), f, default=str, indent=1)
+    elif filepath.suffix == '.csv':
+        df.to_csv(filepath, index=False)
+    else:
+        raise ValueError(f"Timing file type {filepath.suffix} not "\
+                         f"recognized, use .json or .csv")
+    print(f"{len(df)} timing records written to {filepath}")
+
+    return filepath
+
+def get_timing_widget(
+    summary: bool = True,
+    period: int = 2000,
+) -> pn.Column:
+    '''
+    Table of timings that refreshes periodically (summary per
+    function or the individual records)
+    '''
+    def get_df():
+        df = summarize_timings() if summary else get_timings_df()
+        return df.round(4)
+
+    table = pn.widgets.Tabulator(
+        get_df(),
+        disabled=True,
+        pagination='remote',
+        page_size=20,
+        show_index=False,
+    )
+    def refresh():
+        table.value = get_df()
+
+    clear_button = pn.widgets.Button(name='Clear', width=80)
+    def clear(event):
+        clear_timings()
+        refresh()
+    clear_button.on_click(clear)
+
+    layout = pn.Column(pn.Row(pn.pane.Markdown("**Timings**"), clear_button), table)
+    callback = pn.state.add_periodic_callback(refresh, period=period)
+
+    # stop refreshing when the (server) session is closed
+    if pn.state.curdoc is not None:
+        def stop(session_context):
+            callback.stop()
+        pn.state.on_session_destroyed(stop)
+
+    return layout
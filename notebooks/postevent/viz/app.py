@@ -0,0 +1,154 @@
+'''
+Multi-user panel server application - serves the evaluation dashboards
+for any prepared event, all sessions viewing the same event (and
+dashboard options) share one data product (see viz/shared.py)
+
+example (from the notebooks directory):
+    panel serve postevent/viz/app.py --args post_event_config_teehrhub.json
+
+then open, e.g.,
+    http://<host>:5006/app?event=<event_name>&dashboard=ts_summary
+
+optional url arguments: forecast_config (default short_range) and
+units (default english)
+'''
+import os
+import sys
+import panel as pn
+
+from pathlib import Path
+
+# panel serve runs this file as a script, make the package importable
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from postevent import config
+from postevent.viz import (
+    shared,
+    build_observed,
+    build_ts_summary,
+    build_ts_byforecast,
+    build_ts_byforecast_precip,
+    build_contingency,
+    build_qaqc,
+)
+
+# dashboards - build module and the explorer options of the shared
+# product (dashboards with the same options share one product)
+DASHBOARDS = dict(
+    observed_summary = dict(
+        module=build_observed,
+        explorer_params=dict(map_polygons='huc10', ts_polygons='huc10'),
+    ),
+    forecast_error_summary = dict(
+        module=build_ts_summary,
+        explorer_params=dict(map_polygons='huc10', ts_polygons='usgs_basins'),
+    ),
+    streamflow_diff = dict(
+        module=build_ts_byforecast,
+        explorer_params=dict(map_polygons='huc10', ts_polygons='huc10'),
+    ),
+    precip_diff = dict(
+        module=build_ts_byforecast_precip,
+        explorer_params=dict(map_polygons='huc10', ts_polygons='huc10'),
+    ),
+    contingency = dict(
+        module=build_contingency,
+        explorer_params=dict(map_polygons='huc10', ts_polygons='huc10'),
+    ),
+    qaqc = dict(
+        module=build_qaqc,
+        explorer_params=dict(map_polygons='huc10', ts_polygons='huc10'),
+    ),
+)
+# options common to all served explorers
+SERVER_EXPLORER_PARAMS = dict(
+    explore_precip=True,
+    explore_streamflow=True,
+    use_render_cache=True,
+    use_snapshot=True,
+)
+
+
+def get_config_file() -> str:
+    '''
+    Config file from the 'panel serve --args' or POSTEVENT_CONFIG
+    '''
+    if len(sys.argv) > 1:
+        return sys.argv[1]
+    return os.environ.get('POSTEVENT_CONFIG', 'post_event_config_teehrhub.json')
+
+def get_session_arg(
+    name: str,
+    default: str = None
+) -> str:
+
+    values = pn.state.session_args.get(name)
+    if not values:
+        return default
+    return values[0].decode()
+
+def build_index(
+    config_file: str
+) -> pn.layout:
+    '''
+    Landing page - links to each dashboard for each prepared event
+    '''
+    paths = config.Paths(config_file)
+    lines = ["## Post-Event Evaluation Dashboards"]
+    for event_name in paths.existing_events.keys():
+        links = ", ".join(
+            f"[{dashboard}](?event={event_name}&dashboard={dashboard})"
+            for dashboard in DASHBOARDS
+        )
+        lines.append(f"- **{event_name}**: {links}")
+
+    return pn.Column(pn.pane.Markdown("\n".join(lines)))
+
+def build_session(
+    config_file: str,
+    event_name: str,
+    dashboard: str,
+    forecast_config: str = 'short_range',
+    units: str = 'english',
+) -> pn.layout:
+    '''
+    Dashboard for one session, built on the shared product
+    '''
+    if dashboard not in DASHBOARDS:
+        raise ValueError(f"Dashboard {dashboard} not recognized, "\
+                         f"options are {list(DASHBOARDS.keys())}")
+    spec = DASHBOARDS[dashboard]
+
+    shared_explorer = shared.get_shared_product(
+        config_file,
+        event_name,
+        forecast_config,
+        units,
+        restrict_to_event_period=True,
+        explorer_params=dict(SERVER_EXPLORER_PARAMS, **spec['explorer_params']),
+    )
+    session_explorer = shared.get_session_explorer(shared_explorer)
+
+    return spec['module'].build(
+        session_explorer,
+        restrict_to_event_period=True
+    )
+
+
+pn.extension()
+
+config_file = get_config_file()
+event_name = get_session_arg('event')
+
+if event_name is None:
+    layout = build_index(config_file)
+else:
+    layout = build_session(
+        config_file,
+        event_name,
+        get_session_arg('dashboard', 'observed_summary'),
+        get_session_arg('forecast_config', 'short_range'),
+        get_session_arg('units', 'english'),
+    )
+
+layout.servable(title="Post-Event Evaluation")
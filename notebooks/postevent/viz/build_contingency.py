@@ -11,14 +11,22 @@ from bokeh.models import HoverTool
 from . import class_explorer
 from . import common
 
+# explorer data products used on launch (others computed on first use)
+DATA_PRODUCTS = [
+    'get_flow_metrics',
+]
+
 def build(
     dash_class: class_explorer.ForecastExplorer,
     restrict_to_event_period: bool = False, 
 ) -> pn.layout:
 
     
-    if 'flow_metrics_gdf' not in dir(dash_class):
-        dash_class.initialize(restrict_to_event_period)  
+    if not dash_class.is_initialized:
+        dash_class.initialize(
+            restrict_to_event_period, 
+            products=DATA_PRODUCTS
+        )  
     dash_class.get_forecasts = True
 
     title_dates \
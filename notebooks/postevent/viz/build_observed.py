@@ -10,7 +10,17 @@ from bokeh.models import HoverTool
 
 from . import class_explorer
 from . import common
-                 
+
+# explorer data products used on launch (others computed on first use)
+DATA_PRODUCTS = [
+    'get_precip_obs_summary',
+    'get_precip_ts_poly',
+    'get_precip_obs_colorbar_lims',
+    'get_flow_obs_summary',
+    'get_flow_obs_points',
+    'get_initial_selection_observed',
+]
+
 def build(
     dash_class: class_explorer.ForecastExplorer,
     restrict_to_event_period: bool = False, 
@@ -24,11 +34,18 @@ def build(
 
     # initialized the dash_class to get the data, 
     # if not already for another dashboard
-    if 'flow_metrics_gdf' not in dir(dash_class):
-        dash_class.initialize(restrict_to_event_period)  
+    if not dash_class.is_initialized:
+        dash_class.initialize(
+            restrict_to_event_period, 
+            products=DATA_PRODUCTS
+        )  
+
+    # initial selection for this dashboard (kept if already set by it, 
+    # replaced if set by a dashboard of the other kind)
+    dash_class.get_data_product('get_initial_selection_observed')
 
-    # read usgs_basin precip for ROC calcs
-    dash_class.get_usgs_basin_precip()
+    # read usgs_basin precip for ROC calcs (unless shared or already read)
+    dash_class.get_data_product('get_usgs_basin_precip')
 
     title_dates \
       = f"{dash_class.dates.analysis_time_start.strftime('%Y-%m-%d %Hz')} to " \
@@ -46,7 +63,7 @@ def build(
     if precip_value_max:
         precip_value_clim = (0, precip_value_max)
     else:
-        precip_value_clim = dash_class.precip_clims['value']
+        precip_value_clim = dash_class.precip_obs_clims['value']
 
     if flow_value_max:
         flow_value_clim = (0, flow_value_max)
@@ -11,13 +11,21 @@ from bokeh.models import HoverTool
 
 from . import common
 
+# explorer data products used on launch (others computed on first use)
+DATA_PRODUCTS = [
+    'get_flow_metrics',
+]
+
 def build(
     dash_class, 
     restrict_to_event_period = False, 
 ):
     # initialize data
-    if 'flow_metrics_gdf' not in dir(dash_class):
-        dash_class.initialize(restrict_to_event_period)  
+    if not dash_class.is_initialized:
+        dash_class.initialize(
+            restrict_to_event_period, 
+            products=DATA_PRODUCTS
+        )  
     dash_class.get_forecasts = True
 
     # get date strings for plot titles and filenames
@@ -2,15 +2,19 @@
 build observed summary dashboard
 '''
 import panel as pn
-import datashader as ds
 import holoviews as hv
 hv.extension('bokeh', logo=False)
 
-from holoviews.operation.datashader import rasterize
 from bokeh.models import HoverTool
 
 from . import class_explorer, common, legends
-                 
+
+# explorer data products used on launch (others computed on first use)
+DATA_PRODUCTS = [
+    'get_date_lists',
+    'get_initial_selection',
+]
+
 def build(
     dash_class: class_explorer.ForecastExplorer,
     restrict_to_event_period: bool = False, 
@@ -22,8 +26,15 @@ def build(
     ts_cmap: list = []
 ):   
     pn.config.throttled = True
-    if 'precip_metrics_gdf' not in dir(dash_class):
-        dash_class.initialize(restrict_to_event_period)  
+    if not dash_class.is_initialized:
+        dash_class.initialize(
+            restrict_to_event_period, 
+            products=DATA_PRODUCTS
+        )  
+
+    # initial selection for this dashboard (kept if already set by it, 
+    # replaced if set by a dashboard of the other kind)
+    dash_class.get_data_product('get_initial_selection')
     dash_class.get_forecasts = True
     dash_class.get_cumulative = True
     
@@ -128,21 +139,9 @@ def build(
     
     #### setup precip components
     
-    precip_obs_raster = rasterize(
-        hv.DynamicMap(dash_class.get_precip_obs_polygons_reftime), 
-        aggregator=ds.mean('primary_sum'), 
-        precompute=True
-    )
-    precip_fcst_raster = rasterize(
-        hv.DynamicMap(dash_class.get_precip_fcst_polygons_reftime), 
-        aggregator=ds.mean('secondary_sum'), 
-        precompute=True
-    )
-    precip_diff_raster = rasterize(
-        hv.DynamicMap(dash_class.get_precip_diff_polygons_reftime), 
-        aggregator=ds.mean('sum_diff'), 
-        precompute=True
-    )    
+    precip_obs_raster = common.get_precip_raster_reftime(dash_class, 'primary_sum')
+    precip_fcst_raster = common.get_precip_raster_reftime(dash_class, 'secondary_sum')
+    precip_diff_raster = common.get_precip_raster_reftime(dash_class, 'sum_diff')
 
     precip_obs_raster.opts(
         **raster_opts,
@@ -11,7 +11,16 @@ from bokeh.models import HoverTool
 from . import class_explorer
 from . import common
 from . import legends
-                 
+
+# explorer data products used on launch (others computed on first use)
+DATA_PRODUCTS = [
+    'get_precip_obs_summary',
+    'get_precip_metrics',
+    'get_flow_obs_summary',
+    'get_flow_metrics',
+    'get_initial_selection',
+]
+
 def build(
     dash_class: class_explorer.ForecastExplorer,
     restrict_to_event_period: bool = False, 
@@ -21,8 +30,15 @@ def build(
     flow_diff_max: float = None,
     ts_cmap: list = []
 ):   
-    if 'flow_metrics_gdf' not in dir(dash_class):
-        dash_class.initialize(restrict_to_event_period)  
+    if not dash_class.is_initialized:
+        dash_class.initialize(
+            restrict_to_event_period, 
+            products=DATA_PRODUCTS
+        )  
+
+    # initial selection for this dashboard (kept if already set by it, 
+    # replaced if set by a dashboard of the other kind)
+    dash_class.get_data_product('get_initial_selection')
     dash_class.get_forecasts = True
 
     if precip_value_max:
@@ -21,6 +21,8 @@ from shapely import Point
 from .. import utils
 from .. import config
 from . import data
+from . import render_cache
+from . import snapshot
 
 import importlib
 importlib.reload(utils)
@@ -56,37 +58,202 @@ class ForecastExplorer(param.Parameterized):
     reach_set = param.String(default='gages')    
     map_polygons = param.String(default='huc10')  
     ts_polygons = param.String(default='huc10')  
-
-    # holoviews streams
+    # compute flow metrics in location batches streamed to the event
+    # metrics store (always used for the 'all' reach set)
+    out_of_core_metrics = param.Boolean(False)
+    metrics_batch_size = param.Integer(default=500)
+    # optional dask distributed client (e.g., setup.load.get_client), 
+    # if provided, metrics are partitioned by location across the workers
+    client = param.Parameter(default=None)
+    # serve rasterized polygon layers from the process-wide render cache
+    # (static images at a fixed resolution, shared across sessions)
+    use_render_cache = param.Boolean(False)
+    # restore initialized data from (and save it to) an Arrow snapshot 
+    # in the event snapshots directory
+    use_snapshot = param.Boolean(False)
+
+    # holoviews streams (replaced per instance in __init__, so 
+    # selections are not shared between explorers/sessions)
     coord_stream = hv.streams.Tap(x=np.nan, y=np.nan)
     point_stream = hv.streams.Selection1D(index=[np.nan])
 
+    # data products, computed by initialize or on first access - 
+    # method: (attributes set by the method, methods whose attributes 
+    # it uses, i.e., the products to invalidate with it)
+    DATA_PRODUCTS = dict(
+        get_precip_obs_summary = (
+            ['precip_obs_gdf', 'precip_obs_max'],
+            []
+        ),
+        get_precip_metrics = (
+            ['precip_metrics_gdf', 'map_polys_gdf', 
+             'precip_poly_max', 'precip_hourly_max'],
+            []
+        ),
+        get_precip_ts_poly = (
+            ['ts_polys_gdf'],
+            ['get_precip_obs_summary']
+        ),
+        get_precip_colorbar_lims = (
+            ['precip_clims'],
+            ['get_precip_metrics']
+        ),
+        get_precip_obs_colorbar_lims = (
+            ['precip_obs_clims'],
+            ['get_precip_obs_summary']
+        ),
+        get_precip_timeseries_plot_opts = (
+            ['precip_hourly_ts_opts', 'precip_cumul_ts_opts'],
+            ['get_precip_metrics', 'get_precip_obs_summary']
+        ),
+        get_usgs_basin_precip = (
+            ['precip_usgs_gdf'],
+            ['get_precip_obs_summary']
+        ),
+        get_flow_obs_summary = (
+            ['flow_obs_gdf', 'flow_location_max', 'flow_location_max_cum'],
+            []
+        ),
+        get_flow_obs_points = (
+            ['flow_obs_points_gdf'],
+            ['get_flow_obs_summary']
+        ),
+        get_flow_metrics = (
+            ['flow_metrics_gdf', 'flow_points_gdf', 'flow_points_max', 
+             'nan_gdf', 'zero_gdf', 'all_peaks_max', 'all_peaks_max_norm'],
+            []
+        ),
+        get_date_lists = (
+            ['ref_time_list', 'ref_time_list_str'],
+            ['get_precip_metrics', 'get_flow_metrics']
+        ),
+        get_empty_ts_curve = (
+            ['empty_ts_curve'],
+            []
+        ),
+        # the selection products both set point_id, point_name and 
+        # ts_poly_id - each is memoized by its own flag and invalidates
+        # the other, so the last one requested sets the selection
+        get_initial_selection = (
+            ['initial_selection'],
+            ['get_precip_metrics', 'get_precip_ts_poly', 'get_flow_metrics']
+        ),
+        get_initial_selection_observed = (
+            ['initial_selection_observed'],
+            ['get_precip_obs_summary', 'get_flow_obs_summary']
+        ),
+    )
+    # data products not run by default, for the dashboards that use them
+    OPTIONAL_PRODUCTS = [
+        'get_usgs_basin_precip',
+        'get_precip_obs_colorbar_lims',
+        'get_flow_obs_points',
+        'get_initial_selection_observed',
+    ]
+
+    def __init__(self, **params):
+        super().__init__(**params)
+        self.coord_stream = hv.streams.Tap(x=np.nan, y=np.nan)
+        self.point_stream = hv.streams.Selection1D(index=[np.nan])
+        self.is_initialized = False
+
+    def __getattr__(self, name):
+        '''
+        compute data products on first access (only called if the 
+        attribute is not already set)
+        '''
+        if not name.startswith('_') and self.__dict__.get('is_initialized'):
+            for method_name, (attributes, inputs) in self.DATA_PRODUCTS.items():
+                if name in attributes:
+                    self.get_data_product(method_name)
+                    if name in self.__dict__:
+                        return self.__dict__[name]
+                    break
+        raise AttributeError(
+            f"'{type(self).__name__}' object has no attribute '{name}'"
+        )
+
+    def get_data_product(self, method_name):
+        '''
+        run the method for a data product, unless its attributes are 
+        already set (memoized)
+        '''
+        attributes, inputs = self.DATA_PRODUCTS[method_name]
+        if all(a in self.__dict__ for a in attributes):
+            return
+        in_progress = self.__dict__.setdefault('_products_in_progress', set())
+        if method_name in in_progress:
+            return
+        in_progress.add(method_name)
+        try:
+            with utils.timing.timer(method_name, 'product'):
+                getattr(self, method_name)()
+        finally:
+            in_progress.discard(method_name)
+
+    def invalidate_data_product(self, method_name):
+        '''
+        remove the attributes of a data product and of all products
+        that use it, they are recomputed on next access
+        '''
+        attributes, inputs = self.DATA_PRODUCTS[method_name]
+        for attribute in attributes:
+            self.__dict__.pop(attribute, None)
+        for dependent, (_, dependent_inputs) in self.DATA_PRODUCTS.items():
+            if method_name in dependent_inputs:
+                self.invalidate_data_product(dependent)
+
+    def get_default_products(self) -> list:
+        '''
+        all data products for the explored variables (in order)
+        '''
+        products = []
+        if self.explore_precip:
+            products += [
+                'get_precip_obs_summary',
+                'get_precip_metrics',
+                'get_precip_ts_poly',
+                'get_precip_colorbar_lims',
+                'get_precip_timeseries_plot_opts',
+            ]
+        if self.explore_streamflow:
+            products += [
+                'get_flow_obs_summary',
+                'get_flow_metrics',
+            ]
+        products += ['get_date_lists', 'get_initial_selection']
+
+        return products
     
     def initialize(
         self, 
         restrict_to_event_period = False,
+        products = None,
     ):
         '''
         initialize settings and data
+
+        products: list of DATA_PRODUCTS methods to compute now (default
+        all for the explored variables), others are computed on first
+        access, so dashboards only run the queries they use
         '''
+        if self.use_snapshot and \
+            snapshot.read_snapshot(self, restrict_to_event_period):
+            return
     
         # flag to restrict the analysis to include only time steps 
         # overlapping the event dates, rather than all timesteps in the
         # forecasts (empty list if not defined)
         self.dates.get_analysis_value_times(restrict_to_event_period)
 
-        # get data
-        if self.explore_precip:
-            self.get_precip()
         if self.explore_streamflow:
             self.paths.set_streamflow_paths(
                 nwm_version = self.event.nwm_version, 
                 domain=self.event.domain, 
                 reach_set=self.reach_set
             )
-            self.get_flow()
 
-        # Initialize other attributes
+        # Initialize other attributes (no queries)
 
         self.get_unit_labels() 
         
@@ -100,29 +267,66 @@ class ForecastExplorer(param.Parameterized):
             height=300,            
             border=5
         )
+        self.get_value_time_lists()
 
         # for dashboards only including precip
         if self.explore_precip:
-            self.get_date_lists(self.precip_metrics_gdf)
-            self.get_precip_colorbar_lims()        
             self.get_precip_colormaps()                               
-            self.get_precip_timeseries_plot_opts()
             self.get_cumulative = True
             self.get_location_forecasts = True
             self.count_precip_queries = 0
 
         # for dashboards only including streamflow
         if self.explore_streamflow:
-            self.get_date_lists(self.flow_metrics_gdf)
             self.get_flow_colorbar_lims()
             self.get_flow_colormaps()
-            self.point_id = self.flow_points_max['primary_location_id'].iloc[0]
-            self.point_name = self.flow_points_max['name'].iloc[0]
             self.get_flow_timeseries_plot_opts()
             self.get_location_forecasts = True
             self.get_cumulative = True
             self.count_flow_queries = 0
 
+        self.ts_cmap = []
+        self.is_initialized = True
+
+        # get data
+        all_products = products is None
+        if all_products:
+            products = self.get_default_products()
+        products = [
+            p for p in products 
+            if p in self.get_default_products() + self.OPTIONAL_PRODUCTS
+        ]
+        for method_name in products:
+            self.get_data_product(method_name)
+
+        # only complete data is saved
+        if self.use_snapshot and all_products:
+            snapshot.write_snapshot(self, restrict_to_event_period)
+
+    def get_initial_selection(self):
+        '''
+        initial point and MAP polygon selections
+        '''
+        self.invalidate_data_product('get_initial_selection_observed')
+        self.point_id = None
+        self.point_name = None
+        self.ts_poly_id = None
+
+        # for dashboards only including precip - polygon with max obs
+        # precip (or first usgs basin)
+        if self.explore_precip and not self.explore_streamflow:
+            if self.map_polygons == self.ts_polygons:
+                self.ts_poly_id = self.precip_poly_max[
+                    'primary_location_id'
+                ].iloc[0]
+            elif self.ts_polygons == 'usgs_basins':
+                self.ts_poly_id = self.ts_polys_gdf['id'].iloc[0]
+
+        # for dashboards only including streamflow
+        if self.explore_streamflow:
+            self.point_id = self.flow_points_max['primary_location_id'].iloc[0]
+            self.point_name = self.flow_points_max['name'].iloc[0]
+
         # for dashboards including both
         if self.explore_precip and self.explore_streamflow:
 
@@ -163,8 +367,67 @@ class ForecastExplorer(param.Parameterized):
                     ]
                 self.ts_poly_id = nearest_ts_poly['id'].iloc[0]
 
-        self.ts_cmap = []
+        self.initial_selection = True
+
+    def get_initial_selection_observed(self):
+        '''
+        initial point and MAP polygon selections from the observed 
+        data only (no forecast metrics), for observed dashboards
+        '''
+        self.invalidate_data_product('get_initial_selection')
+        self.point_id = None
+        self.point_name = None
+        self.ts_poly_id = None
+        if self.explore_precip:
+            max_polygon = self.precip_obs_gdf.loc[
+                self.precip_obs_gdf['sum'] == self.precip_obs_gdf['sum'].max()
+            ].iloc[0]
+            if self.map_polygons == self.ts_polygons:
+                self.ts_poly_id = max_polygon['location_id']
+            elif self.ts_polygons == 'usgs_basins':
+                basin_ids = self.geo.usgs_basins.loc[
+                    self.geo.usgs_basins['id'].isin(
+                        self.event.usgs_id_list_with_prefix
+                    ),
+                    'id'
+                ]
+                self.ts_poly_id = basin_ids.iloc[0]
 
+        # for dashboards only including streamflow - highest 
+        # normalized observed peak
+        if self.explore_streamflow:
+            gdf = self.flow_obs_gdf.dropna(subset=['max_norm'])
+            max_point = gdf.loc[gdf['max_norm'] == gdf['max_norm'].max()]
+            self.point_id = max_point['location_id'].iloc[0]
+            self.point_name = max_point['name'].iloc[0]
+
+        # for dashboards including both - point closest to the
+        # polygon with the most observed precip
+        if self.explore_precip and self.explore_streamflow:
+            gdf = self.flow_obs_gdf[['location_id','geometry','name']]
+            if self.ts_polygons == 'usgs_basins':
+                # not all usgs basins have boundaries defined (yet)
+                gdf = gdf[gdf['location_id'].isin(self.geo.usgs_basins['id'])]
+            min_point = min(
+                gdf['geometry'], 
+                key=max_polygon['geometry'].distance
+            )
+            selected_point = gdf[gdf['geometry'] == min_point]
+            self.point_id = selected_point['location_id'].iloc[0]
+            self.point_name = selected_point['name'].iloc[0]
+
+            # set initial MAP polygon
+            if self.ts_polygons == 'usgs_basins':
+                self.ts_poly_id = self.point_id
+            else:
+                point = selected_point['geometry'].iloc[0]
+                containing = self.precip_obs_gdf[
+                    self.precip_obs_gdf['geometry'].contains(point)
+                ]
+                if len(containing) > 0:
+                    self.ts_poly_id = containing['location_id'].iloc[0]
+
+        self.initial_selection_observed = True
 
     
     ######################## precip methods
@@ -195,12 +458,21 @@ class ForecastExplorer(param.Parameterized):
         '''
 
         # get precip totals and difference
-        self.precip_metrics_gdf = data.teehr_get_precip_metrics(
-            self.paths, 
-            self.event, 
-            self.dates, 
-            polygons = self.map_polygons, 
-        )
+        if self.client is not None:
+            self.precip_metrics_gdf = data.teehr_get_precip_metrics_distributed(
+                self.paths, 
+                self.event, 
+                self.dates, 
+                self.client,
+                polygons = self.map_polygons, 
+            )
+        else:
+            self.precip_metrics_gdf = data.teehr_get_precip_metrics(
+                self.paths, 
+                self.event, 
+                self.dates, 
+                polygons = self.map_polygons, 
+            )
 
         # subset of polygons included in the precip metrics query
         self.map_polys_gdf = self.precip_metrics_gdf[
@@ -223,18 +495,17 @@ class ForecastExplorer(param.Parameterized):
 
     def get_precip_ts_poly(self):
     
-        # assign the polygons and initial selection for MAP 
-        # time series plots
+        # assign the polygons for MAP time series plots (the initial 
+        # selection is set by get_initial_selection), from the observed
+        # totals so the observed dashboards do not need the metrics
 
         # if the polygons to use in the map and time series plots
         # are the same:
         if self.map_polygons == self.ts_polygons: 
-            self.ts_polys_gdf = self.map_polys_gdf
-            self.ts_poly_id = self.precip_poly_max[
-                'primary_location_id'
-            ].iloc[0]
-            self.ts_polys_gdf = self.ts_polys_gdf.rename(
-                columns = {'primary_location_id':'id'}
+            self.ts_polys_gdf = self.precip_obs_gdf[
+                ['location_id','geometry']
+            ].rename(
+                columns = {'location_id':'id'}
             )
         # otherwise the time series plots use usgs_basins
         elif self.ts_polygons == 'usgs_basins':
@@ -243,7 +514,6 @@ class ForecastExplorer(param.Parameterized):
                     self.event.usgs_id_list_with_prefix
                 )
             ]
-            self.ts_poly_id = self.ts_polys_gdf['id'].iloc[0]      
 
     def get_usgs_basin_precip(self):
 
@@ -256,7 +526,7 @@ class ForecastExplorer(param.Parameterized):
                 self.dates, 
                 polygons='usgs_basins', 
             )     
-        elif get_runoff_coeff and self.map_polygons == 'usgs_basins':
+        else:
             self.precip_usgs_gdf = self.precip_obs_gdf    
     
     def get_precip_colorbar_lims(self):
@@ -277,6 +547,27 @@ class ForecastExplorer(param.Parameterized):
                        self.precip_metrics_gdf['sum_diff'].max())
 
         self.precip_clims['sum_diff']=(-diff_max, diff_max)
+
+    def get_precip_obs_colorbar_lims(self):
+        '''
+        colorbar limits from the observed totals (no forecast metrics), 
+        for observed dashboards
+        '''
+        self.precip_obs_clims = {}
+        value_max = self.precip_obs_gdf['sum'].max()
+        if value_max > 5:
+            self.precip_obs_clims['value']=(0, value_max)        
+        else:
+            self.precip_obs_clims['value']=(0, 5)   
+
+    def get_precip_value_clim(self) -> tuple:
+        '''
+        precip value limits - from the forecast metrics, or from the 
+        observed totals if forecasts are not shown (observed dashboards)
+        '''
+        if self.get_location_forecasts:
+            return self.precip_clims['value']
+        return self.precip_obs_clims['value']
            
     def get_precip_colormaps(self):
         ''' 
@@ -348,7 +639,7 @@ class ForecastExplorer(param.Parameterized):
             self.precip_obs_ts['cumulative'] = \
                 self.precip_obs_ts['value_fill_zero'].cumsum()
             self.precip_cumulative_max = max(
-                self.precip_clims['value'][1], 
+                self.get_precip_value_clim()[1], 
                 self.precip_obs_ts['cumulative'].max()
             )*1.05
 
@@ -401,7 +692,7 @@ class ForecastExplorer(param.Parameterized):
                     self.precip_all_fcst_with_t0['cumulative_from_t0'].max()
                 )
                 self.precip_cumulative_max = max(
-                    self.precip_clims['value'][1], 
+                    self.get_precip_value_clim()[1], 
                     precip_cumulative_max
                 )*1.05
     
@@ -480,6 +771,15 @@ class ForecastExplorer(param.Parameterized):
         '''
     
         '''
+        if self.use_render_cache:
+            return render_cache.get_cached_raster(
+                self.get_render_event_key(),
+                'precip_obs_total',
+                lambda: self.precip_obs_gdf,
+                'sum',
+                self.geo.map_limits,
+                cmap=self.precip_cmap,
+            )
         obs_gv = gv.Polygons(self.precip_obs_gdf, vdims=['sum'])
         obs_raster = rasterize(
             obs_gv, 
@@ -495,14 +795,16 @@ class ForecastExplorer(param.Parameterized):
         '''
     
         '''
-        gdf = self.precip_metrics_gdf
-        ave_df = gdf[
-            ['primary_location_id','sum_diff','geometry']
-            ].groupby('primary_location_id').agg(
-            {'sum_diff':'mean', 'geometry':'first'}
-            ).reset_index()
-        
-        ave_gdf = gpd.GeoDataFrame(ave_df)
+        if self.use_render_cache:
+            return render_cache.get_cached_raster(
+                self.get_render_event_key(),
+                'precip_ave_difference',
+                self.get_precip_ave_difference_gdf,
+                'sum_diff',
+                self.geo.map_limits,
+                cmap=self.precip_diff_cmap,
+            )
+        ave_gdf = self.get_precip_ave_difference_gdf()
         ave_gv = gv.Polygons(
             ave_gdf, 
             vdims=['sum_diff']
@@ -517,6 +819,35 @@ class ForecastExplorer(param.Parameterized):
         )           
         return diff_raster
 
+    def get_precip_ave_difference_gdf(self):
+        '''
+        average forecast precip difference (across reference times) 
+        per polygon
+        '''
+        gdf = self.precip_metrics_gdf
+        ave_df = gdf[
+            ['primary_location_id','sum_diff','geometry']
+            ].groupby('primary_location_id').agg(
+            {'sum_diff':'mean', 'geometry':'first'}
+            ).reset_index()
+        
+        return gpd.GeoDataFrame(ave_df, crs=gdf.crs)
+
+    def get_render_event_key(self):
+        '''
+        identifies the event data behind cached renders
+        '''
+        return (
+            self.paths.event_name,
+            self.paths.forecast_config,
+            self.paths.units,
+            self.map_polygons,
+            self.dates.ref_time_start,
+            self.dates.ref_time_end,
+            self.dates.analysis_time_start,
+            self.dates.analysis_time_end,
+        )
+
     def get_precip_polygon_centroids(self):
         '''
     
@@ -543,13 +874,19 @@ class ForecastExplorer(param.Parameterized):
             self.analysis_value_time_list_df['value_time'].min(), 
             self.analysis_value_time_list_df['value_time'].max()
         )
+        # hourly max of obs and forecasts, or of the obs only if 
+        # forecasts are not shown (observed dashboards)
+        if self.get_location_forecasts:
+            hourly_max = self.precip_hourly_max
+        else:
+            hourly_max = self.precip_obs_gdf['max'].max()
         
         self.precip_hourly_ts_opts = dict(
             self.static_ts_opts,
             width=600,
             ylim=(
-                -self.precip_hourly_max*0.05, 
-                self.precip_hourly_max*1.05
+                -hourly_max*0.05, 
+                hourly_max*1.05
             ),
             xlim=xlim,
             xticks=tick_labels,
@@ -583,7 +920,9 @@ class ForecastExplorer(param.Parameterized):
         '''
     
         '''
-        curve = hv.Curve((self.ref_time_list[0], 0)).opts(
+        curve = hv.Curve(
+            (self.analysis_value_time_list_df['value_time'].iloc[0], 0)
+        ).opts(
             **opts,     
             tools=["pan","box_zoom","reset","hover"],
             title='NO DATA (Polygon unavailable or outside region)',
@@ -624,6 +963,52 @@ class ForecastExplorer(param.Parameterized):
         ]                                            
         return gv.Polygons(precip_sums_ref, vdims=['sum_diff']) 
     
+    def get_precip_polygons_reftime_gdf(self, ref_time_str):
+        '''
+        precip metrics polygons for a single reference time
+        '''
+        ref_time = dt.datetime.strptime(ref_time_str, '%Y-%m-%d %Hz')
+        return self.precip_metrics_gdf[
+            self.precip_metrics_gdf['reference_time'] == ref_time
+        ]
+
+    def get_cached_precip_raster_reftime(self, column, cmap):
+        '''
+        rasterized precip polygons for the current reference time 
+        from the render cache
+        '''
+        ref_time_str = self.ref_time_str
+        return render_cache.get_cached_raster(
+            self.get_render_event_key(),
+            'precip_' + column + '_reftime',
+            lambda: self.get_precip_polygons_reftime_gdf(ref_time_str),
+            column,
+            self.geo.map_limits,
+            ref_time_str=ref_time_str,
+            cmap=cmap,
+        )
+
+    @param.depends("ref_time_str")
+    def get_precip_obs_raster_reftime(self):
+        return self.get_cached_precip_raster_reftime(
+            'primary_sum', 
+            self.precip_cmap
+        )
+
+    @param.depends("ref_time_str")
+    def get_precip_fcst_raster_reftime(self):
+        return self.get_cached_precip_raster_reftime(
+            'secondary_sum', 
+            self.precip_cmap
+        )
+
+    @param.depends("ref_time_str")
+    def get_precip_diff_raster_reftime(self):
+        return self.get_cached_precip_raster_reftime(
+            'sum_diff', 
+            self.precip_diff_cmap
+        )
+    
     @param.depends("coord_stream.x", "coord_stream.y", 
                    "point_stream.index")
     def get_precip_obs_timeseries_hourly_bars(self):
@@ -1044,6 +1429,31 @@ class ForecastExplorer(param.Parameterized):
         self.flow_location_max = flow_obs_gdf['max'].max()
         self.flow_location_max_cum = flow_obs_gdf['sum_norm'].max()
 
+    def get_flow_obs_points(self):
+        '''
+        gage points from the observed flow characteristics (no forecast
+        metrics), with the flow_points_gdf columns used for selections, 
+        for observed dashboards
+        '''
+        flow_obs_points_gdf = self.flow_obs_gdf[
+            ['location_id','geometry','name','drainage_area','hw_threshold']
+        ].rename(
+            columns = {'location_id':'primary_location_id'}
+        )
+        flow_obs_points_gdf['any_obs_exceed'] = \
+            self.flow_obs_gdf['max'] > self.flow_obs_gdf['hw_threshold']
+        self.flow_obs_points_gdf = flow_obs_points_gdf
+
+    def get_flow_points(self) -> gpd.GeoDataFrame:
+        '''
+        gage points for selections - from the forecast metrics, or from
+        the observed characteristics if forecasts are not shown 
+        (observed dashboards)
+        '''
+        if self.get_location_forecasts:
+            return self.flow_points_gdf
+        return self.flow_obs_points_gdf
+
 
     def get_flow_metrics(self):
         '''
@@ -1051,36 +1461,66 @@ class ForecastExplorer(param.Parameterized):
         '''
         ## get flow metrics (joining forecasts to obs)
 
-        flow_metrics_gdf = data.teehr_get_flow_metrics(
-            self.paths, 
-            self.event, 
-            self.dates, 
-        )
-        # # pull off locations/forecasts with nan for QA, usually reservoir features
-        # self.nan_gdf = flow_metrics_gdf[flow_metrics_gdf.isnull().any(axis=1)]
-
-        # drop NaN locations, cause errors in dashboards
-        # flow_metrics_gdf.dropna(inplace=True)
+        attributes_df = self.geo.usgs_points_subset[
+            ['id','name'] + self.geo.attribute_list
+        ]
+        # the out-of-core store bounds memory for large reach sets, 
+        # with or without a client
+        distributed = False
+        if self.out_of_core_metrics or self.reach_set == 'all':
+            flow_metrics_gdf = data.teehr_get_flow_metrics_out_of_core(
+                self.paths, 
+                self.event, 
+                self.dates, 
+                batch_size=self.metrics_batch_size,
+            )
+        elif self.client is not None:
+            # attributes and row-wise metrics are added on the workers
+            flow_metrics_gdf = data.teehr_get_flow_metrics_distributed(
+                self.paths, 
+                self.event, 
+                self.dates, 
+                self.client,
+                attributes_df=attributes_df,
+            )
+            distributed = True
+        else:
+            flow_metrics_gdf = data.teehr_get_flow_metrics(
+                self.paths, 
+                self.event, 
+                self.dates, 
+            )
 
-        # add attributes
-        flow_metrics_gdf = flow_metrics_gdf.merge(
-            self.geo.usgs_points_subset[['id','name'] + self.geo.attribute_list], 
-            how='left', 
-            left_on='primary_location_id', 
-            right_on='id'
-        )
-        flow_metrics_gdf = flow_metrics_gdf.drop(columns=['id'])
+        if not distributed:
+            # add attributes
+            flow_metrics_gdf = flow_metrics_gdf.merge(
+                attributes_df, 
+                how='left', 
+                left_on='primary_location_id', 
+                right_on='id'
+            )
+            flow_metrics_gdf = flow_metrics_gdf.drop(columns=['id'])
 
+        # check the queried metrics and attributes only - the derived 
+        # metrics (already added if distributed) may be NaN by design
+        check_columns = [
+            c for c in flow_metrics_gdf.columns 
+            if c not in data.DERIVED_FLOW_METRICS
+        ]
+        
         # pull off locations/forecasts with nan for QA, usually reservoir features
-        self.nan_gdf = flow_metrics_gdf[flow_metrics_gdf.isnull().any(axis=1)]
+        self.nan_gdf = flow_metrics_gdf[
+            flow_metrics_gdf[check_columns].isnull().any(axis=1)
+        ]
 
         # drop NaN locations, cause errors in dashboards
-        flow_metrics_gdf.dropna(inplace=True)
+        flow_metrics_gdf.dropna(subset=check_columns, inplace=True)
         
         # add metrics (not yet avail in teehr)
-        flow_metrics_gdf = data.add_percent_difference(flow_metrics_gdf)
-        flow_metrics_gdf = data.add_flow_exceedence(flow_metrics_gdf)   
-        flow_metrics_gdf = data.add_prior_signal_time(flow_metrics_gdf)
+        if not distributed:
+            flow_metrics_gdf = data.add_percent_difference(flow_metrics_gdf)
+            flow_metrics_gdf = data.add_flow_exceedence(flow_metrics_gdf)   
+            flow_metrics_gdf = data.add_prior_signal_time(flow_metrics_gdf)
         flow_metrics_gdf = data.add_normalized_peakflow(
             flow_metrics_gdf, 
             self.paths
@@ -1289,11 +1729,12 @@ class ForecastExplorer(param.Parameterized):
             = self.flow_obs_ts['value'].fillna(-1.0)
 
         # get hw threshold and upstream area
-        location_metrics_gdf = self.flow_metrics_gdf[
-            self.flow_metrics_gdf['primary_location_id'] == self.point_id
+        flow_points_gdf = self.get_flow_points()
+        location_gdf = flow_points_gdf[
+            flow_points_gdf['primary_location_id'] == self.point_id
         ]
-        self.hw_threshold = location_metrics_gdf['hw_threshold'].iloc[0]
-        self.drainage_area = location_metrics_gdf['drainage_area'].iloc[0]
+        self.hw_threshold = location_gdf['hw_threshold'].iloc[0]
+        self.drainage_area = location_gdf['drainage_area'].iloc[0]
 
         # add cumulative normalized volume
         self.flow_obs_ts = data.add_normalized_timeseries(
@@ -1344,6 +1785,39 @@ class ForecastExplorer(param.Parameterized):
             * self.flow_location_max          \
             / self.flow_location_max_cum      \
 
+    def select_point(self, point_id):
+        '''
+        Select a gage (and the corresponding time series polygon) 
+        without a click event, e.g., for headless exports. Streams 
+        are reset to the 'first pass' state so the time series 
+        callbacks use point_id and ts_poly_id directly.
+        '''
+        self.coord_stream.update(x=np.nan, y=np.nan)
+        self.point_stream.update(index=[np.nan])
+        
+        flow_points_gdf = self.get_flow_points()
+        point = flow_points_gdf[
+            flow_points_gdf['primary_location_id'] == point_id
+        ]
+        self.point_id = point_id
+        self.point_name = point['name'].iloc[0]
+
+        if self.explore_precip:
+            if self.ts_polygons == 'usgs_basins':
+                self.ts_poly_id = self.point_id
+                if not self.ts_poly_id in self.ts_polys_gdf['id'].to_list():
+                    self.ts_poly_id = None
+            else:
+                nearest_ts_poly = self.ts_polys_gdf[
+                    self.ts_polys_gdf['geometry'].contains(
+                        point['geometry'].iloc[0]
+                    )
+                ]
+                if nearest_ts_poly.empty:
+                    self.ts_poly_id = None
+                else:
+                    self.ts_poly_id = nearest_ts_poly['id'].iloc[0]
+
     def update_flow_timeseries_for_selected_point(self):
         '''
         Get obs and forecast flow time series for selected gage or 
@@ -1399,7 +1873,8 @@ class ForecastExplorer(param.Parameterized):
         '''
     
         '''
-        gdf_exceed = self.flow_points_gdf[self.flow_points_gdf['any_obs_exceed']]
+        flow_points_gdf = self.get_flow_points()
+        gdf_exceed = flow_points_gdf[flow_points_gdf['any_obs_exceed']]
         points = gv.Points(
             gdf_exceed, 
             vdims=['any_obs_exceed','primary_location_id']
@@ -1956,8 +2431,9 @@ class ForecastExplorer(param.Parameterized):
             point = gv.Points([])
         else:
             try:
-                gdf = self.flow_points_gdf[
-                    self.flow_points_gdf['primary_location_id'] == self.point_id
+                flow_points_gdf = self.get_flow_points()
+                gdf = flow_points_gdf[
+                    flow_points_gdf['primary_location_id'] == self.point_id
                 ]
                 gdf = gdf[['geometry','name']]
                 point = gv.Points(
@@ -2004,10 +2480,16 @@ class ForecastExplorer(param.Parameterized):
                 poly = gv.Polygons([])
         return poly    
         
-    def get_date_lists(self, gdf):
+    def get_date_lists(self, gdf = None):
         '''
     
         '''
+        if gdf is None:
+            if self.explore_streamflow:
+                gdf = self.flow_metrics_gdf
+            else:
+                gdf = self.precip_metrics_gdf
+
         self.ref_time_list = sorted(gdf['reference_time'].unique())
         self.ref_time_list_str = [
             t.strftime('%Y-%m-%d %Hz') for t in self.ref_time_list
@@ -2021,7 +2503,11 @@ class ForecastExplorer(param.Parameterized):
         else:
             self.ref_time_str = self.flow_points_max[
                 'reference_time'].min().strftime('%Y-%m-%d %Hz')
-            
+
+    def get_value_time_lists(self):
+        '''
+    
+        '''
         self.analysis_value_time_list_df = pd.DataFrame(
             pd.date_range(
                 self.dates.analysis_time_start, 
@@ -2044,9 +2530,13 @@ class ForecastExplorer(param.Parameterized):
         self.data_value_time_list_df \
             = self.data_value_time_list_df.astype('datetime64[us]')
 
+    def get_empty_ts_curve(self):
+        '''
+    
+        '''
         # empty_ts_curve
         self.empty_ts_curve = hv.Curve(
-            (self.ref_time_list[0], 0)
+            (self.analysis_value_time_list_df['value_time'].iloc[0], 0)
         ).opts(   
             tools=["pan","box_zoom","reset"],
             title='NO DATA (No point selected)',
@@ -2127,3 +2617,6 @@ class ForecastExplorer(param.Parameterized):
         ]
         return tick_labels
 
+
+# time all dashboard callbacks
+utils.timing.instrument_callbacks(ForecastExplorer)
@@ -5,13 +5,21 @@ elements used by multiple dashboards with default styles
 import panel as pn
 import holoviews as hv
 import geoviews as gv
+import datashader as ds
 import cartopy.crs as ccrs
 hv.extension('bokeh', logo=False)
 gv.extension('bokeh', logo=False)
 
+from holoviews.operation.datashader import rasterize
+
 from . import class_explorer
 from .. import config
 
+# alternate basemap tile server for all dashboards, e.g., a caching
+# tile proxy in front of CartoLight for multi-user deployments
+# (None uses CartoLight directly)
+BASEMAP_TILE_URL = None
+
 def get_states(
     geo: config.Geo
 ) -> gv.Polygons:
@@ -29,13 +37,52 @@ def get_states(
     )
     
 def get_basemap(
-    geo: config.Geo
+    geo: config.Geo,
+    tile_url: str = None,
 ) -> hv.Tiles:
-    return hv.element.tiles.CartoLight().opts(
+    '''
+    CartoLight basemap, or tiles from tile_url (default 
+    BASEMAP_TILE_URL) if defined
+    '''
+    if tile_url is None:
+        tile_url = BASEMAP_TILE_URL
+    if tile_url is not None:
+        tiles = hv.Tiles(tile_url)
+    else:
+        tiles = hv.element.tiles.CartoLight()
+    return tiles.opts(
         xlim=geo.map_limits['xlims_mercator'], 
         ylim=geo.map_limits['ylims_mercator'], 
     )    
 
+def get_precip_raster_reftime(
+    dash_class: class_explorer.ForecastExplorer,
+    column: str,
+) -> hv.DynamicMap:
+    '''
+    rasterized precip polygons (obs 'primary_sum', forecast 
+    'secondary_sum' or 'sum_diff') that update with the reference 
+    time - served from the render cache if enabled
+    '''
+    if dash_class.use_render_cache:
+        cached_functions = dict(
+            primary_sum = dash_class.get_precip_obs_raster_reftime,
+            secondary_sum = dash_class.get_precip_fcst_raster_reftime,
+            sum_diff = dash_class.get_precip_diff_raster_reftime,
+        )
+        return hv.DynamicMap(cached_functions[column])
+    
+    polygon_functions = dict(
+        primary_sum = dash_class.get_precip_obs_polygons_reftime,
+        secondary_sum = dash_class.get_precip_fcst_polygons_reftime,
+        sum_diff = dash_class.get_precip_diff_polygons_reftime,
+    )
+    return rasterize(
+        hv.DynamicMap(polygon_functions[column]), 
+        aggregator=ds.mean(column), 
+        precompute=True
+    )
+
 def get_ts_plot_adjust(
     dash_class: class_explorer.ForecastExplorer
 ):
@@ -5,6 +5,8 @@ TEEHR calls, and other evaluation data and metric utilities
 import pandas as pd
 import geopandas as gpd
 import numpy as np
+import duckdb
+import hashlib
 
 from typing import List, Union
 from pathlib import Path
@@ -13,8 +15,43 @@ import teehr.queries.duckdb as tqd
 import teehr.queries.utils as tqu
 
 from ..utils import convert
+from ..utils import timing
 from .. import config
 
+# metrics included in streamflow metric queries
+FLOW_METRIC_LIST = [
+    "primary_maximum",              
+    "secondary_maximum", 
+    "max_value_delta",
+    "primary_max_value_time",
+    "secondary_max_value_time",      
+    "max_value_timedelta",
+    "primary_count",
+    "secondary_count",
+    "primary_average",
+    "secondary_average",
+    "primary_minimum",
+    "secondary_minimum",
+    "mean_error",
+    "primary_sum",
+    "secondary_sum",
+    ]
+# row-wise metrics added to the streamflow metrics (add_percent_difference, 
+# add_flow_exceedence, add_prior_signal_time)
+DERIVED_FLOW_METRICS = [
+    "peak_percent_diff",
+    "vol_percent_diff",
+    "peak_time_diff_hours",
+    "obs_exceed",
+    "fcst_exceed",
+    "contingency_matrix",
+    "secondary_peak_timestep",
+    "primary_peak_timestep",
+    "prior_hw_signal",
+    "prior_hw_signal_time",
+    ]
+
+
 def build_teehr_filters(
     joined_query: bool = True,
     location_id: Union[str, List[str], None] = None,    
@@ -392,11 +429,78 @@ def get_ids_in_parquet_for_date_range(
 ########## teehr queries wrappers and utilities specifically for postevent - 
 ########## some of this functionality may eventually be added to teehr
 
+def teehr_query_with_units(
+    query_function,
+    to_units: str,
+    variable: str,
+    convert_in_query: bool = True,
+    con: Union[duckdb.DuckDBPyConnection, None] = None,
+    **query_kwargs,
+) -> Union[pd.DataFrame, gpd.GeoDataFrame]:
+    '''
+    Run a TEEHR query function (get_metrics, get_timeseries, 
+    get_timeseries_chars) and return the results in the to_units 
+    system (english or metric). 
+    
+    If convert_in_query is True, the TEEHR query string is wrapped in 
+    a DuckDB projection that scales the value and aggregate columns and 
+    rewrites measurement_unit, so converted data is returned directly 
+    from the parquet files. Otherwise the native units are returned 
+    and converted in pandas.
+    
+    con - DuckDB connection to run the query on (e.g., with its own 
+    settings), the default connection if None
+    '''
+    if not convert_in_query:
+        if con is None:
+            df = query_function(return_query=False, **query_kwargs)
+        else:
+            query = query_function(return_query=True, **query_kwargs)
+            df = con.sql(query.strip().rstrip(';')).df()
+            if query_kwargs.get('include_geometry', False):
+                df = tqu.df_to_gdf(df)
+        if not df.empty:
+            # freshly queried frame - no copy needed
+            df = convert.convert_query_units(
+                df, 
+                to_units, 
+                variable, 
+                inplace=True
+            )
+        return df
+    
+    if con is None:
+        con = duckdb
+    # strip any statement terminator so the query can be nested
+    query = query_function(return_query=True, **query_kwargs)
+    query = query.strip().rstrip(';')
+    
+    # binding the relation resolves the output columns without 
+    # executing the query
+    columns = con.sql(query).columns
+    projection = convert.get_query_unit_projection(
+        columns, 
+        to_units, 
+        variable
+    )
+    # the order of the wrapped query is not guaranteed to survive
+    order_by = query_kwargs.get('order_by')
+    order_sql = f" ORDER BY {', '.join(order_by)}" if order_by else ""
+    df = con.sql(f"SELECT {projection} FROM ({query}){order_sql}").df()
+    
+    if query_kwargs.get('include_geometry', False):
+        df = tqu.df_to_gdf(df)
+    
+    return df
+
+
+@timing.timed('query')
 def teehr_get_precip_metrics(
     paths: config.Paths, 
     event: config.Event, 
     dates: config.Dates, 
     polygons='huc10', 
+    convert_in_query: bool = True,
 ) -> gpd.GeoDataFrame:
     
     if polygons == 'huc10':
@@ -417,39 +521,154 @@ def teehr_get_precip_metrics(
         value_time_end=dates.analysis_time_end,
         value_min=0)
             
-    query_gdf = tqd.get_metrics(
-        forcing_filepaths['primary_filepath'],
-        forcing_filepaths['secondary_filepath'],
-        forcing_filepaths['crosswalk_filepath'],        
+    gdf = teehr_query_with_units(
+        tqd.get_metrics,
+        paths.units,
+        'precipitation',
+        convert_in_query=convert_in_query,
+        primary_filepath=forcing_filepaths['primary_filepath'],
+        secondary_filepath=forcing_filepaths['secondary_filepath'],
+        crosswalk_filepath=forcing_filepaths['crosswalk_filepath'],
         group_by=['primary_location_id','reference_time', 'measurement_unit'],
-        order_by=['primary_location_id','reference_time'], 
+        order_by=['primary_location_id','reference_time'],
         filters=filters,
-        return_query=False,
-        geometry_filepath=forcing_filepaths['geometry_filepath'],       
+        geometry_filepath=forcing_filepaths['geometry_filepath'],
         include_geometry=True,
         include_metrics=[
             'primary_sum',
-            'secondary_sum', 
-            'primary_maximum', 
+            'secondary_sum',
+            'primary_maximum',
             'secondary_maximum',
             'primary_count',
-            'secondary_count', 
+            'secondary_count',
         ],
     )    
-    if query_gdf.empty:
+    if gdf.empty:
         raise ValueError("TEEHR precipitation metrics query returned empty - "\
                          "confirm requested event data exists in parquet files")
     
-    gdf = convert.convert_query_units(query_gdf, paths.units, 'precipitation')
     gdf['sum_diff'] = gdf['secondary_sum'] - gdf['primary_sum']
     
     return gdf
 
+def get_forcing_locations(
+    paths: config.Paths, 
+    event: config.Event, 
+    polygons='huc10', 
+) -> tuple:
+    '''
+    Forcing filepaths and location id list for a MAP polygon layer
+    '''
+    if polygons == 'huc10':
+        forcing_filepaths = paths.forcing_filepaths
+        location_id_list = event.huc10_list
+    elif polygons == 'usgs_basins':
+        forcing_filepaths = paths.alt_forcing_filepaths
+        location_id_list = ['usgs-' + s for s in event.usgs_id_list]
+    else:
+        raise ValueError(f"invalid MAP polygon layer {polygons}")
+    
+    return forcing_filepaths, location_id_list
+
+@timing.timed('query')
+def teehr_get_precip_metrics_batch(
+    location_id_list: List[str],
+    forcing_filepaths: dict,
+    dates: config.Dates,
+    to_units: str,
+    convert_in_query: bool = True,
+) -> pd.DataFrame:
+    '''
+    Precipitation metrics (without geometry) for a single batch 
+    of polygon ids
+    '''
+    filters = build_teehr_filters(   
+        location_id=location_id_list,
+        reference_time_start=dates.ref_time_start,
+        reference_time_end=dates.ref_time_end,
+        value_time_start=dates.analysis_time_start,
+        value_time_end=dates.analysis_time_end,
+        value_min=0)
+            
+    df = teehr_query_with_units(
+        tqd.get_metrics,
+        to_units,
+        'precipitation',
+        convert_in_query=convert_in_query,
+        primary_filepath=forcing_filepaths['primary_filepath'],
+        secondary_filepath=forcing_filepaths['secondary_filepath'],
+        crosswalk_filepath=forcing_filepaths['crosswalk_filepath'],
+        group_by=['primary_location_id','reference_time', 'measurement_unit'],
+        order_by=['primary_location_id','reference_time'],
+        filters=filters,
+        include_geometry=False,
+        include_metrics=[
+            'primary_sum',
+            'secondary_sum',
+            'primary_maximum',
+            'secondary_maximum',
+            'primary_count',
+            'secondary_count',
+        ],
+    )
+    if not df.empty:
+        df['sum_diff'] = df['secondary_sum'] - df['primary_sum']
+    
+    return df
+
+@timing.timed('query')
+def teehr_get_precip_metrics_distributed(
+    paths: config.Paths, 
+    event: config.Event, 
+    dates: config.Dates,
+    client,
+    polygons='huc10', 
+    batch_size: Union[int, None] = None,
+    convert_in_query: bool = True,
+) -> gpd.GeoDataFrame:
+    '''
+    Precipitation metrics partitioned by polygon and computed on a 
+    dask distributed client, geometry is added after gathering
+    '''
+    forcing_filepaths, location_id_list = get_forcing_locations(
+        paths, 
+        event, 
+        polygons
+    )
+    if batch_size is None:
+        n_partitions = get_n_partitions(client, len(location_id_list))
+        batch_size = -(-len(location_id_list) // n_partitions)
+    batches = get_location_batches(location_id_list, batch_size)
+    
+    futures = client.map(
+        teehr_get_precip_metrics_batch,
+        batches,
+        forcing_filepaths=forcing_filepaths,
+        dates=dates,
+        to_units=paths.units,
+        convert_in_query=convert_in_query,
+        pure=False,
+    )
+    df_list = [df for df in client.gather(futures) if not df.empty]
+    
+    if not df_list:
+        raise ValueError("TEEHR precipitation metrics query returned empty - "\
+                         "confirm requested event data exists in parquet files")
+    
+    df = pd.concat(df_list).sort_values(
+        ['primary_location_id','reference_time']
+    ).reset_index(drop=True)
+    gdf = add_geometry(df, forcing_filepaths['geometry_filepath'])
+    
+    return gdf
+
+@timing.timed('query')
 def teehr_get_obs_precip_total(
     paths: config.Paths, 
     event: config.Event, 
     dates: config.Dates, 
     polygons='huc10', 
+    convert_in_query: bool = True,
 ) -> gpd.GeoDataFrame:
 
     if polygons == 'huc10':
@@ -469,28 +688,25 @@ def teehr_get_obs_precip_total(
         value_time_end=dates.analysis_time_end,
         value_min=0)
     
-    query_df = tqd.get_timeseries_chars(
-        forcing_filepaths['primary_filepath'],  
+    df = teehr_query_with_units(
+        tqd.get_timeseries_chars,
+        paths.unit_selector.value,
+        'precipitation',
+        convert_in_query=convert_in_query,
+        timeseries_filepath=forcing_filepaths['primary_filepath'],
         group_by=['location_id','measurement_unit'],
         order_by=['location_id','measurement_unit'],
         filters=filters,
-        return_query=False,
     )        
-    if query_df.empty:
+    if df.empty:
         raise ValueError("TEEHR observed precipitation "\
                          "timeseries query returned "\
                          "empty - confirm requested event data "\
                          "exists in parquet files")
-        
-    df = convert.convert_query_units(
-        query_df, 
-        paths.unit_selector.value, 
-        'precipitation'
-    )
 
     # add geometry
     geom = gpd.read_parquet(forcing_filepaths['geometry_filepath'])
-    gdf = df[['location_id','sum','count']].merge(
+    gdf = df[['location_id','sum','max','count']].merge(
         geom[['id','geometry']], 
         how='left', 
         left_on='location_id', 
@@ -500,11 +716,13 @@ def teehr_get_obs_precip_total(
     
     return gdf
 
+@timing.timed('query')
 def teehr_get_obs_precip_timeseries(
     ts_poly_id, 
     paths: config.Paths, 
     dates: config.Dates, 
-    polygons='huc10'
+    polygons='huc10',
+    convert_in_query: bool = True,
 ) -> pd.DataFrame():
 
     if polygons == 'huc10':
@@ -521,30 +739,29 @@ def teehr_get_obs_precip_timeseries(
         value_time_end=dates.data_value_time_end,
         value_min=0)
             
-    query_df = tqd.get_timeseries(
-        forcing_filepaths['primary_filepath'],    
-        order_by=['location_id','value_time'], 
+    df = teehr_query_with_units(
+        tqd.get_timeseries,
+        paths.unit_selector.value,
+        'precipitation',
+        convert_in_query=convert_in_query,
+        timeseries_filepath=forcing_filepaths['primary_filepath'],
+        order_by=['location_id','value_time'],
         filters=filters,
-        return_query=False,
     )    
-    if query_df.empty:
+    if df.empty:
         raise ValueError("TEEHR observed precipitation timeseries "\
                          "query returned empty - confirm requested "\
                          "event data exists in parquet files")
-        
-    df = convert.convert_query_units(
-        query_df, 
-        paths.unit_selector.value, 
-        'precipitation'
-    )
     
     return df  
 
+@timing.timed('query')
 def teehr_get_fcst_precip_timeseries(
     ts_poly_id, 
     paths: config.Paths, 
     dates: config.Dates, 
-    polygons='huc10'
+    polygons='huc10',
+    convert_in_query: bool = True,
 ) -> pd.DataFrame():
 
     if polygons == 'huc10':
@@ -561,25 +778,28 @@ def teehr_get_fcst_precip_timeseries(
         reference_time_end=dates.ref_time_end,
         value_min=0)
             
-    query_df = tqd.get_timeseries(
-        forcing_filepaths['secondary_filepath'],    
-        order_by=['location_id','reference_time','value_time'], 
+    df = teehr_query_with_units(
+        tqd.get_timeseries,
+        paths.units,
+        'precipitation',
+        convert_in_query=convert_in_query,
+        timeseries_filepath=forcing_filepaths['secondary_filepath'],
+        order_by=['location_id','reference_time','value_time'],
         filters=filters,
-        return_query=False,
     )    
-    if query_df.empty:
+    if df.empty:
         raise ValueError("TEEHR forecast precipitation timeseries query "\
                          "returned empty - confirm requested event data "\
                          "exists in parquet files")
-        
-    df = convert.convert_query_units(query_df, paths.units, 'precipitation')
     
     return df
 
+@timing.timed('query')
 def teehr_get_flow_metrics(
     paths: config.Paths, 
     event: config.Event, 
     dates: config.Dates, 
+    convert_in_query: bool = True,
 ) -> gpd.GeoDataFrame:
 
     filters = build_teehr_filters(   
@@ -593,54 +813,374 @@ def teehr_get_flow_metrics(
         value_time_end=dates.analysis_time_end,
         value_min=0)
      
-    metric_list = [
-        "primary_maximum",              
-        "secondary_maximum", 
-        "max_value_delta",
-        "primary_max_value_time",
-        "secondary_max_value_time",      
-        "max_value_timedelta",
-        "primary_count",
-        "secondary_count",
-        "primary_average",
-        "secondary_average",
-        "primary_minimum",
-        "secondary_minimum",
-        "mean_error",
-        "primary_sum",
-        "secondary_sum",
-        ]
             
-    query_gdf = tqd.get_metrics(
-        paths.streamflow_filepaths['primary_filepath'],
-        paths.streamflow_filepaths['secondary_filepath'],
-        paths.streamflow_filepaths['crosswalk_filepath'],        
+    gdf = teehr_query_with_units(
+        tqd.get_metrics,
+        paths.unit_selector.value,
+        'streamflow',
+        convert_in_query=convert_in_query,
+        primary_filepath=paths.streamflow_filepaths['primary_filepath'],
+        secondary_filepath=paths.streamflow_filepaths['secondary_filepath'],
+        crosswalk_filepath=paths.streamflow_filepaths['crosswalk_filepath'],
         group_by=['primary_location_id','reference_time', 'measurement_unit'],
-        order_by=['primary_location_id','reference_time'], 
+        order_by=['primary_location_id','reference_time'],
         filters=filters,
-        return_query=False,
-        geometry_filepath=paths.streamflow_filepaths['geometry_filepath'],       
+        geometry_filepath=paths.streamflow_filepaths['geometry_filepath'],
         include_geometry=True,
-        include_metrics=metric_list,
+        include_metrics=FLOW_METRIC_LIST,
     )    
-    if query_gdf.empty:
+    if gdf.empty:
         raise ValueError("TEEHR streamflow metrics query returned empty "\
                          "- confirm requested event data exists in "\
                          "parquet files")
-        
-    gdf = convert.convert_query_units(
-        query_gdf, 
-        paths.unit_selector.value, 
+
+    return gdf
+
+@timing.timed('metric')
+def add_geometry(
+    df: pd.DataFrame,
+    geometry_filepath: Path,
+    location_column: str = 'primary_location_id',
+) -> gpd.GeoDataFrame:
+    '''
+    Merge geometry onto metrics that were queried without it
+    '''
+    geom = gpd.read_parquet(geometry_filepath)
+    gdf = df.merge(
+        geom[['id','geometry']], 
+        how='left', 
+        left_on=location_column, 
+        right_on='id'
+    ).drop('id', axis=1)
+    gdf = gpd.GeoDataFrame(gdf, geometry='geometry', crs=geom.crs)
+    
+    return gdf
+
+@timing.timed('query')
+def teehr_get_flow_metrics_batch(
+    location_id_list: List[str],
+    streamflow_filepaths: dict,
+    dates: config.Dates,
+    to_units: str,
+    convert_in_query: bool = True,
+    con: Union[duckdb.DuckDBPyConnection, None] = None,
+) -> pd.DataFrame:
+    '''
+    Streamflow metrics (without geometry) for a single batch of 
+    primary location ids (with prefix) - takes only plain, 
+    picklable inputs so batches can be run anywhere (con, a DuckDB 
+    connection to run on, is for local use only)
+    '''
+    filters = build_teehr_filters(   
+        location_id=location_id_list,
+        reference_time_start=dates.ref_time_start,
+        reference_time_end=dates.ref_time_end,
+        value_time_start=dates.analysis_time_start,
+        value_time_end=dates.analysis_time_end,
+        value_min=0)
+    
+    df = teehr_query_with_units(
+        tqd.get_metrics,
+        to_units,
+        'streamflow',
+        convert_in_query=convert_in_query,
+        con=con,
+        primary_filepath=streamflow_filepaths['primary_filepath'],
+        secondary_filepath=streamflow_filepaths['secondary_filepath'],
+        crosswalk_filepath=streamflow_filepaths['crosswalk_filepath'],
+        group_by=['primary_location_id','reference_time', 'measurement_unit'],
+        order_by=['primary_location_id','reference_time'],
+        filters=filters,
+        include_geometry=False,
+        include_metrics=FLOW_METRIC_LIST,
+    )
+    
+    return df
+
+def get_location_batches(
+    location_id_list: List[str],
+    batch_size: int = 500,
+) -> List[List[str]]:
+    '''
+    Split a list of location ids into sorted buckets of batch_size 
+    '''
+    location_id_list = sorted(set(location_id_list))
+    
+    return [
+        location_id_list[i:i + batch_size] 
+        for i in range(0, len(location_id_list), batch_size)
+    ]
+
+def get_metrics_store_dir(
+    paths: config.Paths,
+    dates: config.Dates,
+    location_id_list: List[str],
+    batch_size: int = 500,
+    variable: str = 'streamflow',
+) -> Path:
+    '''
+    Directory of the parquet metrics store for the current forecast 
+    configuration, reach set, units, reference time range, analysis 
+    (value time) window and location batches - a hash of the location 
+    ids and batch size, so a part is only reused for the same batch
+    '''
+    reach_set = Path(paths.streamflow_filepaths['secondary_filepath']).parent.name
+    batch_key = hashlib.sha1(
+        ','.join(sorted(set(location_id_list))).encode()
+    )
+    batch_key.update(str(batch_size).encode())
+    store_name = "_".join([
+        paths.forecast_config,
+        reach_set,
+        paths.units,
+        dates.ref_time_start.strftime('%Y%m%d%H'),
+        dates.ref_time_end.strftime('%Y%m%d%H'),
+        dates.analysis_time_start.strftime('%Y%m%d%H'),
+        dates.analysis_time_end.strftime('%Y%m%d%H'),
+        batch_key.hexdigest()[:12],
+    ])
+    
+    return Path(paths.metrics_dir, variable, store_name)
+
+def teehr_write_flow_metrics_store(
+    paths: config.Paths, 
+    event: config.Event, 
+    dates: config.Dates,
+    batch_size: int = 500,
+    overwrite: bool = False,
+    memory_limit: Union[str, None] = None,
+    convert_in_query: bool = True,
+) -> Path:
+    '''
+    Compute streamflow metrics in bounded-memory batches of locations 
+    and stream each batch to a part file in the parquet metrics store. 
+    Existing parts (and markers of batches without data) are reused 
+    unless overwrite is True, so an interrupted build picks up where 
+    it stopped.
+    
+    memory_limit (e.g., '4GB') caps DuckDB memory for the queries 
+    (on a dedicated connection), large joins spill to disk rather 
+    than fail.
+    '''
+    location_id_list = ['-'.join(['usgs',id]) for id in event.usgs_id_list]
+    store_dir = get_metrics_store_dir(
+        paths, 
+        dates, 
+        location_id_list, 
+        batch_size, 
         'streamflow'
     )
+    store_dir.mkdir(parents=True, exist_ok=True)
+    
+    con = duckdb.connect()
+    if memory_limit is not None:
+        con.execute(f"SET memory_limit='{memory_limit}'")
+    
+    batches = get_location_batches(location_id_list, batch_size)
+    try:
+        for i, batch in enumerate(batches):
+            part_path = Path(store_dir, f"part_{i:05d}.parquet")
+            empty_path = part_path.with_suffix('.empty')
+            if (part_path.exists() or empty_path.exists()) and not overwrite:
+                continue
+            part_path.unlink(missing_ok=True)
+            empty_path.unlink(missing_ok=True)
+                
+            df = teehr_get_flow_metrics_batch(
+                batch,
+                paths.streamflow_filepaths,
+                dates,
+                paths.units,
+                convert_in_query=convert_in_query,
+                con=con,
+            )
+            if df.empty:
+                # marker, so batches without data are not queried again
+                empty_path.touch()
+                continue
+                
+            # write to a temporary file first so partial parts are never read
+            temp_path = part_path.with_suffix('.tmp')
+            df.to_parquet(temp_path)
+            temp_path.replace(part_path)
+            
+            print(f"streamflow metrics batch {i+1} of {len(batches)} "\
+                  f"written to {part_path.name}")
+    finally:
+        con.close()
+    
+    return store_dir
 
+def read_flow_metrics_store(
+    store_dir: Path,
+    geometry_filepath: Path,
+) -> gpd.GeoDataFrame:
+    '''
+    Read a streamflow metrics store and add point geometry
+    '''
+    part_paths = sorted(Path(store_dir).glob("part_*.parquet"))
+    if not part_paths:
+        raise ValueError("Streamflow metrics store is empty - "\
+                         "confirm requested event data exists in "\
+                         "parquet files")
+    
+    df = pd.read_parquet(part_paths)
+    gdf = add_geometry(df, geometry_filepath)
+    
     return gdf
 
+@timing.timed('query')
+def teehr_get_flow_metrics_out_of_core(
+    paths: config.Paths, 
+    event: config.Event, 
+    dates: config.Dates,
+    batch_size: int = 500,
+    overwrite: bool = False,
+    memory_limit: Union[str, None] = None,
+    convert_in_query: bool = True,
+) -> gpd.GeoDataFrame:
+    '''
+    Out-of-core alternative to teehr_get_flow_metrics for large 
+    (e.g., all reaches) events - builds or reuses the metrics store 
+    and returns the (compact) per location and reference time metrics
+    '''
+    store_dir = teehr_write_flow_metrics_store(
+        paths, 
+        event, 
+        dates,
+        batch_size=batch_size,
+        overwrite=overwrite,
+        memory_limit=memory_limit,
+        convert_in_query=convert_in_query,
+    )
+    gdf = read_flow_metrics_store(
+        store_dir, 
+        paths.streamflow_filepaths['geometry_filepath']
+    )
+    
+    return gdf
+
+@timing.timed('query')
+def teehr_get_flow_metrics_batch_derived(
+    location_id_list: List[str],
+    streamflow_filepaths: dict,
+    dates: config.Dates,
+    to_units: str,
+    attributes_df: pd.DataFrame,
+    convert_in_query: bool = True,
+) -> pd.DataFrame:
+    '''
+    Streamflow metrics for a batch of locations with attributes merged 
+    and the row-wise derived metrics (percent difference, exceedence, 
+    prior signal time) added. Rows with missing values (usually 
+    reservoir features) are returned without derived metrics.
+    '''
+    df = teehr_get_flow_metrics_batch(
+        location_id_list,
+        streamflow_filepaths,
+        dates,
+        to_units,
+        convert_in_query=convert_in_query,
+    )
+    df = df.merge(
+        attributes_df, 
+        how='left', 
+        left_on='primary_location_id', 
+        right_on='id'
+    ).drop(columns=['id'])
+    
+    # same check as the explorer applies before adding derived metrics
+    complete = df.notnull().all(axis=1)
+    df_complete = df[complete].copy()
+    if not df_complete.empty:
+        df_complete = add_percent_difference(df_complete)
+        df_complete = add_flow_exceedence(df_complete)   
+        df_complete = add_prior_signal_time(df_complete)
+    
+    return pd.concat([df_complete, df[~complete]])
+
+def get_n_partitions(
+    client,
+    n_locations: int,
+    partitions_per_worker: int = 4,
+) -> int:
+    '''
+    Number of location partitions to spread over the client workers
+    '''
+    n_workers = max(len(client.scheduler_info()['workers']), 1)
+    
+    return max(min(n_locations, n_workers * partitions_per_worker), 1)
+
+@timing.timed('query')
+def teehr_get_flow_metrics_distributed(
+    paths: config.Paths, 
+    event: config.Event, 
+    dates: config.Dates,
+    client,
+    attributes_df: Union[pd.DataFrame, None] = None,
+    batch_size: Union[int, None] = None,
+    convert_in_query: bool = True,
+) -> gpd.GeoDataFrame:
+    '''
+    Streamflow metrics partitioned by location and computed on a dask 
+    distributed client (e.g., from setup.load.get_client). If 
+    attributes_df is provided, attributes are merged and the row-wise 
+    derived metrics are computed on the workers as well. Only the 
+    compact per location and reference time results are gathered.
+    '''
+    location_id_list = ['-'.join(['usgs',id]) for id in event.usgs_id_list]
+    if batch_size is None:
+        n_partitions = get_n_partitions(client, len(location_id_list))
+        batch_size = -(-len(location_id_list) // n_partitions)
+    batches = get_location_batches(location_id_list, batch_size)
+    
+    if attributes_df is None:
+        futures = client.map(
+            teehr_get_flow_metrics_batch,
+            batches,
+            streamflow_filepaths=paths.streamflow_filepaths,
+            dates=dates,
+            to_units=paths.units,
+            convert_in_query=convert_in_query,
+            pure=False,
+        )
+    else:
+        # send the attributes to the workers once rather than per batch
+        [attributes_future] = client.scatter(
+            [pd.DataFrame(attributes_df)], 
+            broadcast=True
+        )
+        futures = client.map(
+            teehr_get_flow_metrics_batch_derived,
+            batches,
+            streamflow_filepaths=paths.streamflow_filepaths,
+            dates=dates,
+            to_units=paths.units,
+            attributes_df=attributes_future,
+            convert_in_query=convert_in_query,
+            pure=False,
+        )
+    df_list = [df for df in client.gather(futures) if not df.empty]
+    
+    if not df_list:
+        raise ValueError("TEEHR streamflow metrics query returned empty "\
+                         "- confirm requested event data exists in "\
+                         "parquet files")
+    
+    df = pd.concat(df_list).sort_values(
+        ['primary_location_id','reference_time']
+    ).reset_index(drop=True)
+    gdf = add_geometry(df, paths.streamflow_filepaths['geometry_filepath'])
+    
+    return gdf
+
+@timing.timed('query')
 def teehr_get_obs_flow_chars(
     paths: config.Paths, 
     event: config.Event, 
     dates: config.Dates, 
     polygons='huc10', 
+    convert_in_query: bool = True,
 ) -> gpd.GeoDataFrame:
     
     filters = build_teehr_filters(   
@@ -650,23 +1190,20 @@ def teehr_get_obs_flow_chars(
         value_time_end=dates.analysis_time_end,
         value_min=0)
     
-    query_df = tqd.get_timeseries_chars(
-        paths.streamflow_filepaths['primary_filepath'],
+    df = teehr_query_with_units(
+        tqd.get_timeseries_chars,
+        paths.unit_selector.value,
+        'streamflow',
+        convert_in_query=convert_in_query,
+        timeseries_filepath=paths.streamflow_filepaths['primary_filepath'],
         group_by=['location_id','measurement_unit'],
         order_by=['location_id','measurement_unit'],
         filters=filters,
-        return_query=False,
     )        
-    if query_df.empty:
+    if df.empty:
         raise ValueError("TEEHR observed streamflow timeseries query "\
                          "returned empty - confirm requested event data "\
                          "exists in parquet files")
-        
-    df = convert.convert_query_units(
-        query_df, 
-        paths.unit_selector.value, 
-        'streamflow'
-    )
 
     #add geometry
     geom = gpd.read_parquet(paths.streamflow_filepaths['geometry_filepath'])
@@ -680,6 +1217,7 @@ def teehr_get_obs_flow_chars(
     
     return gdf
 
+@timing.timed('metric')
 def add_flow_exceedence(
     gdf: gpd.GeoDataFrame
 ) -> gpd.GeoDataFrame:
@@ -707,6 +1245,7 @@ def add_flow_exceedence(
     ] = 3 
     return gdf
 
+@timing.timed('metric')
 def add_prior_signal_time(
     gdf: gpd.GeoDataFrame
 ) -> gpd.GeoDataFrame:
@@ -745,6 +1284,7 @@ def add_prior_signal_time(
 
     # design/add other utility metrics that factor in timing error and latency
 
+@timing.timed('metric')
 def add_percent_difference(
     gdf: gpd.GeoDataFrame
 ) -> gpd.GeoDataFrame:
@@ -759,6 +1299,7 @@ def add_percent_difference(
     
     return gdf
 
+@timing.timed('metric')
 def add_normalized_peakflow(
     gdf: gpd.GeoDataFrame, 
     paths: config.Paths
@@ -788,6 +1329,7 @@ def add_normalized_peakflow(
         
     return gdf
 
+@timing.timed('metric')
 def add_normalized_volume(
     gdf: gpd.GeoDataFrame, 
     paths: config.Paths
@@ -817,6 +1359,7 @@ def add_normalized_volume(
         )
     return gdf
 
+@timing.timed('metric')
 def add_normalized_timeseries(
     gdf: gpd.GeoDataFrame, 
     paths: config.Paths,
@@ -867,10 +1410,12 @@ def calc_normalized_flow(
     
     return df
     
+@timing.timed('query')
 def teehr_get_obs_flow_timeseries(
     location_id: str, 
     paths: config.Paths, 
-    dates: config.Dates
+    dates: config.Dates,
+    convert_in_query: bool = True,
 ) -> pd.DataFrame:
     
     filters = build_teehr_filters(  
@@ -880,29 +1425,28 @@ def teehr_get_obs_flow_timeseries(
         value_time_end=dates.data_value_time_end,
         value_min=0)
             
-    query_df = tqd.get_timeseries(
-        paths.streamflow_filepaths['primary_filepath'],    
-        order_by=['location_id','value_time'], 
+    df = teehr_query_with_units(
+        tqd.get_timeseries,
+        paths.units,
+        'streamflow',
+        convert_in_query=convert_in_query,
+        timeseries_filepath=paths.streamflow_filepaths['primary_filepath'],
+        order_by=['location_id','value_time'],
         filters=filters,
-        return_query=False,
     )    
-    if query_df.empty:
+    if df.empty:
         raise ValueError("TEEHR observed streamflow timeseries query "\
                          "returned empty - confirm requested event data "\
                          "exists in parquet files")
-        
-    df = convert.convert_query_units(
-        query_df, 
-        paths.units, 
-        'streamflow'
-    )
     
     return df  
 
+@timing.timed('query')
 def teehr_get_noda_flow_timeseries(
     location_id: str, 
     paths: config.Paths, 
-    dates: config.Dates
+    dates: config.Dates,
+    convert_in_query: bool = True,
 ) -> pd.DataFrame:
     
     filters = build_teehr_filters(  
@@ -912,25 +1456,28 @@ def teehr_get_noda_flow_timeseries(
         value_time_end=dates.data_value_time_end,
         value_min=0)
             
-    query_df = tqd.get_timeseries(
-        paths.streamflow_filepaths['noda_filepath'],    
-        order_by=['location_id','value_time'], 
+    df = teehr_query_with_units(
+        tqd.get_timeseries,
+        paths.units,
+        'streamflow',
+        convert_in_query=convert_in_query,
+        timeseries_filepath=paths.streamflow_filepaths['noda_filepath'],
+        order_by=['location_id','value_time'],
         filters=filters,
-        return_query=False,
     )    
-    if query_df.empty:
+    if df.empty:
         raise ValueError("TEEHR analysis streamflow timeseries query "\
                          "returned empty - confirm requested event data "\
                          "exists in parquet files")
-        
-    df = convert.convert_query_units(query_df, paths.units, 'streamflow')
     
     return df  
 
+@timing.timed('query')
 def teehr_get_fcst_flow_timeseries(
     location_id: str, 
     paths: config.Paths, 
-    dates: config.Dates
+    dates: config.Dates,
+    convert_in_query: bool = True,
 ) -> pd.DataFrame:
     
     filters = build_teehr_filters(  
@@ -940,18 +1487,19 @@ def teehr_get_fcst_flow_timeseries(
         reference_time_end=dates.ref_time_end,
         value_min=0)
             
-    query_df = tqd.get_timeseries(
-        paths.streamflow_filepaths['secondary_filepath'],    
-        order_by=['location_id','reference_time','value_time','measurement_unit'], 
+    df = teehr_query_with_units(
+        tqd.get_timeseries,
+        paths.units,
+        'streamflow',
+        convert_in_query=convert_in_query,
+        timeseries_filepath=paths.streamflow_filepaths['secondary_filepath'],
+        order_by=['location_id','reference_time','value_time','measurement_unit'],
         filters=filters,
-        return_query=False,
     )    
-    if query_df.empty:
+    if df.empty:
         raise ValueError("TEEHR forecast streamflow timeseries query "\
                          "returned empty - confirm requested event data "\
                          "exists in parquet files")
-        
-    df = convert.convert_query_units(query_df, paths.units, 'streamflow')
     
     return df
 
@@ -0,0 +1,205 @@
+'''
+Server-side cache of rasterized map layers, shared by all sessions
+(and explorers) in a process - e.g., concurrent viewers of the same
+event in a panel server are served the same image arrays rather than
+re-rasterizing the HUC10 polygons per viewer
+'''
+import threading
+import datashader as ds
+import geoviews as gv
+import geopandas as gpd
+import cartopy.crs as ccrs
+
+from collections import OrderedDict
+from typing import Union
+
+from holoviews.operation.datashader import rasterize
+
+# default size of cached rasters (pixels), fixed resolution images
+# replace the zoom-dependent dynamic rasterization
+RASTER_WIDTH = 1200
+RASTER_HEIGHT = 1000
+# memory cap of the cache (a full size raster is ~10 MB)
+MAX_CACHE_MB = 1000
+
+
+class RenderCache:
+    '''
+    Thread-safe LRU cache of rendered elements - each key is computed
+    once, concurrent requests for the same key wait for the first.
+    The least recently used items are evicted beyond max_items or
+    max_mb of element data.
+    '''
+    def __init__(
+        self,
+        max_items: int = 256,
+        max_mb: float = MAX_CACHE_MB,
+    ):
+        self.max_items = max_items
+        self.max_bytes = max_mb * 1e6
+        self.items = OrderedDict()
+        self.item_bytes = {}
+        self.n_bytes = 0
+        self.key_locks = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(
+        self,
+        key: tuple,
+        compute_function,
+    ):
+        '''
+        Return the cached item for key, computing it if needed
+        '''
+        with self.lock:
+            if key in self.items:
+                self.items.move_to_end(key)
+                self.hits += 1
+                return self.items[key]
+            key_lock = self.key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            # may have been computed while waiting for the key lock
+            with self.lock:
+                if key in self.items:
+                    self.hits += 1
+                    return self.items[key]
+
+            item = compute_function()
+
+            with self.lock:
+                self.misses += 1
+                self.items[key] = item
+                self.items.move_to_end(key)
+                self.item_bytes[key] = get_nbytes(item)
+                self.n_bytes += self.item_bytes[key]
+                # keep at least the new item
+                while len(self.items) > 1 and (
+                    len(self.items) > self.max_items
+                    or self.n_bytes > self.max_bytes
+                ):
+                    old_key, _ = self.items.popitem(last=False)
+                    self.n_bytes -= self.item_bytes.pop(old_key)
+                self.key_locks.pop(key, None)
+
+        return item
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+            self.item_bytes.clear()
+            self.n_bytes = 0
+            self.key_locks.clear()
+
+    def info(self) -> dict:
+        with self.lock:
+            return dict(
+                items=len(self.items),
+                max_items=self.max_items,
+                mb=round(self.n_bytes / 1e6, 1),
+                max_mb=self.max_bytes / 1e6,
+                hits=self.hits,
+                misses=self.misses
+            )
+
+def get_nbytes(item) -> int:
+    '''
+    Bytes of the data of a cached element (e.g., the xarray data of
+    a rasterized image), 0 if unknown
+    '''
+    try:
+        return int(item.data.nbytes)
+    except (AttributeError, TypeError):
+        return 0
+
+# one cache per process (i.e., per panel server)
+RASTER_CACHE = RenderCache()
+
+
+def hashable(
+    value
+):
+    '''
+    Colormaps are often lists, make cache key parts hashable
+    '''
+    if isinstance(value, list):
+        return tuple(value)
+    return value
+
+def rasterize_polygons(
+    gdf: gpd.GeoDataFrame,
+    column: str,
+    x_range: tuple,
+    y_range: tuple,
+    width: int = RASTER_WIDTH,
+    height: int = RASTER_HEIGHT,
+) -> gv.Image:
+    '''
+    Static (non-dynamic) rasterization of polygons over a fixed
+    web mercator extent
+    '''
+    polygons = gv.project(
+        gv.Polygons(gdf, vdims=[column]),
+        projection=ccrs.GOOGLE_MERCATOR
+    )
+    image = rasterize(
+        polygons,
+        aggregator=ds.mean(column),
+        dynamic=False,
+        x_range=x_range,
+        y_range=y_range,
+        width=width,
+        height=height,
+    )
+    return gv.Image(image, crs=ccrs.GOOGLE_MERCATOR)
+
+def get_cached_raster(
+    event_key: tuple,
+    layer: str,
+    gdf_function,
+    column: str,
+    map_limits: dict,
+    ref_time_str: Union[str, None] = None,
+    cmap: Union[list, str, None] = None,
+    clim: Union[tuple, None] = None,
+    width: int = RASTER_WIDTH,
+    height: int = RASTER_HEIGHT,
+) -> gv.Image:
+    '''
+    Rasterized polygon layer from the shared cache, keyed by
+    (event, layer, reference time, extent, colormap, clim)
+
+    gdf_function is called (once per key) to get the polygons, so the
+    data selection is skipped entirely on a cache hit. A clone is
+    returned, so options applied by a dashboard do not change the
+    cached element.
+    '''
+    x_range = tuple(map_limits['xlims_mercator'])
+    y_range = tuple(map_limits['ylims_mercator'])
+    key = (
+        event_key,
+        layer,
+        ref_time_str,
+        (x_range, y_range, width, height),
+        hashable(cmap),
+        hashable(clim),
+    )
+
+    def compute():
+        image = rasterize_polygons(
+            gdf_function(),
+            column,
+            x_range,
+            y_range,
+            width,
+            height
+        )
+        if cmap is not None:
+            image = image.opts(cmap=cmap)
+        if clim is not None:
+            image = image.opts(clim=clim)
+        return image
+
+    return RASTER_CACHE.get(key, compute).clone()
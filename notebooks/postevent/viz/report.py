@@ -0,0 +1,278 @@
+'''
+Headless export of a post-event report package - renders the
+dashboard PNGs (the same layouts as the 'Save PNG' buttons) for every
+reference time and every threshold-exceeding gage, on a pool of
+worker processes that share one initialized ForecastExplorer
+'''
+import os
+import time
+import multiprocessing
+
+from pathlib import Path
+from typing import List, Union
+
+from . import class_explorer
+from . import build_observed
+from . import build_ts_summary
+from . import build_ts_byforecast
+from . import build_ts_byforecast_precip
+from . import build_contingency
+from . import build_qaqc
+
+# report products - build module, whether the product is rendered per
+# selected gage and/or per reference time, and whether the build layout
+# leads with a row of widgets (dropped from the export)
+REPORT_PRODUCTS = dict(
+    observed_summary = dict(
+        module=build_observed,
+        by_point=True,
+        by_ref_time=False,
+        has_widgets=True,
+    ),
+    forecast_error_summary = dict(
+        module=build_ts_summary,
+        by_point=True,
+        by_ref_time=False,
+        has_widgets=True,
+    ),
+    streamflow_diff = dict(
+        module=build_ts_byforecast,
+        by_point=True,
+        by_ref_time=True,
+        has_widgets=True,
+    ),
+    precip_diff = dict(
+        module=build_ts_byforecast_precip,
+        by_point=False,
+        by_ref_time=True,
+        has_widgets=True,
+    ),
+    contingency = dict(
+        module=build_contingency,
+        by_point=False,
+        by_ref_time=False,
+        has_widgets=True,
+    ),
+    qaqc = dict(
+        module=build_qaqc,
+        by_point=False,
+        by_ref_time=False,
+        has_widgets=False,
+    ),
+)
+
+# the shared data product - set in the parent before the pool is
+# forked, so each worker gets its own copy of the initialized explorer
+# without re-running any queries
+_REPORT_EXPLORER = None
+_REPORT_BUILD_KWARGS = {}
+
+
+def get_filename_dates(
+    dash_class: class_explorer.ForecastExplorer
+) -> str:
+
+    return f"{dash_class.dates.analysis_time_start.strftime('%Y-%m-%d_%Hz')}_" \
+           f"{dash_class.dates.analysis_time_end.strftime('%Y-%m-%d_%Hz')}"
+
+def get_report_filepath(
+    report_dir: Path,
+    product: str,
+    filename_dates: str,
+    point_id: Union[str, None] = None,
+    ref_time_str: Union[str, None] = None,
+) -> Path:
+    '''
+    Report filename - product name, dates, then gage and/or
+    reference time if the product varies by them
+    '''
+    parts = [product, filename_dates]
+    if point_id is not None:
+        parts.append(point_id)
+    if ref_time_str is not None:
+        parts.append(ref_time_str.replace(' ','_'))
+
+    return Path(report_dir, "_".join(parts) + ".png")
+
+def get_report_tasks(
+    dash_class: class_explorer.ForecastExplorer,
+    report_dir: Path,
+    products: List[str],
+    point_ids: Union[List[str], None] = None,
+    ref_time_strs: Union[List[str], None] = None,
+) -> List[tuple]:
+    '''
+    List of (product, point_id, ref_time_str, filepath) to render,
+    default all threshold-exceeding gages and all reference times
+    '''
+    if point_ids is None and dash_class.explore_streamflow:
+        point_ids = dash_class.flow_points_gdf[
+            dash_class.flow_points_gdf['any_obs_exceed']
+        ]['primary_location_id'].to_list()
+    if ref_time_strs is None:
+        ref_time_strs = dash_class.ref_time_list_str
+
+    filename_dates = get_filename_dates(dash_class)
+
+    tasks = []
+    for product in products:
+        spec = REPORT_PRODUCTS[product]
+        product_points = point_ids if spec['by_point'] else [None]
+        product_ref_times = ref_time_strs if spec['by_ref_time'] else [None]
+        for point_id in product_points:
+            for ref_time_str in product_ref_times:
+                filepath = get_report_filepath(
+                    report_dir,
+                    product,
+                    filename_dates,
+                    point_id,
+                    ref_time_str
+                )
+                tasks.append((product, point_id, ref_time_str, filepath))
+
+    return tasks
+
+def get_newest_input_time(
+    dash_class: class_explorer.ForecastExplorer
+) -> float:
+    '''
+    Modification time of the newest parquet file for the event -
+    outputs written after this time are up to date
+    '''
+    mtimes = [
+        f.stat().st_mtime
+        for f in Path(dash_class.paths.parquet_dir).rglob("*.parquet")
+    ]
+    return max(mtimes, default=0)
+
+def render_report_task(
+    task: tuple
+) -> tuple:
+    '''
+    Set the selection on the shared explorer, rebuild the dashboard
+    layout and save the exported part as PNG
+    '''
+    product, point_id, ref_time_str, filepath = task
+    dash_class = _REPORT_EXPLORER
+    spec = REPORT_PRODUCTS[product]
+
+    start_time = time.time()
+    try:
+        if point_id is not None:
+            dash_class.select_point(point_id)
+        if ref_time_str is not None:
+            dash_class.ref_time_str = ref_time_str
+
+        # rebuilding creates new DynamicMaps, so nothing stale from a
+        # previous selection is rendered
+        layout = spec['module'].build(
+            dash_class,
+            **_REPORT_BUILD_KWARGS.get(product, {})
+        )
+        if spec['has_widgets']:
+            layout = layout[-1]
+
+        temp_path = filepath.with_name('tmp_' + filepath.name)
+        layout.save(str(temp_path))
+        temp_path.replace(filepath)
+        message = ''
+    except Exception as e:
+        message = f"{type(e).__name__}: {e}"
+
+    return filepath, message, time.time() - start_time
+
+def export_report(
+    dash_class: class_explorer.ForecastExplorer,
+    products: Union[List[str], None] = None,
+    point_ids: Union[List[str], None] = None,
+    ref_time_strs: Union[List[str], None] = None,
+    report_dir: Union[Path, None] = None,
+    build_kwargs: Union[dict, None] = None,
+    n_workers: Union[int, None] = None,
+    overwrite: bool = False,
+) -> List[Path]:
+    '''
+    Render a report package for an event
+
+    Parameters
+    ----------
+    dash_class: ForecastExplorer
+        Explorer with the data for the event (initialized here
+        if not already) - shared by all renders
+    products: Union[List[str], None] = None
+        Keys of REPORT_PRODUCTS to render (default all applicable)
+    point_ids: Union[List[str], None] = None
+        Gages to render per-gage products for
+        (default all threshold-exceeding gages)
+    ref_time_strs: Union[List[str], None] = None
+        Reference times to render per-forecast products for
+        (default all)
+    report_dir: Union[Path, None] = None
+        Output directory (default viz_dir/report)
+    build_kwargs: Union[dict, None] = None
+        Build function keyword args per product, e.g.,
+        dict(observed_summary=dict(precip_value_max=16))
+    n_workers: Union[int, None] = None
+        Number of worker processes (default cpu count), renders run
+        serially if fork is not available
+    overwrite: bool = False
+        Re-render outputs that are newer than all event input data
+
+    Returns
+    -------
+    List of PNG files written
+    '''
+    global _REPORT_EXPLORER, _REPORT_BUILD_KWARGS
+
+    if not dash_class.is_initialized:
+        dash_class.initialize(restrict_to_event_period=True)
+
+    if products is None:
+        products = [
+            product for product, spec in REPORT_PRODUCTS.items()
+            if dash_class.explore_streamflow or not spec['by_point']
+        ]
+    if report_dir is None:
+        report_dir = Path(dash_class.paths.viz_dir, 'report')
+    report_dir = Path(report_dir)
+    report_dir.mkdir(parents=True, exist_ok=True)
+
+    tasks = get_report_tasks(
+        dash_class,
+        report_dir,
+        products,
+        point_ids,
+        ref_time_strs
+    )
+
+    # skip outputs already up to date
+    if not overwrite:
+        newest_input_time = get_newest_input_time(dash_class)
+        tasks = [
+            task for task in tasks
+            if not task[3].exists() \
+               or task[3].stat().st_mtime < newest_input_time
+        ]
+    print(f"rendering {len(tasks)} report products to {report_dir}")
+
+    _REPORT_EXPLORER = dash_class
+    _REPORT_BUILD_KWARGS = build_kwargs or {}
+
+    if n_workers is None:
+        n_workers = os.cpu_count()
+    if 'fork' in multiprocessing.get_all_start_methods() and n_workers > 1:
+        # each worker starts (and reuses) its own headless webdriver
+        with multiprocessing.get_context('fork').Pool(n_workers) as pool:
+            results = list(pool.imap_unordered(render_report_task, tasks))
+    else:
+        results = [render_report_task(task) for task in tasks]
+
+    written = []
+    for filepath, message, seconds in results:
+        if message:
+            print(f"failed {filepath.name}: {message}")
+        else:
+            written.append(filepath)
+    print(f"exported {len(written)} of {len(tasks)} report products")
+
+    return written
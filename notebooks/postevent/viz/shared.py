@@ -0,0 +1,216 @@
+'''
+Shared event data products for multi-user panel server deployments -
+one initialized ForecastExplorer per event (and explorer options) is
+kept per server process and treated as read-only, each session gets a
+lightweight explorer that references the shared data and holds only
+its own selection streams, widget values and selected time series
+'''
+import copy
+import threading
+
+from pathlib import Path
+from typing import Union
+
+from .. import batch
+from . import class_explorer
+
+# attributes reassigned by the explorer callbacks for the current
+# selection - copied per session, everything else is shared by reference
+SESSION_ATTRIBUTES = [
+    'precip_obs_ts',
+    'precip_all_fcst_ts',
+    'flow_obs_ts',
+    'flow_noda_ts',
+    'flow_all_fcst_ts',
+    'precip_clims',
+    'flow_clims',
+]
+# per-instance attributes that are never shared
+EXCLUDE_ATTRIBUTES = [
+    'coord_stream',
+    'point_stream',
+]
+# config objects (explorer parameters) - copied per session, as dashboards
+# may reassign their attributes, the frames they hold are shared
+CONFIG_PARAMETERS = [
+    'paths',
+    'event',
+    'geo',
+    'dates',
+]
+# data products used by dashboards beyond the explorer defaults -
+# computed once on the shared explorer rather than per session
+EXTRA_PRODUCTS = [
+    'get_usgs_basin_precip',
+]
+
+# one registry per process (i.e., per panel server)
+_SHARED_PRODUCTS = {}
+_KEY_LOCKS = {}
+_LOCK = threading.Lock()
+
+
+def get_product_key(
+    config_file: Union[str, Path],
+    event_name: str,
+    forecast_config: str,
+    units: str,
+    restrict_to_event_period: bool,
+    explorer_params: dict,
+) -> tuple:
+
+    return (
+        str(Path(config_file).resolve()),
+        event_name,
+        forecast_config,
+        units,
+        restrict_to_event_period,
+        tuple(sorted(explorer_params.items())),
+    )
+
+def build_shared_product(
+    config_file: Union[str, Path],
+    event_name: str,
+    forecast_config: str,
+    units: str,
+    restrict_to_event_period: bool,
+    explorer_params: dict,
+) -> class_explorer.ForecastExplorer:
+    '''
+    Read the event and run all dashboard queries once
+    '''
+    paths, event, geo, dates = batch.get_event_objects(
+        config_file,
+        event_name,
+        forecast_config,
+        units,
+        restrict_to_event_period,
+        explorer_params.get('reach_set', 'gages'),
+    )
+    shared = class_explorer.ForecastExplorer(
+        paths=paths,
+        event=event,
+        geo=geo,
+        dates=dates,
+        **explorer_params
+    )
+    shared.initialize(restrict_to_event_period)
+    for method_name in EXTRA_PRODUCTS:
+        shared.get_data_product(method_name)
+
+    return shared
+
+def get_shared_product(
+    config_file: Union[str, Path],
+    event_name: str,
+    forecast_config: str = 'short_range',
+    units: str = 'english',
+    restrict_to_event_period: bool = True,
+    explorer_params: Union[dict, None] = None,
+) -> class_explorer.ForecastExplorer:
+    '''
+    Shared (read-only) explorer for an event, built by the first
+    session that requests it - concurrent first requests wait for
+    the same build rather than each running the queries
+    '''
+    if explorer_params is None:
+        explorer_params = {}
+    key = get_product_key(
+        config_file,
+        event_name,
+        forecast_config,
+        units,
+        restrict_to_event_period,
+        explorer_params
+    )
+    with _LOCK:
+        if key in _SHARED_PRODUCTS:
+            return _SHARED_PRODUCTS[key]
+        key_lock = _KEY_LOCKS.setdefault(key, threading.Lock())
+
+    with key_lock:
+        with _LOCK:
+            if key in _SHARED_PRODUCTS:
+                return _SHARED_PRODUCTS[key]
+
+        print(f"building shared data product for {event_name} "\
+              f"({forecast_config}, {units})")
+        shared = build_shared_product(
+            config_file,
+            event_name,
+            forecast_config,
+            units,
+            restrict_to_event_period,
+            explorer_params
+        )
+        with _LOCK:
+            _SHARED_PRODUCTS[key] = shared
+            _KEY_LOCKS.pop(key, None)
+
+    return shared
+
+def copy_config(config_object):
+    '''
+    Shallow copy of a config object, with its dict and list 
+    attributes (e.g., file paths) copied as well
+    '''
+    config_copy = copy.copy(config_object)
+    for name, value in vars(config_object).items():
+        if isinstance(value, (dict, list)):
+            setattr(config_copy, name, copy.copy(value))
+
+    return config_copy
+
+def get_session_explorer(
+    shared: class_explorer.ForecastExplorer
+) -> class_explorer.ForecastExplorer:
+    '''
+    New explorer for a session that references the data of the shared
+    explorer - only the selection state and the config objects (paths, 
+    event, geo, dates) are per session
+
+    Dashboards must not modify the shared data frames in place (the
+    explorer callbacks replace, rather than modify, the frames listed
+    in SESSION_ATTRIBUTES)
+    '''
+    params = {
+        name: value for name, value in shared.param.values().items()
+        if name != 'name'
+    }
+    for name in CONFIG_PARAMETERS:
+        if params.get(name) is not None:
+            params[name] = copy_config(params[name])
+    session = class_explorer.ForecastExplorer(**params)
+
+    param_names = list(shared.param)
+    for name, value in vars(shared).items():
+        if name.startswith('_') or name in param_names \
+            or name in EXCLUDE_ATTRIBUTES:
+            continue
+        if name in SESSION_ATTRIBUTES:
+            value = copy.copy(value)
+        setattr(session, name, value)
+
+    return session
+
+def clear_shared_products():
+    '''
+    Drop all shared products (e.g., after the event data is reloaded),
+    sessions already open keep their references
+    '''
+    with _LOCK:
+        _SHARED_PRODUCTS.clear()
+        _KEY_LOCKS.clear()
+
+def shared_product_info() -> list:
+    with _LOCK:
+        return [
+            dict(
+                event_name=key[1],
+                forecast_config=key[2],
+                units=key[3],
+                restrict_to_event_period=key[4],
+                explorer_params=dict(key[5]),
+            )
+            for key in _SHARED_PRODUCTS
+        ]
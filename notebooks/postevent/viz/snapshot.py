@@ -0,0 +1,294 @@
+'''
+Snapshots of an initialized ForecastExplorer - the data frames
+(metrics, points, polygons, time lists) are written as uncompressed
+Arrow IPC files (geometry as WKB) and the remaining settings (reference
+time lists, colormaps, colorbar limits, labels) as JSON, so a new kernel
+or server worker can skip the initialize queries and reopen the frames
+with memory mapping
+'''
+import hashlib
+import json
+import shutil
+import time
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import pyarrow as pa
+
+from datetime import datetime
+from pathlib import Path
+from typing import Union
+
+SNAPSHOT_VERSION = 2
+STATE_FILE = 'state.json'
+FRAME_SUFFIX = '.arrow'
+# schema metadata key for geometry column name and crs
+GEO_METADATA_KEY = b'postevent_geo'
+
+# attributes that are per instance or recomputed on first access
+EXCLUDE_ATTRIBUTES = [
+    'coord_stream',
+    'point_stream',
+    'empty_ts_curve',
+]
+
+
+def get_snapshot_name(
+    dash_class,
+    restrict_to_event_period: bool,
+) -> str:
+    '''
+    Snapshot name from the settings that change the initialized data,
+    including a hash of the event locations (the region subset depends
+    on the zoom polygon)
+    '''
+    locations = hashlib.sha1()
+    for id_list in [dash_class.event.huc10_list, dash_class.event.usgs_id_list]:
+        locations.update(','.join(sorted(map(str, id_list))).encode())
+        locations.update(b';')
+    parts = [
+        dash_class.dates.forecast_config,
+        dash_class.paths.units,
+        dash_class.reach_set,
+        dash_class.map_polygons,
+        dash_class.ts_polygons,
+    ]
+    if dash_class.explore_precip:
+        parts.append('precip')
+    if dash_class.explore_streamflow:
+        parts.append('flow')
+    parts.append('event' if restrict_to_event_period else 'full')
+    parts.append(locations.hexdigest()[:12])
+
+    return "_".join(parts)
+
+def get_snapshot_dir(
+    dash_class,
+    restrict_to_event_period: bool,
+) -> Path:
+
+    return Path(
+        dash_class.paths.snapshot_dir,
+        get_snapshot_name(dash_class, restrict_to_event_period)
+    )
+
+def get_newest_input_time(
+    paths
+) -> float:
+    '''
+    Modification time of the newest parquet file for the event
+    '''
+    mtimes = [
+        f.stat().st_mtime
+        for f in Path(paths.parquet_dir).rglob("*.parquet")
+    ]
+    return max(mtimes, default=0)
+
+def encode_value(
+    value
+):
+    '''
+    JSON representation of a setting, raises TypeError if the value
+    can not be represented (e.g., holoviews elements)
+    '''
+    if value is None or isinstance(value, (str, bool, int, float)):
+        return value
+    if isinstance(value, np.generic):
+        if isinstance(value, np.datetime64):
+            return {'__datetime64__': str(value)}
+        return value.item()
+    if isinstance(value, (pd.Timestamp, datetime)):
+        return {'__timestamp__': value.isoformat()}
+    if isinstance(value, tuple):
+        return {'__tuple__': [encode_value(v) for v in value]}
+    if isinstance(value, list):
+        return [encode_value(v) for v in value]
+    if isinstance(value, dict) and all(isinstance(k, str) for k in value):
+        return {k: encode_value(v) for k, v in value.items()}
+
+    raise TypeError(f"can not encode {type(value).__name__}")
+
+def decode_value(
+    value
+):
+    if isinstance(value, list):
+        return [decode_value(v) for v in value]
+    if isinstance(value, dict):
+        if '__datetime64__' in value:
+            return np.datetime64(value['__datetime64__'])
+        if '__timestamp__' in value:
+            return pd.Timestamp(value['__timestamp__'])
+        if '__tuple__' in value:
+            return tuple(decode_value(v) for v in value['__tuple__'])
+        return {k: decode_value(v) for k, v in value.items()}
+
+    return value
+
+def write_frame(
+    df: Union[pd.DataFrame, gpd.GeoDataFrame],
+    filepath: Path,
+):
+    '''
+    Write a data frame as an uncompressed Arrow IPC file,
+    geometry as WKB
+    '''
+    geo_metadata = None
+    if isinstance(df, gpd.GeoDataFrame) \
+        and df._geometry_column_name in df.columns:
+        geometry_column = df._geometry_column_name
+        geo_metadata = dict(
+            geometry=geometry_column,
+            crs=df.crs.to_json() if df.crs is not None else None,
+        )
+        df = pd.DataFrame(df).assign(
+            **{geometry_column: df.geometry.to_wkb()}
+        )
+
+    table = pa.Table.from_pandas(pd.DataFrame(df))
+    if geo_metadata is not None:
+        table = table.replace_schema_metadata({
+            **table.schema.metadata,
+            GEO_METADATA_KEY: json.dumps(geo_metadata).encode(),
+        })
+
+    with pa.OSFile(str(filepath), 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+def read_frame(
+    filepath: Path
+) -> Union[pd.DataFrame, gpd.GeoDataFrame]:
+    '''
+    Read an Arrow IPC file with memory mapping - numeric columns
+    without nulls reference the mapped file rather than being copied
+    '''
+    source = pa.memory_map(str(filepath), 'r')
+    table = pa.ipc.open_file(source).read_all()
+    df = table.to_pandas(split_blocks=True)
+
+    metadata = table.schema.metadata or {}
+    if GEO_METADATA_KEY in metadata:
+        geo_metadata = json.loads(metadata[GEO_METADATA_KEY])
+        geometry_column = geo_metadata['geometry']
+        df[geometry_column] = gpd.GeoSeries.from_wkb(
+            df[geometry_column],
+            index=df.index,
+            crs=geo_metadata['crs'],
+        )
+        df = gpd.GeoDataFrame(
+            df,
+            geometry=geometry_column,
+            crs=geo_metadata['crs']
+        )
+
+    return df
+
+def write_snapshot(
+    dash_class,
+    restrict_to_event_period: bool,
+    snapshot_dir: Union[Path, None] = None,
+) -> Path:
+    '''
+    Write the initialized data and settings of an explorer, the
+    snapshot directory is replaced as a whole
+    '''
+    if snapshot_dir is None:
+        snapshot_dir = get_snapshot_dir(dash_class, restrict_to_event_period)
+    snapshot_dir = Path(snapshot_dir)
+    temp_dir = snapshot_dir.with_name(snapshot_dir.name + '.tmp')
+    if temp_dir.exists():
+        shutil.rmtree(temp_dir)
+    temp_dir.mkdir(parents=True)
+
+    param_names = list(dash_class.param)
+    frames = []
+    state = {}
+    skipped = []
+    for name, value in vars(dash_class).items():
+        if name.startswith('_') or name in param_names \
+            or name in EXCLUDE_ATTRIBUTES:
+            continue
+        if isinstance(value, pd.DataFrame):
+            write_frame(value, Path(temp_dir, name + FRAME_SUFFIX))
+            frames.append(name)
+        else:
+            try:
+                state[name] = encode_value(value)
+            except TypeError:
+                skipped.append(name)
+
+    manifest = dict(
+        version=SNAPSHOT_VERSION,
+        created=time.time(),
+        input_time=get_newest_input_time(dash_class.paths),
+        restrict_to_event_period=restrict_to_event_period,
+        ref_time_str=dash_class.ref_time_str,
+        frames=frames,
+        skipped=skipped,
+        state=state,
+    )
+    with open(Path(temp_dir, STATE_FILE), 'w') as f:
+        json.dump(manifest, f)
+
+    if snapshot_dir.exists():
+        shutil.rmtree(snapshot_dir)
+    temp_dir.rename(snapshot_dir)
+
+    print(f"snapshot written to {snapshot_dir}")
+
+    return snapshot_dir
+
+def is_snapshot_current(
+    dash_class,
+    snapshot_dir: Path,
+) -> bool:
+    '''
+    Snapshot exists, is the current version and is newer than
+    all event input data
+    '''
+    state_file = Path(snapshot_dir, STATE_FILE)
+    if not state_file.exists():
+        return False
+    with open(state_file) as f:
+        manifest = json.load(f)
+
+    return manifest['version'] == SNAPSHOT_VERSION \
+        and manifest['input_time'] >= get_newest_input_time(dash_class.paths)
+
+def read_snapshot(
+    dash_class,
+    restrict_to_event_period: bool,
+    snapshot_dir: Union[Path, None] = None,
+) -> bool:
+    '''
+    Restore the initialized state of an explorer from a snapshot,
+    returns False (explorer unchanged) if no current snapshot exists
+    '''
+    if snapshot_dir is None:
+        snapshot_dir = get_snapshot_dir(dash_class, restrict_to_event_period)
+    if not is_snapshot_current(dash_class, snapshot_dir):
+        return False
+
+    with open(Path(snapshot_dir, STATE_FILE)) as f:
+        manifest = json.load(f)
+
+    # same settings as initialize, the per-click queries need them
+    dash_class.dates.get_analysis_value_times(restrict_to_event_period)
+    if dash_class.explore_streamflow:
+        dash_class.paths.set_streamflow_paths(
+            nwm_version = dash_class.event.nwm_version,
+            domain=dash_class.event.domain,
+            reach_set=dash_class.reach_set
+        )
+
+    for name in manifest['frames']:
+        setattr(
+            dash_class,
+            name,
+            read_frame(Path(snapshot_dir, name + FRAME_SUFFIX))
+        )
+    for name, value in manifest['state'].items():
+        setattr(dash_class, name, decode_value(value))
+    dash_class.ref_time_str = manifest['ref_time_str']
+
+    return True
@@ -0,0 +1,69 @@
+'''
+batch metric tables
+'''
+import pytest
+import numpy as np
+import pandas as pd
+
+from types import SimpleNamespace
+
+pytest.importorskip('geopandas')
+pytest.importorskip('teehr')
+
+from postevent import batch
+from postevent.viz import data
+
+
+def get_metrics_df() -> pd.DataFrame:
+    '''
+    Queried streamflow metrics of three gages - the second has zero
+    observed and forecast volume, the third a missing forecast
+    '''
+    reference_time = pd.Timestamp('2023-01-01')
+    return pd.DataFrame(dict(
+        primary_location_id=['usgs-01', 'usgs-02', 'usgs-03'],
+        reference_time=reference_time,
+        primary_maximum=[10.0, 0.0, 5.0],
+        secondary_maximum=[12.0, 0.0, np.nan],
+        max_value_delta=[2.0, 0.0, np.nan],
+        max_value_timedelta=pd.to_timedelta([1, 0, 0], unit='h'),
+        primary_sum=[100.0, 0.0, 50.0],
+        secondary_sum=[110.0, 0.0, np.nan],
+        primary_max_value_time=reference_time + pd.Timedelta(hours=6),
+        secondary_max_value_time=reference_time + pd.Timedelta(hours=7),
+        measurement_unit='m3/s',
+    ))
+
+def test_flow_metrics_table_keeps_zero_volume(monkeypatch):
+
+    monkeypatch.setattr(
+        data, 
+        'teehr_get_flow_metrics_batch',
+        lambda *args, **kwargs: get_metrics_df()
+    )
+    paths = SimpleNamespace(
+        streamflow_filepaths={},
+        units='metric',
+        unit_selector=SimpleNamespace(value='metric'),
+    )
+    event = SimpleNamespace(
+        usgs_id_list_with_prefix=['usgs-01', 'usgs-02', 'usgs-03']
+    )
+    geo = SimpleNamespace(
+        usgs_points_subset=pd.DataFrame(dict(
+            id=['usgs-01', 'usgs-02', 'usgs-03'],
+            name=['a', 'b', 'c'],
+            drainage_area=[10.0, 20.0, 30.0],
+            hw_threshold=[8.0, 8.0, 8.0],
+        )),
+        attribute_list=['drainage_area', 'hw_threshold'],
+    )
+
+    df = batch.get_flow_metrics_table(paths, event, geo, None)
+
+    # zero volume reach kept with a NaN percent difference, 
+    # the reach with a missing forecast dropped
+    assert sorted(df['primary_location_id']) == ['usgs-01', 'usgs-02']
+    zero = df[df['primary_location_id'] == 'usgs-02'].iloc[0]
+    assert np.isnan(zero['vol_percent_diff'])
+    assert zero['primary_sum_norm'] == 0
@@ -0,0 +1,60 @@
+'''
+query unit conversion
+'''
+import pytest
+import pandas as pd
+
+pytest.importorskip('geopandas')
+
+from postevent.utils import convert
+
+
+def get_query_df(units: list) -> pd.DataFrame:
+
+    return pd.DataFrame(dict(
+        location_id=[f"usgs-{i}" for i in range(len(units))],
+        primary_average=[1.0] * len(units),
+        secondary_average=[2.0] * len(units),
+        measurement_unit=units,
+    ))
+
+def test_convert_query_units():
+
+    df = convert.convert_query_units(
+        get_query_df(['m3/s', 'm3/s']),
+        'english',
+        'streamflow'
+    )
+    assert (df['measurement_unit'] == 'ft3/s').all()
+    assert df['primary_average'].tolist() == pytest.approx([3.28**3] * 2)
+
+def test_convert_query_units_mixed():
+
+    df = convert.convert_query_units(
+        get_query_df(['m3/s', 'ft3/s']),
+        'english',
+        'streamflow'
+    )
+    assert (df['measurement_unit'] == 'ft3/s').all()
+    assert df['primary_average'].tolist() == pytest.approx([3.28**3, 1.0])
+
+def test_convert_query_units_unsupported():
+
+    df = get_query_df(['m3/s', 'gal/min'])
+    with pytest.raises(ValueError, match='gal/min'):
+        convert.convert_query_units(df, 'english', 'streamflow')
+    # not relabelled
+    assert df['measurement_unit'].tolist() == ['m3/s', 'gal/min']
+    with pytest.raises(ValueError, match='gal/min'):
+        convert.convert_query_units(df, 'english', 'streamflow', inplace=True)
+    assert df['measurement_unit'].tolist() == ['m3/s', 'gal/min']
+
+def test_convert_query_units_no_conversion():
+
+    df = convert.convert_query_units(
+        get_query_df(['m3/s', 'm3/s']),
+        'english',
+        'stage'
+    )
+    assert (df['measurement_unit'] == 'm3/s').all()
+    assert df['primary_average'].tolist() == [1.0, 1.0]
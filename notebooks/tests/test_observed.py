@@ -0,0 +1,96 @@
+'''
+observed summary dashboard - built from the observed data only
+'''
+import pytest
+
+pytest.importorskip('geopandas')
+pytest.importorskip('holoviews')
+pytest.importorskip('geoviews')
+pytest.importorskip('panel')
+pytest.importorskip('teehr')
+
+from postevent import config
+from postevent.benchmark import suite, synthetic
+from postevent.viz import build_observed
+
+
+@pytest.fixture
+def explorer(tmp_path):
+    '''
+    Explorer for a small synthetic study
+    '''
+    config_file = synthetic.write_synthetic_study(
+        tmp_path,
+        n_locations=10,
+        n_days=2
+    )
+    paths, event = suite.get_paths_event(config_file, 'short_range')
+    geo = config.Geo(paths, event)
+    dates = config.Dates(paths, event)
+    dates.get_analysis_value_times(True)
+    geo.get_usgs_attributes(paths)
+    geo.update_geometry(paths, event, dates)
+    event.get_location_lists(paths, geo)
+    paths.set_streamflow_paths(
+        nwm_version=event.nwm_version,
+        domain=event.domain,
+    )
+    # the synthetic states have no abbreviations
+    geo.states['STUSPS'] = geo.states['id']
+
+    return suite.get_explorer(paths, event, geo, dates)
+
+def no_forecast_metrics(explorer, monkeypatch):
+
+    def fail():
+        raise AssertionError("forecast metrics queried")
+    monkeypatch.setattr(explorer, 'get_precip_metrics', fail)
+    monkeypatch.setattr(explorer, 'get_flow_metrics', fail)
+
+def test_build_observed_without_forecast_metrics(explorer, monkeypatch):
+
+    no_forecast_metrics(explorer, monkeypatch)
+    build_observed.build(explorer, restrict_to_event_period=True)
+    assert explorer.point_id is not None
+    assert explorer.ts_poly_id is not None
+
+    # initial selection
+    explorer.get_selected_point()
+    explorer.get_precip_obs_timeseries_hourly_bars()
+    explorer.get_precip_obs_timeseries_cumulative()
+    explorer.get_flow_obs_timeseries()
+    explorer.get_hw_threshold()
+
+    # select another gage, then a location outside the region
+    points = explorer.get_flow_volume_obs()
+    explorer.point_stream.source = points
+    explorer.point_stream.event(index=[1])
+    explorer.get_selected_point()
+    explorer.get_precip_obs_timeseries_cumulative()
+    explorer.get_flow_obs_timeseries()
+    assert explorer.point_id == points.data['location_id'].iloc[1]
+
+    explorer.point_stream.event(index=[])
+    explorer.get_precip_obs_timeseries_cumulative()
+    explorer.get_flow_obs_timeseries()
+
+    for attribute in ['precip_metrics_gdf', 'flow_metrics_gdf']:
+        assert attribute not in explorer.__dict__
+
+def test_observed_selection_replaces_forecast_selection(explorer, monkeypatch):
+
+    no_forecast_metrics(explorer, monkeypatch)
+    explorer.initialize(
+        True,
+        products=build_observed.DATA_PRODUCTS
+    )
+    observed_point_id = explorer.point_id
+
+    # selection set by a forecast dashboard (as get_initial_selection)
+    explorer.invalidate_data_product('get_initial_selection_observed')
+    explorer.point_id = 'usgs-forecast'
+    explorer.initial_selection = True
+
+    explorer.get_data_product('get_initial_selection_observed')
+    assert explorer.point_id == observed_point_id
+    assert 'initial_selection' not in explorer.__dict__
@@ -0,0 +1,72 @@
+'''
+timing records
+'''
+import pytest
+import numpy as np
+
+pytest.importorskip('panel')
+
+from bokeh.document import Document
+from panel.io.state import set_curdoc, state
+
+from postevent.utils import timing
+
+
+@pytest.fixture
+def trace_memory(monkeypatch):
+
+    monkeypatch.setattr(timing, 'TRACE_MEMORY', True)
+    timing.clear_timings()
+    yield
+    timing.clear_timings()
+
+def get_record(name: str) -> dict:
+
+    return [r for r in timing.TIMING_RECORDS if r['name'] == name][-1]
+
+def test_peak_memory_per_call(trace_memory):
+
+    # an earlier large allocation does not count towards later calls
+    with timing.timer('large'):
+        values = np.ones(20_000_000)
+        del values
+    with timing.timer('small'):
+        values = np.ones(1_000_000)
+        del values
+
+    assert get_record('large')['peak_mb'] >= 160
+    assert 8 <= get_record('small')['peak_mb'] < 20
+
+def test_peak_memory_nested(trace_memory):
+
+    # the peak of an inner call counts towards the outer call
+    with timing.timer('outer'):
+        with timing.timer('inner'):
+            values = np.ones(5_000_000)
+            del values
+        with timing.timer('after'):
+            pass
+
+    assert get_record('inner')['peak_mb'] >= 40
+    assert get_record('outer')['peak_mb'] >= 40
+    assert get_record('after')['peak_mb'] < 1
+
+def test_peak_memory_off():
+
+    timing.clear_timings()
+    with timing.timer('untraced'):
+        pass
+
+    assert get_record('untraced')['peak_mb'] is None
+
+def test_timing_widget_stops_with_session():
+
+    doc = Document()
+    with set_curdoc(doc):
+        timing.get_timing_widget(period=60_000)
+        callback = state._periodic[doc][-1]
+        assert callback.running
+
+        for destroyed in doc.session_destroyed_callbacks:
+            destroyed(None)
+    assert not callback.running
@@ -0,0 +1,74 @@
+'''
+zonal means of forcing grids
+'''
+import pytest
+import numpy as np
+import pandas as pd
+
+pytest.importorskip('scipy')
+pytest.importorskip('h5py')
+pytest.importorskip('dask')
+pytest.importorskip('fsspec')
+
+from postevent.setup import zonal
+
+
+def get_weights_df() -> pd.DataFrame:
+    '''
+    Two polygons of two cells each (sharing cell (0, 1)) and a third
+    with a single cell
+    '''
+    return pd.DataFrame(dict(
+        location_id=['huc-a', 'huc-a', 'huc-b', 'huc-b', 'huc-c'],
+        row=[0, 0, 0, 1, 1],
+        col=[0, 1, 1, 1, 0],
+        weight=[0.75, 0.25, 0.5, 0.5, 1.0],
+    ))
+
+def get_teehr_means(
+    grid: np.ndarray,
+    weights_df: pd.DataFrame,
+) -> pd.Series:
+    '''
+    Weighted average as computed by TEEHR (sum of the weighted values
+    over the sum of the weights, per polygon)
+    '''
+    df = weights_df.copy()
+    df['weighted_value'] = grid[df['row'], df['col']] * df['weight']
+    df = df.groupby('location_id')[['weighted_value', 'weight']].sum()
+
+    return df['weighted_value'] / df['weight']
+
+@pytest.mark.parametrize('n_threads', [1, 2])
+def test_zonal_means_missing_cells(n_threads):
+
+    weights_df = get_weights_df()
+    zonal_weights = zonal.build_weight_matrices(dict(huc=weights_df))
+    rows, cols = zonal_weights['rows'], zonal_weights['cols']
+    m = zonal_weights['matrices']['huc']
+
+    grids = np.array([
+        [[1.0, 2.0], [3.0, 4.0]],
+        # missing cell (0, 1) - in huc-a and huc-b
+        [[1.0, np.nan], [3.0, 4.0]],
+        # all cells of huc-b and huc-c missing
+        [[1.0, np.nan], [np.nan, np.nan]],
+    ])
+    means = zonal.compute_zonal_means(
+        grids[:, rows, cols],
+        m['matrix'],
+        n_threads=n_threads
+    )
+
+    for grid, grid_means in zip(grids, means):
+        expected = get_teehr_means(grid, weights_df)
+        np.testing.assert_allclose(
+            grid_means,
+            expected.loc[m['location_ids']].to_numpy()
+        )
+
+    # missing cells count as zero with their weight
+    means = pd.DataFrame(means, columns=m['location_ids'])
+    assert means.loc[1, 'huc-a'] == pytest.approx(0.75)
+    assert means.loc[1, 'huc-b'] == pytest.approx(2.0)
+    assert means.loc[2, 'huc-c'] == 0